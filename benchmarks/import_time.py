@@ -0,0 +1,95 @@
+"""Measures the import time of fabricdw commands with '-X importtime' and fails, if a command became slower than its
+threshold, or imports a module, which only other commands need.
+
+Run from the root of the repository: python benchmarks/import_time.py"""
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from argparse import ArgumentParser
+
+# command: milliseconds spent importing, after the interpreter started
+THRESHOLDS: dict[str, float] = {
+	"--help": 15,
+	"list": 30,
+}
+# loaded by the commands, which download, ask, or copy
+FORBIDDEN_MODULES: list[str] = ["requests", "pick", "concurrent.futures", "fabricdw.installations.fabric"]
+
+
+def measure(command: list[str], home: str) -> tuple[float, dict[str, float]]:
+	"""Run the command once
+	
+	:returns: the total import time in milliseconds, and the cumulative time of each module"""
+	environment: dict[str, str] = os.environ | { "HOME": home, "PYTHONPATH": os.getcwd() }
+	# the bytecode is written by the first run, compiling is not part of the import time
+	environment.pop("PYTHONDONTWRITEBYTECODE", None)
+	
+	result = subprocess.run(
+		[sys.executable, "-X", "importtime", "-m", "fabricdw", *command],
+		env=environment,
+		cwd=home,
+		stdout=subprocess.DEVNULL,
+		stderr=subprocess.PIPE,
+		text=True,
+		check=True
+	)
+	
+	modules: dict[str, float] = { }
+	total: float = 0
+	started: bool = False
+	
+	for line in result.stderr.splitlines():
+		if not line.startswith("import time:") or "|" not in line or "cumulative" in line:
+			continue
+		
+		_, cumulative, name = line.split("|")
+		
+		# imports after the startup of the interpreter, which ends with 'site'
+		if not started:
+			started = name.strip() == "site"
+			continue
+		
+		modules[name.strip()] = int(cumulative) / 1000
+		
+		if not name.startswith("  "):
+			total += int(cumulative) / 1000
+	
+	return total, modules
+
+
+def main() -> None:
+	parser = ArgumentParser(description="Import time benchmark of the fabricdw commands")
+	parser.add_argument("-r", "--runs", action="store", type=int, default=10, help="Runs of each command")
+	parser.add_argument("-v", "--verbose", action="store_true", help="Show the slowest modules of each command")
+	options = parser.parse_args()
+	
+	failed: bool = False
+	
+	with tempfile.TemporaryDirectory() as home:
+		for command, threshold in THRESHOLDS.items():
+			measure(command.split(), home)
+			
+			runs: list[tuple[float, dict[str, float]]] = [measure(command.split(), home) for _ in range(options.runs)]
+			median: float = statistics.median(total for total, _ in runs)
+			forbidden: list[str] = [module for module in FORBIDDEN_MODULES if module in runs[0][1]]
+			
+			passed: bool = median <= threshold and len(forbidden) == 0
+			failed |= not passed
+			
+			print(f"{'PASS' if passed else 'FAIL'} fabricdw {command}: {median:.1f}ms (threshold {threshold}ms)")
+			
+			if len(forbidden) > 0:
+				print(f"\timports {', '.join(forbidden)}")
+			
+			if options.verbose or not passed:
+				slowest = sorted(runs[0][1].items(), key=lambda module: module[1], reverse=True)[:10]
+				for module, milliseconds in slowest:
+					print(f"\t{milliseconds:7.1f}ms {module}")
+	
+	sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+	main()
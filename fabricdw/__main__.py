@@ -1,19 +1,57 @@
+import sys
+
 from fabricdw.args import args, parse_args
-from fabricdw.common import InstallationAlreadyExistError, InstallationDoesNotExistError, write_config
+
+
+def _handled_errors() -> tuple[type[Exception], ...]:
+	"""The errors, which are reported without a traceback. Imported after they occurred, the modules defining them
+	are not needed by every command"""
+	from fabricdw.common import (InstallationAlreadyExistError, InstallationDoesNotExistError,
+		InvalidCombinationException)
+	from fabricdw.installations.cache import OfflineCacheMissError
+	from fabricdw.installations.change import MoveVerificationError
+	from fabricdw.installations.initialize import ServerInitializationError
+	from fabricdw.installations.network import DownloadError
+	from fabricdw.installations.tuning import ResourceBudgetError
+	
+	return (
+		InstallationAlreadyExistError, InstallationDoesNotExistError, InvalidCombinationException,
+		OfflineCacheMissError, DownloadError, ServerInitializationError, ResourceBudgetError,
+		MoveVerificationError
+	)
 
 
 def main() -> None:
 	parse_args()
 	
+	# a running daemon has the config and the caches in memory already
+	if args().command not in (None, "serve"):
+		from fabricdw.daemon import forward_to_daemon
+		
+		if forward_to_daemon(sys.argv[1:]):
+			return
+	
+	from fabricdw.common import write_config
+	
+	failed: bool = False
+	
 	try:
 		args().function()
-	except (InstallationAlreadyExistError, InstallationDoesNotExistError) as error:
+	except Exception as error:
+		if not isinstance(error, _handled_errors()):
+			raise
+		
 		print(f"Error during processing: {error}")
 		print()
 		print("Exact cause:")
 		print(error)
+		failed = True
 	
 	write_config()
+	
+	# like a command, which failed in the daemon
+	if failed:
+		sys.exit(1)
 
 
 if __name__ == "__main__":
@@ -1,10 +1,15 @@
-import getpass
-import subprocess
+import importlib
+import sys
+import threading
 from argparse import ArgumentParser, Namespace
-
-from colorama import Fore, Style
+from contextlib import contextmanager
+from typing import Callable, Iterator, TypeVar
 
 arguments: Namespace | None = None
+# arguments of operations, which run in parallel to others of the same process
+_scoped = threading.local()
+
+T = TypeVar("T")
 
 
 class InitializationError(Exception):
@@ -16,82 +21,320 @@ class InitializationError(Exception):
 def args() -> Namespace:
 	global arguments
 	
+	if (scoped_arguments := getattr(_scoped, "arguments", None)) is not None:
+		return scoped_arguments
+	
 	if arguments is None:
 		raise InitializationError("'parse_args' must be called before args is available")
 	
 	return arguments
 
 
-def list_all_installations() -> None:
-	from fabricdw.common import CONFIG
-	
-	if len(CONFIG.installations) == 0:
-		print("There are no installations")
-		return
-	
-	if args().verify:
-		from fabricdw.common import Installation, InstallationDoesNotExistError
-		for installation in CONFIG.installations:
-			try:
-				print(f"[ {Fore.BLUE}--{Style.RESET_ALL} ]", end="\r")
-				
-				Installation.ensure_exists(installation.name)
-				
-				print(f"[ {Fore.GREEN}OK{Style.RESET_ALL} ]", end="")
-			except InstallationDoesNotExistError:
-				print(f"[{Fore.RED}FAIL{Style.RESET_ALL}]", end="")
-			finally:
-				print(f" {installation}")
-		
-		print()
+@contextmanager
+def scoped_args(namespace: Namespace) -> Iterator[Namespace]:
+	"""Make args() return the namespace within this thread, until the context is left"""
+	previous: Namespace | None = getattr(_scoped, "arguments", None)
+	_scoped.arguments = namespace
 	
-	if len(CONFIG.installations) == 0:
-		print("There are no installations")
-		return
+	try:
+		yield namespace
+	finally:
+		_scoped.arguments = previous
+
+
+def bind_args(function: Callable[..., T]) -> Callable[..., T]:
+	"""The function with the arguments of the calling thread. Worker threads of a pool do not see the arguments of
+	'scoped_args' otherwise. If the standard output is per thread (the daemon), the function also prints into the one
+	of the calling thread."""
+	namespace: Namespace = args()
+	bind_output: Callable[[Callable[..., T]], Callable[..., T]] | None = getattr(sys.stdout, "bind", None)
 	
-	print("All installations:")
-	for installation in CONFIG.installations:
-		print(f"\t{installation}")
+	def call(*arguments, **keywords) -> T:
+		with scoped_args(namespace):
+			return function(*arguments, **keywords)
+	
+	return bind_output(call) if bind_output is not None else call
 
 
-def parse_args() -> None:
-	global arguments
+# name: help, and the module and function of the command. The modules are only imported by the chosen command
+COMMANDS: dict[str, tuple[str, str, str]] = {
+	"create": ("Create a new installation", "fabricdw.installations.create", "create_installation"),
+	"delete": ("Remove an existing installation", "fabricdw.installations.delete", "delete_installation"),
+	"copy": ("copies an existing installation", "fabricdw.installations.copy", "copy_installation"),
+	"move": ("Moves an existing installation", "fabricdw.installations.change", "move_installation"),
+	"rename": ("Renames an existing installation", "fabricdw.installations.change", "rename_installation"),
+	"update": (
+		"Updates the Fabric loader and installer of the installation", "fabricdw.installations.update",
+		"update_installation"
+	),
+	"import": ("Import an existing installation", "fabricdw.installations.import_", "import_installation"),
+	"list": ("List all existing installations", "fabricdw.installations.list_", "list_all_installations"),
+	"query": (
+		"Find installations by their versions, ports, RAM, and Java", "fabricdw.installations.registry",
+		"query_installations"
+	),
+	"apply": (
+		"Create and update installations as described in a manifest", "fabricdw.installations.apply", "apply_manifest"
+	),
+	"purge": ("Remove deleted installations from the trash", "fabricdw.installations.trash", "purge_trash"),
+	"restore": (
+		"Restore a deleted installation from the trash", "fabricdw.installations.trash", "restore_installation"
+	),
+	"rebalance": (
+		"Assign the CPUs of the host to pinned installations", "fabricdw.installations.affinity",
+		"rebalance_installations"
+	),
+	"gc": (
+		"Remove stored server jars, which are not used by any installation", "fabricdw.installations.store",
+		"collect_garbage"
+	),
+	"properties": (
+		"Get, set, or remove server properties of many installations at once", "fabricdw.properties.fleet",
+		"properties_command"
+	),
+	"serve": (
+		"Run a daemon, which keeps the config and caches in memory and runs the commands of other processes",
+		"fabricdw.daemon.server", "serve"
+	),
+}
+
+
+def _command_function(module: str, function: str) -> Callable[[], None]:
+	"""The function of a command, whose module is imported when it is called"""
 	
-	from fabricdw.common import absolute_path, CONFIG, VersionChoice
-	from fabricdw.installations import (copy_installation, create_installation, delete_installation, move_installation,
-		update_installation, rename_installation, import_installation)
-	from fabricdw.properties import create_replacements
+	def call() -> None:
+		getattr(importlib.import_module(module), function)()
 	
-	root_parser = ArgumentParser()
-	subparser = root_parser.add_subparsers()
+	return call
+
+
+def _chosen_command(argv: list[str] | None) -> str | None:
+	"""The subcommand of the arguments. The root parser has no options except '--help'"""
+	return next((argument for argument in (sys.argv[1:] if argv is None else argv) if argument in COMMANDS), None)
+
+
+def _add_arguments(parsers: dict[str, ArgumentParser]) -> None:
+	"""Add the arguments of the given subparsers. Arguments shared by several commands are only added to the given ones
+	
+	:param parsers: the subparsers, whose arguments are needed"""
 	
-	create_parser = subparser.add_parser("create", help="Create a new installation")
-	delete_parser = subparser.add_parser("delete", help="Remove an existing installation")
-	copy_parser = subparser.add_parser("copy", help="copies an existing installation")
-	move_parser = subparser.add_parser("move", help="Moves an existing installation")
-	rename_parser = subparser.add_parser("rename", help="Renames an existing installation")
-	update_parser = subparser.add_parser("update", help="Updates the Fabric loader and installer of the installation")
-	import_parser = subparser.add_parser("import", help="Import an existing installation")
-	list_parser = subparser.add_parser("list", help="List all existing installations")
-	
-	# can be called with args.function()
-	root_parser.set_defaults(function=lambda: root_parser.print_help())
-	create_parser.set_defaults(function=create_installation)
-	delete_parser.set_defaults(function=delete_installation)
-	copy_parser.set_defaults(function=copy_installation)
-	move_parser.set_defaults(function=move_installation)
-	rename_parser.set_defaults(function=rename_installation)
-	update_parser.set_defaults(function=update_installation)
-	import_parser.set_defaults(function=import_installation)
-	list_parser.set_defaults(function=list_all_installations)
-	
-	for parser in [create_parser, delete_parser, move_parser, update_parser, import_parser]:
+	def each(*names: str) -> list[ArgumentParser]:
+		return [parsers[name] for name in names if name in parsers]
+	
+	for parser in each("create", "delete", "move", "import", "restore"):
 		parser.add_argument("name", action="store", type=str, help="Name of the installation")
 	
-	for parser in [copy_parser, rename_parser]:
+	for parser in each("update"):
+		parser.add_argument(
+			"name", action="store", type=str, nargs="?", default=None, help="Name of the installation"
+		)
+	
+	for parser in each("copy", "rename"):
 		parser.add_argument("source", action="store", type=str, help="Name of the source installation")
 		parser.add_argument("target", action="store", type=str, help="Name of the target installation")
 	
+	for create_parser in each("create"):
+		_add_create_arguments(create_parser)
+	
+	for parser in each("create", "copy", "move"):
+		parser.add_argument(
+			"--allow-non-empty",
+			action="store_true",
+			dest="allow_non_empty",
+			help="Allows the target directory to be not empty"
+		)
+	
+	for parser in each("create", "update", "apply"):
+		parser.add_argument(
+			"--offline",
+			action="store_true",
+			dest="offline",
+			help="Resolve versions only from the local metadata cache, without contacting the Fabric meta server"
+		)
+		parser.add_argument(
+			"--refresh-meta",
+			action="store_true",
+			dest="refresh_meta",
+			help="Revalidate the cached Fabric metadata, even if it has not expired yet"
+		)
+	
+	for parser in each("create", "update"):
+		_add_version_arguments(parser)
+	
+	for parser in each("create", "copy"):
+		parser.add_argument(
+			"--overcommit",
+			action="store_true",
+			dest="overcommit",
+			help="Allow the servers to need more memory than the host has"
+		)
+		parser.add_argument(
+			"--no-auto-port",
+			action="store_false",
+			dest="auto_port",
+			help="Do not assign free ports, the server uses the default port unless '-p server-port=...' is given"
+		)
+		parser.add_argument(
+			"-d",
+			"--directory",
+			action="store",
+			type=str,
+			default=None,
+			dest="output_dir",
+			help="The directory in which Fabricdw will work"
+		)
+	
+	# required instead of optional
+	# still defaults to current directory
+	for parser in each("move", "import"):
+		parser.add_argument(
+			"output_dir",
+			action="store",
+			type=str,
+			default=None,
+			help="The directory to which the installation will be moved to"
+		)
+	
+	for update_parser in each("update"):
+		update_parser.add_argument(
+			"--all", action="store_true", dest="all", help="Update all installations"
+		)
+		update_parser.add_argument(
+			"--filter",
+			action="store",
+			type=str,
+			dest="filter",
+			default=None,
+			help="Update all installations, whose name matches the glob pattern"
+		)
+		update_parser.add_argument(
+			"--from-game-version",
+			action="store",
+			type=str,
+			dest="from_game_version",
+			default=None,
+			help="Update all installations with this game version"
+		)
+		update_parser.add_argument(
+			"--keep-backup",
+			action="store_true",
+			dest="keep_backups",
+			help="If the created server jar backup should be kept"
+		)
+	
+	for delete_parser in each("delete"):
+		delete_parser.add_argument(
+			"--yes-just-delete",
+			action="store_true",
+			dest="skip_delete_question",
+			help="Skip the question whether the installation should really be deleted"
+		)
+		
+		delete_parser.add_argument(
+			"--retention",
+			action="store",
+			type=float,
+			dest="retention",
+			default=None,
+			help="Hours, in which the installation can be restored. Defaults to 'trash-retention' of the config"
+		)
+	
+	for purge_parser in each("purge"):
+		purge_parser.add_argument(
+			"name",
+			action="store",
+			type=str,
+			nargs="?",
+			default=None,
+			help="Only purge deleted installations of this name"
+		)
+		purge_parser.add_argument(
+			"--all", action="store_true", dest="all", help="Also purge installations, whose retention has not expired"
+		)
+		purge_parser.add_argument(
+			"--dry-run", action="store_true", dest="dry_run", help="Only show the deleted installations"
+		)
+	
+	for list_parser in each("list"):
+		list_parser.add_argument(
+			"--verify",
+			action="store_true",
+			dest="verify",
+			help="Verify the directory, server jar, fabricdw file, and server.properties of all installations, "
+				 "in parallel. Installations without their directory are removed"
+		)
+		list_parser.add_argument(
+			"--sizes", action="store_true", dest="sizes", help="Show the disk size of the installations"
+		)
+		list_parser.add_argument(
+			"--json", action="store_true", dest="json", help="Print the installations as JSON"
+		)
+	
+	for query_parser in each("query"):
+		_add_query_arguments(query_parser)
+	
+	for gc_parser in each("gc"):
+		gc_parser.add_argument(
+			"--dry-run", action="store_true", dest="dry_run", help="Only show what would be removed"
+		)
+	
+	for rebalance_parser in each("rebalance"):
+		rebalance_parser.add_argument(
+			"--all", action="store_true", dest="all", help="Pin all installations, not only the pinned ones"
+		)
+		rebalance_parser.add_argument(
+			"--clear", action="store_true", dest="clear", help="Unpin all installations, they may use all CPUs again"
+		)
+	
+	for apply_parser in each("apply"):
+		apply_parser.add_argument("manifest", action="store", type=str, help="The JSON or TOML manifest")
+		apply_parser.add_argument(
+			"--dry-run", action="store_true", dest="dry_run", help="Only show the plan, do not change anything"
+		)
+	
+	for copy_parser in each("copy"):
+		_add_copy_arguments(copy_parser)
+	
+	for properties_parser in each("properties"):
+		_add_properties_arguments(properties_parser)
+	
+	for serve_parser in each("serve"):
+		from fabricdw.daemon import DAEMON_JOBS
+		
+		serve_parser.add_argument(
+			"-j",
+			"--jobs",
+			action="store",
+			type=int,
+			dest="jobs",
+			default=DAEMON_JOBS,
+			help="How many requests are processed in parallel"
+		)
+		serve_parser.add_argument(
+			"--status",
+			action="store_true",
+			dest="status",
+			help="Show the request counts, latencies, and queue depth of the running daemon as JSON"
+		)
+	
+	for parser in each("update", "apply"):
+		parser.add_argument(
+			"-j",
+			"--jobs",
+			action="store",
+			type=int,
+			dest="jobs",
+			default=4,
+			help="How many installations are processed in parallel"
+		)
+
+
+def _add_create_arguments(create_parser: ArgumentParser) -> None:
+	import getpass
+	import subprocess
+	
+	from fabricdw.installations.tuning import TuningProfile
+	
 	create_parser.add_argument(
 		"-p",
 		"--property",
@@ -118,8 +361,8 @@ def parse_args() -> None:
 		action="store",
 		type=float,
 		dest="min_ram",
-		default=CONFIG.defaults.min_ram,
-		help="Minimum amount of RAM the server can use"
+		default=None,
+		help="Minimum amount of RAM the server can use. Defaults to 'min-ram' of the config"
 	)
 	create_parser.add_argument(
 		"-x",
@@ -127,8 +370,8 @@ def parse_args() -> None:
 		action="store",
 		type=float,
 		dest="max_ram",
-		default=CONFIG.defaults.max_ram,
-		help="Maximum amount of RAM the server can use"
+		default=None,
+		help="Maximum amount of RAM the server can use. Defaults to 'max-ram' of the config"
 	)
 	create_parser.add_argument(
 		"-k",
@@ -136,8 +379,8 @@ def parse_args() -> None:
 		action="store",
 		type=int,
 		dest="backups",
-		default=CONFIG.defaults.backups,
-		help="The amount of backups which will be kept"
+		default=None,
+		help="The amount of backups which will be kept. Defaults to 'backups' of the config"
 	)
 	create_parser.add_argument(
 		"-t",
@@ -145,8 +388,8 @@ def parse_args() -> None:
 		action="store",
 		type=int,
 		dest="idle_time",
-		default=CONFIG.defaults.idle_time,
-		help="The time after which the server will turn idle"
+		default=None,
+		help="The time after which the server will turn idle. Defaults to 'idle_time' of the config"
 	)
 	create_parser.add_argument(
 		"--show-init-output",
@@ -156,6 +399,20 @@ def parse_args() -> None:
 		const=None,
 		help="Show the output when the server initializes"
 	)
+	create_parser.add_argument(
+		"--no-image-cache",
+		action="store_false",
+		dest="use_images",
+		help="Always initialize the server, instead of using a cached image of an initialized server"
+	)
+	create_parser.add_argument(
+		"--init-timeout",
+		action="store",
+		type=float,
+		dest="init_timeout",
+		default=300,
+		help="Seconds after which the initialization of the server is aborted"
+	)
 	# java properties
 	create_parser.add_argument(
 		"--java",
@@ -174,107 +431,286 @@ def parse_args() -> None:
 		help="Comma separated list of arguments for the JRE. The initial dash is added later, DO NOT INCLUDE IT."
 	)
 	create_parser.add_argument(
-		"--allow-non-empty",
+		"--profile",
+		action="store",
+		type=str,
+		dest="profile",
+		default=TuningProfile.NONE,
+		choices=list(TuningProfile),
+		help="JVM tuning profile: 'aikar' (G1 with the flags of Aikar), 'zgc' (generational ZGC, Java 21), or 'none'"
+	)
+	create_parser.add_argument(
+		"--large-pages",
 		action="store_true",
-		dest="allow_non_empty",
-		help="Allows the target directory to be not empty"
+		dest="large_pages",
+		help="Back the heap by large pages and touch it at start. Large pages must be configured on the host"
 	)
+	create_parser.add_argument(
+		"--gc-threads",
+		action="store",
+		type=int,
+		dest="gc_threads",
+		default=None,
+		help="The amount of parallel GC threads. Limits servers sharing a host to their share of the cores"
+	)
+	create_parser.add_argument(
+		"--pin-cpus",
+		action="store_true",
+		dest="pin_cpus",
+		help="Run the server on its own CPUs (and NUMA node), shared fairly with the other pinned installations"
+	)
+
+
+def _add_version_arguments(parser: ArgumentParser) -> None:
+	from fabricdw.common import VersionChoice
 	
-	for parser in [create_parser, update_parser]:
-		parser.add_argument(
-			"--allow-snapshots",
-			action="store_true",
-			dest="allow_snapshots",
-			help="Allows the usage of snapshot game versions"
-		)
-		parser.add_argument(
-			"--allow-unstable",
-			action="store_true",
-			dest="allow_unstable",
-			help="Allows the usage of non-stable loader and installer versions. Recommended to use with "
-				 "'--loader-version ask' and '--installer-version ask'."
-		)
-		
-		parser.add_argument(
-			"-g",
-			"--game-version",
-			action="store",
-			dest="game_version",
-			default=VersionChoice.ASK,
-			type=str,
-			help="Which version of Minecraft to use. Either 'ask', 'latest', or an actual version"
-		)
-		parser.add_argument(
-			"-l",
-			"--loader-version",
-			action="store",
-			dest="loader_version",
-			default=VersionChoice.LATEST,
-			type=str,
-			help="Which version of the Fabric loader to use.  Either 'ask', 'latest', or an actual version"
-		)
-		parser.add_argument(
-			"-i",
-			"--installer-version",
-			action="store",
-			dest="installer_version",
-			default=VersionChoice.LATEST,
-			type=str,
-			help="Which version of Fabric installer to use. Either 'ask', 'latest', or an actual version"
-		)
-	
-	for parser in [create_parser, copy_parser]:
-		parser.add_argument(
-			"-d",
-			"--directory",
-			action="store",
-			type=str,
-			default=None,
-			dest="output_dir",
-			help="The directory in which Fabricdw will work"
-		)
+	parser.add_argument(
+		"--cds",
+		action="store_true",
+		dest="cds",
+		help="Create a class data sharing archive with a training run, which speeds up the start of the server. "
+			 "Updates refresh existing archives regardless"
+	)
+	parser.add_argument(
+		"--allow-snapshots",
+		action="store_true",
+		dest="allow_snapshots",
+		help="Allows the usage of snapshot game versions"
+	)
+	parser.add_argument(
+		"--allow-unstable",
+		action="store_true",
+		dest="allow_unstable",
+		help="Allows the usage of non-stable loader and installer versions. Recommended to use with "
+			 "'--loader-version ask' and '--installer-version ask'."
+	)
 	
-	# required instead of optional
-	# still defaults to current directory
-	for parser in [move_parser, import_parser]:
-		parser.add_argument(
-			"output_dir",
-			action="store",
-			type=str,
-			default=None,
-			help="The directory to which the installation will be moved to"
-		)
+	parser.add_argument(
+		"-g",
+		"--game-version",
+		action="store",
+		dest="game_version",
+		default=VersionChoice.ASK,
+		type=str,
+		help="Which version of Minecraft to use. Either 'ask', 'latest', or an actual version. "
+			 "Updates may also use 'keep', to keep the game version of each installation"
+	)
+	parser.add_argument(
+		"-l",
+		"--loader-version",
+		action="store",
+		dest="loader_version",
+		default=VersionChoice.LATEST,
+		type=str,
+		help="Which version of the Fabric loader to use.  Either 'ask', 'latest', or an actual version"
+	)
+	parser.add_argument(
+		"-i",
+		"--installer-version",
+		action="store",
+		dest="installer_version",
+		default=VersionChoice.LATEST,
+		type=str,
+		help="Which version of Fabric installer to use. Either 'ask', 'latest', or an actual version"
+	)
+
+
+def _add_query_arguments(query_parser: ArgumentParser) -> None:
+	query_parser.add_argument(
+		"-g", "--game-version", action="store", type=str, dest="game_version", default=None, help="The game version"
+	)
+	query_parser.add_argument(
+		"-l", "--loader-version", action="store", type=str, dest="loader_version", default=None,
+		help="The Fabric loader version"
+	)
+	query_parser.add_argument(
+		"-i", "--installer-version", action="store", type=str, dest="installer_version", default=None,
+		help="The Fabric installer version"
+	)
+	query_parser.add_argument(
+		"--java", action="store", type=str, dest="java", default=None, help="The java executable"
+	)
+	query_parser.add_argument(
+		"--port", action="store", type=int, dest="port", default=None, help="The server port"
+	)
+	query_parser.add_argument(
+		"--jar", action="store", type=str, dest="jar", default=None, help="The SHA-256 of the server jar"
+	)
+	query_parser.add_argument(
+		"--filter", action="store", type=str, dest="filter", default=None,
+		help="Only installations, whose name matches the glob pattern"
+	)
+	query_parser.add_argument(
+		"--sizes", action="store_true", dest="sizes", help="Measure the disk size of the installations again"
+	)
+	query_parser.add_argument(
+		"--json", action="store_true", dest="json", help="Print the installations as JSON"
+	)
+
+
+def _add_copy_arguments(copy_parser: ArgumentParser) -> None:
+	from fabricdw.common.files import COPY_JOBS
 	
-	update_parser.add_argument(
-		"--keep-backup",
-		action="store_true",
-		dest="keep_backups",
-		help="If the created server jar backup should be kept"
+	copy_parser.add_argument(
+		"--exclude",
+		action="append",
+		type=str,
+		dest="exclude",
+		default=[],
+		help="Do not copy files and directories matching the pattern. A trailing '/' only matches directories, "
+			 "a leading '/' only matches at the top of the installation"
+	)
+	copy_parser.add_argument(
+		"--no-default-excludes",
+		action="store_false",
+		dest="default_excludes",
+		help="Also copy backup/, logs/, crash-reports/, and *.jar-bak"
+	)
+	copy_parser.add_argument(
+		"-j",
+		"--jobs",
+		action="store",
+		type=int,
+		dest="jobs",
+		default=COPY_JOBS,
+		help="How many files are copied in parallel"
 	)
+
+
+def _add_properties_arguments(properties_parser: ArgumentParser) -> None:
+	from fabricdw.properties.fleet import PROPERTIES_JOBS
 	
-	delete_parser.add_argument(
-		"--yes-just-delete",
+	properties_parser.add_argument(
+		"action",
+		action="store",
+		type=str,
+		choices=["get", "show", "set", "unset"],
+		help="What to do with the properties. 'show' prints a table of the indexed properties"
+	)
+	properties_parser.add_argument(
+		"keys",
+		action="store",
+		type=str,
+		nargs="+",
+		metavar="key[=value]",
+		help="The keys to get or remove, or the properties to set as 'key=value'"
+	)
+	properties_parser.add_argument(
+		"-n",
+		"--name",
+		action="append",
+		type=str,
+		dest="names",
+		default=[],
+		metavar="NAME",
+		help="An installation, whose properties are used. Can be given multiple times"
+	)
+	properties_parser.add_argument(
+		"--all", action="store_true", dest="all", help="Use the properties of all installations"
+	)
+	properties_parser.add_argument(
+		"--filter",
+		action="store",
+		type=str,
+		dest="filter",
+		default=None,
+		help="Use the properties of all installations, whose name matches the glob pattern"
+	)
+	properties_parser.add_argument(
+		"-j",
+		"--jobs",
+		action="store",
+		type=int,
+		dest="jobs",
+		default=PROPERTIES_JOBS,
+		help="How many files are processed in parallel"
+	)
+	properties_parser.add_argument(
+		"--json", action="store_true", dest="json", help="Print the properties as JSON, only for 'show'"
+	)
+	properties_parser.add_argument(
+		"--diff",
 		action="store_true",
-		dest="skip_delete_question",
-		help="Skip the question whether the installation should really be deleted"
+		dest="diff",
+		help="Only show installations, whose values differ from the majority, and highlight these values. "
+			 "Only for 'show'"
 	)
+
+
+def build_parser(argv: list[str] | None = None) -> ArgumentParser:
+	"""The parser of the command line. Only the subparser of the chosen command gets its arguments
 	
-	list_parser.add_argument(
-		"--verify", action="store_true", dest="verify", help="verifies the existence all installations"
-	)
+	:param argv: the arguments, which will be parsed, None for the ones of the command line"""
+	root_parser = ArgumentParser()
+	subparser = root_parser.add_subparsers()
+	
+	command: str | None = _chosen_command(argv)
+	parsers: dict[str, ArgumentParser] = { }
+	
+	for name, (help_text, module, function) in COMMANDS.items():
+		parser: ArgumentParser = subparser.add_parser(name, help=help_text)
+		
+		# can be called with args.function()
+		parser.set_defaults(function=_command_function(module, function), command=name)
+		
+		if name == command:
+			parsers[name] = parser
+	
+	root_parser.set_defaults(function=lambda: root_parser.print_help(), command=None)
 	
-	args = root_parser.parse_args()
+	_add_arguments(parsers)
+	
+	return root_parser
+
+
+def parse_namespace(argv: list[str] | None = None, cwd: str | None = None) -> Namespace:
+	"""Parse the command line arguments (or the given ones) into a complete namespace
+	
+	:param cwd: the directory, relative paths are relative to. Defaults to the working directory"""
+	return complete_namespace(build_parser(argv).parse_args(argv), cwd)
+
+
+def complete_namespace(args: Namespace, cwd: str | None = None) -> Namespace:
+	"""Fill in the values, which depend on the config and on other arguments
+	
+	:param cwd: the directory, relative paths are relative to. Defaults to the working directory"""
+	import os.path
+	
+	from fabricdw.common import absolute_path, CONFIG
+	
+	def resolve(path: str) -> str:
+		return absolute_path(os.path.join(cwd, os.path.expanduser(path)) if cwd is not None else path)
 	
 	args.allow_delete_directory = True
+	# commands, which parse further command lines (apply), resolve their paths the same way
+	args.cwd = cwd
 	
-	if hasattr(args, "properties"):
+	# properties of the command line are given as 'key=value'
+	if isinstance(getattr(args, "properties", None), list):
+		from fabricdw.properties import create_replacements
+		
 		args.properties = create_replacements(args)
 	
+	# the config is only loaded, if it is needed
+	for name in ["min_ram", "max_ram", "backups", "idle_time"]:
+		if getattr(args, name, 0) is None:
+			setattr(args, name, getattr(CONFIG.defaults, name))
+	
 	# if not given, use current dir + name
 	if hasattr(args, "output_dir"):
-		args.output_dir = absolute_path(args.output_dir if args.output_dir is not None else f"./{args.name}")
+		name: str = args.target if hasattr(args, "target") else args.name
+		args.output_dir = resolve(args.output_dir if args.output_dir is not None else f"./{name}")
+	
+	if hasattr(args, "manifest"):
+		args.manifest = resolve(args.manifest)
+	
+	return args
+
+
+def parse_args() -> None:
+	global arguments
 	
-	arguments = args
+	arguments = parse_namespace()
 
 
-__all__ = ["args", "parse_args"]
+__all__ = ["args", "bind_args", "build_parser", "complete_namespace", "parse_args", "parse_namespace", "scoped_args"]
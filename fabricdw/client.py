@@ -0,0 +1,244 @@
+"""The Python interface of Fabricdw, for programs managing many installations in one process.
+
+Every operation runs with its own arguments, so operations can run in parallel threads. Operations on the same
+installation run one after another. Nothing is asked, unless the client is interactive."""
+from __future__ import annotations
+
+import threading
+from argparse import Namespace
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable, Iterator, TypeVar
+
+from fabricdw.args import build_parser, complete_namespace, scoped_args
+from fabricdw.common import CONFIG, Installation, SERVER_PROPERTIES_FILE, VersionChoice, write_config
+
+T = TypeVar("T")
+
+# request fields, whose argument has another name
+DESTINATIONS: dict[str, str] = {
+	"directory": "output_dir",
+	"java": "java_executable",
+	"keep_backup": "keep_backups",
+}
+
+
+@dataclass
+class CreateRequest:
+	"""The options of 'create'. None uses the default of the command line"""
+	name: str
+	directory: str | None = None
+	game_version: str = VersionChoice.LATEST
+	loader_version: str = VersionChoice.LATEST
+	installer_version: str = VersionChoice.LATEST
+	properties: dict[str, str] = field(default_factory=dict)
+	user: str | None = None
+	min_ram: float | None = None
+	max_ram: float | None = None
+	backups: int | None = None
+	idle_time: int | None = None
+	java: str | None = None
+	java_args: str | None = None
+	profile: str | None = None
+	gc_threads: int | None = None
+	init_timeout: float | None = None
+	large_pages: bool = False
+	pin_cpus: bool = False
+	cds: bool = False
+	allow_non_empty: bool = False
+	allow_snapshots: bool = False
+	allow_unstable: bool = False
+	overcommit: bool = False
+	auto_port: bool = True
+	use_images: bool = True
+	offline: bool = False
+
+
+@dataclass
+class CopyRequest:
+	"""The options of 'copy'"""
+	source: str
+	target: str
+	directory: str | None = None
+	exclude: list[str] = field(default_factory=list)
+	default_excludes: bool = True
+	jobs: int | None = None
+	overcommit: bool = False
+	auto_port: bool = True
+	allow_non_empty: bool = False
+
+
+@dataclass
+class UpdateRequest:
+	"""The options of 'update'. Either the name or one of the selections is needed"""
+	name: str | None = None
+	all: bool = False
+	filter: str | None = None
+	from_game_version: str | None = None
+	game_version: str = VersionChoice.LATEST
+	loader_version: str = VersionChoice.LATEST
+	installer_version: str = VersionChoice.LATEST
+	allow_snapshots: bool = False
+	allow_unstable: bool = False
+	keep_backup: bool = False
+	cds: bool = False
+	jobs: int | None = None
+	offline: bool = False
+
+
+@dataclass
+class UpdateReport:
+	"""The outcome of updating one installation, errors are not raised"""
+	name: str
+	old_versions: str | None
+	new_versions: str | None
+	error: str | None
+	warning: str | None = None
+
+
+def _namespace(command: str, positionals: list[str], values: dict[str, Any], interactive: bool) -> Namespace:
+	"""The arguments of the command as parsed from the command line, with the given values
+	
+	:param values: values of the arguments by the names of the request, None keeps the default"""
+	namespace: Namespace = build_parser([command]).parse_args([command, *positionals])
+	
+	for key, value in values.items():
+		if value is not None:
+			setattr(namespace, DESTINATIONS.get(key, key), value)
+	
+	namespace.interactive = interactive
+	
+	return complete_namespace(namespace)
+
+
+class FabricdwClient:
+	"""Runs the operations of the command line with typed requests, without a process per operation.
+	The config is loaded once and written after every operation, which changed it."""
+	
+	def __init__(self, interactive: bool = False):
+		"""
+		:param interactive: ask questions in the terminal, instead of raising InteractionRequiredError"""
+		self.interactive: bool = interactive
+		self._locks: dict[str, threading.Lock] = { }
+		self._locks_lock: threading.Lock = threading.Lock()
+	
+	@contextmanager
+	def locked(self, *names: str) -> Iterator[None]:
+		"""Operations on the installations of these names wait for each other. The locks are always taken in the
+		same order, so operations on several installations do not deadlock."""
+		with self._locks_lock:
+			locks: list[threading.Lock] = [
+				self._locks.setdefault(name, threading.Lock()) for name in sorted(set(names))
+			]
+		
+		for lock in locks:
+			lock.acquire()
+		
+		try:
+			yield
+		finally:
+			for lock in reversed(locks):
+				lock.release()
+	
+	def run(self, namespace: Namespace, operation: Callable[[], T], *names: str) -> T:
+		"""Run the operation with the arguments, while holding the locks of the installations, and write the config
+		
+		:param names: the installations, which the operation changes"""
+		with self.locked(*names), scoped_args(namespace):
+			try:
+				return operation()
+			finally:
+				write_config()
+	
+	def installations(self) -> list[Installation]:
+		return CONFIG.installations
+	
+	def get(self, name: str) -> Installation:
+		"""
+		:raises InstallationDoesNotExistError: if there is no installation of the name"""
+		return Installation.ensure_exists(name)
+	
+	def create(self, request: CreateRequest) -> Installation | None:
+		"""
+		:returns: the new installation, None if the question to write into a non-empty directory was declined"""
+		from fabricdw.installations.create import create_installation
+		
+		return self.run(
+			_namespace("create", [request.name], asdict(request), self.interactive), create_installation, request.name
+		)
+	
+	def copy(self, request: CopyRequest) -> Installation | None:
+		"""
+		:returns: the copy, None if the question to write into a non-empty directory was declined"""
+		from fabricdw.installations.copy import copy_installation
+		
+		return self.run(
+			_namespace("copy", [request.source, request.target], asdict(request), self.interactive), copy_installation,
+			request.source, request.target
+		)
+	
+	def update(self, request: UpdateRequest) -> list[UpdateReport]:
+		from fabricdw.installations.update import update_installation
+		
+		names: list[str] = [request.name] if request.name is not None else [i.name for i in CONFIG.installations]
+		results = self.run(_namespace("update", [], asdict(request), self.interactive), update_installation, *names)
+		
+		return [
+			UpdateReport(
+				result.installation.name,
+				str(result.old_versions) if result.old_versions is not None else None,
+				str(result.installation.versions) if result.error is None else None,
+				str(result.error) if result.error is not None else None,
+				result.warning
+			)
+			for result in results
+		]
+	
+	def delete(self, name: str, retention: float | None = None) -> None:
+		"""
+		:param retention: hours, in which the installation can be restored. Defaults to the config"""
+		from fabricdw.installations.delete import delete_installation
+		
+		self.run(
+			_namespace("delete", [name], { "skip_delete_question": True, "retention": retention }, self.interactive),
+			delete_installation, name
+		)
+	
+	def move(self, name: str, directory: str, allow_non_empty: bool = False) -> Installation:
+		from fabricdw.installations.change import move_installation
+		
+		self.run(
+			_namespace("move", [name, directory], { "allow_non_empty": allow_non_empty }, self.interactive),
+			move_installation, name
+		)
+		
+		return self.get(name)
+	
+	def rename(self, name: str, new_name: str) -> Installation:
+		from fabricdw.installations.change import rename_installation
+		
+		self.run(_namespace("rename", [name, new_name], { }, self.interactive), rename_installation, name, new_name)
+		
+		return self.get(new_name)
+	
+	def get_properties(self, name: str) -> dict[str, str]:
+		from fabricdw.properties import read_properties
+		
+		return read_properties(f"{self.get(name).root}/{SERVER_PROPERTIES_FILE}")
+	
+	def set_properties(self, name: str, properties: dict[str, str | None]) -> dict[str, tuple[str | None, str | None]]:
+		"""Change the server.properties of the installation, None removes a property. Missing properties are added,
+		a changed server port is also given to the wrapper
+		
+		:returns: the old and new value of each changed property"""
+		from fabricdw.installations.registry import register_installations
+		from fabricdw.properties.fleet import edit_installation_properties
+		
+		with self.locked(name):
+			installation: Installation = self.get(name)
+			changed = edit_installation_properties(installation, properties)
+			
+			if len(changed) > 0:
+				register_installations([installation])
+			
+			return changed
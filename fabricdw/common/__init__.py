@@ -1,9 +1,10 @@
 # METHODS MUST BE FIRST
 # CONFIG REQUIRES SOME METHODS
 from fabricdw.common.methods import (absolute_path, ask_okay_to_write_into, convert_bool_to_str, convert_str_to_bool,
-	remove_dir, yes_no_question)
-from fabricdw.common.config import (CONFIG, Config, Defaults, Installation, InstallationAlreadyExistError,
-	InstallationDoesNotExistError, InvalidCombinationException, VersionChoice, write_config)
+	ensure_interactive, InteractionRequiredError, remove_dir, yes_no_question)
+from fabricdw.common.config import (Affinity, CACHE_DIR, CONFIG, Config, Defaults, Installation,
+	InstallationAlreadyExistError, InstallationDoesNotExistError, InvalidCombinationException, VersionChoice, Versions,
+	write_config)
 
 SERVER_JAR_FILE: str = "fabric-server-launch.jar"
 SERVER_PROPERTIES_FILE: str = "server.properties"
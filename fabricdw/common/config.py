@@ -1,15 +1,20 @@
 from __future__ import annotations
 
+import fcntl
 import json
+import os
+import threading
 from enum import StrEnum
 from os.path import exists, isdir
-from typing import TypeVar
+from typing import NamedTuple, TypeVar
 
 from colorama import Fore, Style
 
 from fabricdw.common import absolute_path
 
 CONFIG_FILE: str = absolute_path("~/.config/fabricdw.json")
+CONFIG_LOCK_FILE: str = f"{CONFIG_FILE}.lock"
+CACHE_DIR: str = absolute_path(f"{os.environ.get('XDG_CACHE_HOME', '~/.cache')}/fabricdw")
 
 _T = TypeVar("_T")
 
@@ -33,18 +38,47 @@ class InstallationAlreadyExistError(Exception):
 
 
 class InvalidCombinationException(Exception):
-	def __init__(self):
-		super().__init__("Invalid combination of game, loader, and installer version!")
+	def __init__(self, reason: str | None = None, subject: str = "game, loader, and installer version"):
+		super().__init__(
+			f"{Fore.RED}Invalid combination of {subject}!"
+			f"{f' {reason}' if reason else ''}{Style.RESET_ALL}"
+		)
 
 
 class VersionChoice(StrEnum):
 	ASK = "ask"
 	LATEST = "latest"
+	# keep the game version of each installation, only valid for updates
+	KEEP = "keep"
+
+
+class Versions(NamedTuple):
+	game: str
+	loader: str
+	installer: str
+	
+	def __str__(self) -> str:
+		return f"{self.game} (loader {self.loader}, installer {self.installer})"
+	
+	def key(self) -> str:
+		return f"{self.game}/{self.loader}/{self.installer}"
+
+
+class Affinity(NamedTuple):
+	# the logical CPUs of the server, e.g. '0-3,8-11'
+	cpus: str
+	# the NUMA node of the server, None on hosts with a single node
+	node: int | None = None
+	
+	def __str__(self) -> str:
+		return f"CPUs {self.cpus}" + (f" on node {self.node}" if self.node is not None else "")
 
 
 class DictSerialization:
 	"""A class, which can be serialized and deserialized to and from a dict"""
 	
+	__slots__ = ()
+	
 	def to_dict(self) -> dict:
 		"""Serialize to a dict"""
 		pass
@@ -56,9 +90,15 @@ class DictSerialization:
 
 
 class Installation(DictSerialization):
-	def __init__(self, name: str, root: str):
+	__slots__ = ("name", "root", "versions", "affinity")
+	
+	def __init__(self, name: str, root: str, versions: Versions | None = None, affinity: Affinity | None = None):
 		self.name = name
 		self.root = root
+		# unknown for imported installations and ones created by older versions
+		self.versions = versions
+		# None if the server may run on all CPUs
+		self.affinity = affinity
 	
 	def __eq__(self, other):
 		if isinstance(other, Installation):
@@ -70,10 +110,23 @@ class Installation(DictSerialization):
 	
 	@classmethod
 	def from_dict(cls, data: dict) -> Installation:
-		return cls(data["name"], data["root"])
+		versions = data.get("versions")
+		affinity = data.get("affinity")
+		return cls(
+			data["name"], data["root"], Versions(**versions) if versions else None,
+			Affinity(**affinity) if affinity else None
+		)
 	
 	def to_dict(self) -> dict:
-		return { 'root': self.root, 'name': self.name }
+		data = { 'root': self.root, 'name': self.name }
+		
+		if self.versions is not None:
+			data["versions"] = self.versions._asdict()
+		
+		if self.affinity is not None:
+			data["affinity"] = self.affinity._asdict()
+		
+		return data
 	
 	def pretty_name(self, after: Fore = None) -> str:
 		return Installation.pretty_name_str(self.name, after)
@@ -87,8 +140,8 @@ class Installation(DictSerialization):
 		if ((installation := CONFIG.get_installation(name)) is None or not exists(installation.root) or not isdir(
 			installation.root
 		)):
-			if remove_if_missing:
-				CONFIG.remove_installation(Installation(name, ""))
+			if remove_if_missing and installation is not None:
+				CONFIG.remove_installation(installation)
 			
 			raise InstallationDoesNotExistError(name)
 		
@@ -101,11 +154,21 @@ class Installation(DictSerialization):
 
 
 class Defaults(DictSerialization):
+	__slots__ = (
+		"min_ram", "max_ram", "idle_time", "backups", "meta_cache_ttl", "image_max_age", "image_max_size",
+		"trash_retention"
+	)
+	
 	def __init__(self, data: dict):
 		self.min_ram = _default_get(data, "min-ram", 0.5)
 		self.max_ram = _default_get(data, "max-ram", 6)
 		self.idle_time = _default_get(data, "idle_time", 0)
 		self.backups = _default_get(data, "backups", 5)
+		self.meta_cache_ttl = _default_get(data, "meta-cache-ttl", 3600)
+		self.image_max_age = _default_get(data, "image-max-age", 30)
+		self.image_max_size = _default_get(data, "image-max-size", 5)
+		# hours, in which deleted installations can be restored
+		self.trash_retention = _default_get(data, "trash-retention", 0)
 	
 	@classmethod
 	def from_dict(cls, data: dict) -> Defaults:
@@ -113,14 +176,45 @@ class Defaults(DictSerialization):
 	
 	def to_dict(self) -> dict:
 		return {
-			"min-ram": self.min_ram, "max-ram": self.max_ram, "idle_time": self.idle_time, "backups": self.backups
+			"min-ram": self.min_ram, "max-ram": self.max_ram, "idle_time": self.idle_time, "backups": self.backups,
+			"meta-cache-ttl": self.meta_cache_ttl, "image-max-age": self.image_max_age,
+			"image-max-size": self.image_max_size, "trash-retention": self.trash_retention
 		}
 
 
+def _warn_duplicate(installation: Installation, key: str) -> None:
+	print(
+		f"{Fore.YELLOW}{installation.pretty_name(Fore.YELLOW)} ({installation.root}) has the same {key} as an earlier "
+		f"installation of the config, ignoring it{Style.RESET_ALL}"
+	)
+
+
 class Config(DictSerialization):
+	"""The installations are indexed by name and root. Their order is the one of the config file."""
+	
+	__slots__ = ("defaults", "_by_name", "_by_root", "_base", "_file_mtime")
+	
 	def __init__(self, default: Defaults, installations: list[Installation]):
 		self.defaults: Defaults = default
-		self.installations: list[Installation] = installations
+		self._by_name: dict[str, Installation] = { }
+		self._by_root: dict[str, Installation] = { }
+		# the config as it was loaded or last written, to find the changes of this process
+		self._base: dict = { "defaults": { }, "installations": [] }
+		# of the config file, when it was loaded or last written
+		self._file_mtime: int | None = None
+		
+		for installation in installations:
+			if installation.name in self._by_name:
+				_warn_duplicate(installation, "name")
+			elif installation.root in self._by_root:
+				_warn_duplicate(installation, "root")
+			else:
+				self.add_installation(installation)
+	
+	@property
+	def installations(self) -> list[Installation]:
+		"""All installations, in order. Changes to the list are not applied to the config."""
+		return list(self._by_name.values())
 	
 	@classmethod
 	def from_dict(cls, data: dict) -> Config:
@@ -132,12 +226,14 @@ class Config(DictSerialization):
 	def to_dict(self) -> dict:
 		return {
 			'defaults': self.defaults.to_dict(),
-			'installations': [installation.to_dict() for installation in self.installations]
+			'installations': [installation.to_dict() for installation in self._by_name.values()]
 		}
 	
-	def create_new_installation(self, name: str, root: str, print_message: bool = True) -> Installation:
-		self.installations.append(
-			installation := Installation(name, root)
+	def create_new_installation(
+		self, name: str, root: str, print_message: bool = True, versions: Versions | None = None
+	) -> Installation:
+		self.add_installation(
+			installation := Installation(name, root, versions)
 		)
 		
 		if print_message:
@@ -145,32 +241,177 @@ class Config(DictSerialization):
 		
 		return installation
 	
+	def add_installation(self, installation: Installation) -> None:
+		self._by_name[installation.name] = installation
+		self._by_root[installation.root] = installation
+	
 	def remove_installation(self, installation: Installation) -> None:
 		"""Removes the installation from the list of installations, however does not delete it."""
-		self.installations.remove(installation)
+		self._by_name.pop(installation.name, None)
+		
+		if self._by_root.get(installation.root) is installation:
+			del self._by_root[installation.root]
+	
+	def rename_installation(self, installation: Installation, name: str) -> None:
+		"""Change the name of the installation, keeping its position"""
+		self._by_name = { (name if key == installation.name else key): value for key, value in self._by_name.items() }
+		installation.name = name
+	
+	def move_installation(self, installation: Installation, root: str) -> None:
+		"""Change the root of the installation"""
+		self._by_root.pop(installation.root, None)
+		installation.root = root
+		self._by_root[root] = installation
 	
 	def get_installation(self, name: str) -> Installation | None:
-		for installation in self.installations:
-			if installation.name == name:
-				return installation
+		return self._by_name.get(name)
+	
+	def is_dirty(self) -> bool:
+		return self.to_dict() != self._base
+	
+	def mark_clean(self, written: dict | None = None, up_to_date: bool = True) -> None:
+		"""
+		:param written: the state, which was written. Later changes stay dirty
+		:param up_to_date: whether the file holds the state of this process. Otherwise the config is outdated, the file
+			also has changes of other processes"""
+		self._base = written if written is not None else self.to_dict()
+		self._file_mtime = _config_file_mtime() if up_to_date else None
+	
+	def is_outdated(self) -> bool:
+		"""Whether another process wrote the config file since it was loaded or written by this process"""
+		return self._file_mtime != _config_file_mtime()
+	
+	def merge_into(self, theirs: dict, ours: dict | None = None) -> dict:
+		"""Apply the changes of this process to the config of the file, which other processes may have changed.
+		Installations, which this process did not change, keep the state of the file.
+		
+		:param ours: the state of this process, defaults to the current one
+		
+		:returns: the merged config"""
+		if ours is None:
+			ours = self.to_dict()
 		
+		base_installations: dict[str, dict] = { i["name"]: i for i in self._base["installations"] }
+		our_installations: dict[str, dict] = { i["name"]: i for i in ours["installations"] }
+		merged_installations: dict[str, dict] = { }
+		
+		# the first installation of a name is kept, like when loading the config
+		for installation in theirs["installations"]:
+			merged_installations.setdefault(installation["name"], installation)
+		
+		for name in [*our_installations, *(name for name in base_installations if name not in our_installations)]:
+			if our_installations.get(name) == base_installations.get(name):
+				continue
+			
+			if name in our_installations:
+				merged_installations[name] = our_installations[name]
+			else:
+				merged_installations.pop(name, None)
+		
+		return {
+			"defaults": ours["defaults"] if ours["defaults"] != self._base["defaults"] else theirs["defaults"],
+			"installations": list(merged_installations.values())
+		}
+	
+	def get_installation_by_root(self, root: str) -> Installation | None:
+		return self._by_root.get(root)
+
+
+def _config_file_mtime() -> int | None:
+	try:
+		return os.stat(CONFIG_FILE).st_mtime_ns
+	except OSError:
 		return None
 
 
-def _load_config() -> Config:
+def _read_config_file() -> dict:
 	if exists(CONFIG_FILE):
 		with open(CONFIG_FILE, 'r') as cfg:
-			raw = json.load(cfg)
+			return json.load(cfg)
+	
+	return { "defaults": { }, 'installations': [] }
+
+
+def _load_config() -> Config:
+	config: Config = Config.from_dict(_read_config_file())
+	
+	# a new config stays dirty, the next write_config creates the file
+	if exists(CONFIG_FILE):
+		config.mark_clean()
 	else:
 		print("config file missing, creating new")
-		raw = { "defaults": { }, 'installations': [] }
 	
-	return Config.from_dict(raw)
+	return config
 
 
-CONFIG: Config = _load_config()
+_load_lock: threading.Lock = threading.Lock()
+
+
+class _LazyConfig:
+	"""Loads the config on first access, commands like '--help' never read it"""
+	
+	__slots__ = ("_config",)
+	
+	def __init__(self):
+		self._config: Config | None = None
+	
+	def __getattr__(self, name: str):
+		# only called for attributes of the config, _config is a slot
+		if self._config is None:
+			# operations of parallel threads load it once
+			with _load_lock:
+				if self._config is None:
+					self._config = _load_config()
+		
+		return getattr(self._config, name)
+	
+	def is_loaded(self) -> bool:
+		return self._config is not None
+	
+	def refresh(self) -> None:
+		"""Load the config again on its next use, if another process changed it and this process did not.
+		Long running processes call it, while no operation uses the config."""
+		with _load_lock:
+			if self._config is not None and not self._config.is_dirty() and self._config.is_outdated():
+				self._config = None
+
+
+CONFIG: Config = _LazyConfig()
+_write_lock: threading.Lock = threading.Lock()
 
 
 def write_config() -> None:
-	with open(CONFIG_FILE, "w") as config:
-		json.dump(CONFIG.to_dict(), config, indent=4)
+	"""Write the changes of this process, if there are any. Changes of other processes, which ran at the same time,
+	are merged. The file is replaced atomically, an interruption never leaves a partial config."""
+	if not CONFIG.is_loaded() or not CONFIG.is_dirty():
+		return
+	
+	config_directory: str = os.path.dirname(CONFIG_FILE)
+	os.makedirs(config_directory, exist_ok=True)
+	
+	# only the merge is serialized, not the commands. Threads of one process write one after another
+	with _write_lock, open(CONFIG_LOCK_FILE, "w") as lock:
+		fcntl.flock(lock, fcntl.LOCK_EX)
+		
+		# operations of other threads may change the config while it is written
+		ours: dict = CONFIG.to_dict()
+		merged: dict = CONFIG.merge_into(_read_config_file(), ours)
+		
+		temporary_file: str = f"{CONFIG_FILE}.{os.getpid()}.tmp"
+		
+		with open(temporary_file, "w") as config:
+			json.dump(merged, config, indent=4)
+			config.flush()
+			os.fsync(config.fileno())
+		
+		os.replace(temporary_file, CONFIG_FILE)
+		
+		# make the rename itself durable
+		directory_fd: int = os.open(config_directory, os.O_RDONLY | os.O_DIRECTORY)
+		try:
+			os.fsync(directory_fd)
+		finally:
+			os.close(directory_fd)
+		
+		# the changes of other processes are only in the file, refresh() loads them
+		CONFIG.mark_clean(ours, merged == ours)
@@ -0,0 +1,357 @@
+from __future__ import annotations
+
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from fnmatch import fnmatch
+from typing import Any
+
+# from linux/fs.h
+FICLONE: int = 0x40049409
+HASH_CHUNK_SIZE: int = 256 * 1024
+COPY_CHUNK_SIZE: int = 64 * 1024 * 1024
+COPY_JOBS: int = 16
+# gitignore like: a trailing slash only matches directories, a leading slash only matches at the top
+DEFAULT_COPY_EXCLUDES: list[str] = ["backup/", "logs/", "crash-reports/", "*.jar-bak"]
+
+# parsed JSON files by path, with the inode, modification time, and size they were parsed at
+_json_cache: dict[str, tuple[tuple[int, int, int], Any]] = { }
+_json_cache_lock: threading.Lock = threading.Lock()
+
+
+def file_sha256(file: str) -> str:
+	digest = hashlib.sha256()
+	
+	with open(file, "rb") as data:
+		while chunk := data.read(HASH_CHUNK_SIZE):
+			digest.update(chunk)
+	
+	return digest.hexdigest()
+
+
+def read_json(file: str) -> Any:
+	"""The parsed JSON file. A long running process only parses the file again, after it was replaced or changed.
+	The result is shared, callers must copy it before changing it.
+	
+	:raises OSError: if the file cannot be read
+	:raises ValueError: if the file is not valid JSON"""
+	file_stat: os.stat_result = os.stat(file)
+	key: tuple[int, int, int] = (file_stat.st_ino, file_stat.st_mtime_ns, file_stat.st_size)
+	
+	with _json_cache_lock:
+		if (cached := _json_cache.get(file)) is not None and cached[0] == key:
+			return cached[1]
+	
+	with open(file, "r") as json_file:
+		data: Any = json.load(json_file)
+	
+	with _json_cache_lock:
+		_json_cache[file] = (key, data)
+	
+	return data
+
+
+def reflink(source: str, target: str) -> None:
+	"""Clone the source into target, sharing the data blocks (btrfs, XFS, ...)
+	
+	:raises OSError: if the filesystem does not support reflinks"""
+	with open(source, "rb") as source_file, open(target, "wb") as target_file:
+		try:
+			fcntl.ioctl(target_file.fileno(), FICLONE, source_file.fileno())
+		except OSError:
+			target_file.close()
+			os.remove(target)
+			raise
+
+
+def link_or_copy(source: str, target: str, hardlink: bool = True, symlink: bool = True) -> str:
+	"""Place the source file at target, by the cheapest available method.
+	Tries a hardlink, a reflink, and a symlink, before falling back to a copy.
+	The target is replaced atomically.
+	
+	:param hardlink: allow hardlinks, only for files which are never written to in place
+	:param symlink: allow symlinks, only for sources which outlive the target
+	
+	:returns: the method used"""
+	temporary_file: str = f"{target}.{os.getpid()}.link"
+	
+	if os.path.lexists(temporary_file):
+		os.remove(temporary_file)
+	
+	methods = [
+		("hardlink", os.link),
+		("reflink", reflink),
+		("symlink", lambda s, t: os.symlink(os.path.abspath(s), t)),
+		("copy", shutil.copy2),
+	]
+	
+	for method, function in methods:
+		if (method == "hardlink" and not hardlink) or (method == "symlink" and not symlink):
+			continue
+		
+		try:
+			function(source, temporary_file)
+		except OSError:
+			continue
+		
+		os.replace(temporary_file, target)
+		
+		# renaming onto a hardlink of the same file does nothing
+		if os.path.lexists(temporary_file):
+			os.remove(temporary_file)
+		
+		return method
+	
+	raise OSError(f"could not link or copy '{source}' to '{target}'")
+
+
+def copy_file_range(source: str, target: str) -> None:
+	"""Copy the source into target within the kernel, without passing the data through this process
+	
+	:raises OSError: if the kernel or filesystem does not support it"""
+	with open(source, "rb") as source_file, open(target, "wb") as target_file:
+		try:
+			while os.copy_file_range(source_file.fileno(), target_file.fileno(), COPY_CHUNK_SIZE) > 0:
+				pass
+		except OSError:
+			target_file.close()
+			os.remove(target)
+			raise
+
+
+def copy_file(source: str, target: str) -> str:
+	"""Copy the source file to target with metadata, by the cheapest available method.
+	Tries a reflink and copy_file_range, before falling back to a regular copy.
+	
+	:returns: the method used"""
+	for method, function in [("reflink", reflink), ("copy_file_range", copy_file_range)]:
+		try:
+			function(source, target)
+		except OSError:
+			continue
+		
+		shutil.copystat(source, target)
+		return method
+	
+	shutil.copy2(source, target)
+	return "copy"
+
+
+def is_excluded(relative_path: str, is_directory: bool, exclude: list[str]) -> bool:
+	"""Whether the path (relative to the copied directory) matches one of the patterns"""
+	for pattern in exclude:
+		if pattern.endswith("/"):
+			if not is_directory:
+				continue
+			pattern = pattern.removesuffix("/")
+		
+		if pattern.startswith("/"):
+			if fnmatch(relative_path, pattern.removeprefix("/")):
+				return True
+		elif fnmatch(os.path.basename(relative_path), pattern) or fnmatch(relative_path, pattern):
+			return True
+	
+	return False
+
+
+class CopyStats:
+	"""The result of copying a directory"""
+	
+	def __init__(self):
+		self.files: int = 0
+		self.bytes: int = 0
+		self.seconds: float = 0
+		self.methods: Counter[str] = Counter()
+		self._lock: threading.Lock = threading.Lock()
+	
+	def add(self, size: int, method: str) -> None:
+		with self._lock:
+			self.files += 1
+			self.bytes += size
+			self.methods[method] += 1
+	
+	def __str__(self) -> str:
+		mib: float = self.bytes / (1024 * 1024)
+		methods: str = ", ".join(f"{method}: {count}" for method, count in self.methods.most_common())
+		
+		return (
+			f"{self.files} files ({mib:.1f} MiB) in {self.seconds:.1f}s, {mib / max(self.seconds, 0.001):.1f} MiB/s"
+			+ (f" ({methods})" if methods else "")
+		)
+
+
+def _is_unchanged(source_file: str, target_file: str) -> bool:
+	"""Whether the target is a complete copy of the source. Copies get the modification time last."""
+	try:
+		source_stat: os.stat_result = os.stat(source_file)
+		target_stat: os.stat_result = os.stat(target_file)
+	except OSError:
+		return False
+	
+	return source_stat.st_size == target_stat.st_size and source_stat.st_mtime_ns == target_stat.st_mtime_ns
+
+
+def copy_tree(
+	source: str, target: str, exclude: list[str] | None = None, jobs: int = COPY_JOBS, skip_unchanged: bool = False
+) -> CopyStats:
+	"""Copy the directory into target (which may exist), copying the files in parallel.
+	Symlinks are copied as symlinks.
+	
+	:param exclude: patterns of files and directories, which are not copied. See DEFAULT_COPY_EXCLUDES
+	:param jobs: how many files are copied in parallel
+	:param skip_unchanged: skip files, which already have the same size and modification time in target.
+		Resumes an interrupted copy
+	
+	:returns: what was copied"""
+	exclude = exclude or []
+	stats: CopyStats = CopyStats()
+	start: float = time.perf_counter()
+	directories: list[str] = []
+	
+	def copy(relative_file: str) -> None:
+		source_file: str = os.path.join(source, relative_file)
+		target_file: str = os.path.join(target, relative_file)
+		size: int = os.path.getsize(source_file)
+		
+		if skip_unchanged and _is_unchanged(source_file, target_file):
+			stats.add(size, "unchanged")
+			return
+		
+		stats.add(size, copy_file(source_file, target_file))
+	
+	with ThreadPoolExecutor(max_workers=jobs) as executor:
+		futures = []
+		
+		for root, directory_names, files in os.walk(source):
+			relative_root: str = os.path.relpath(root, source)
+			
+			os.makedirs(os.path.join(target, relative_root), exist_ok=True)
+			directories.append(relative_root)
+			
+			# os.walk does not descend into symlinked directories, they are copied as symlinks below
+			for name in directory_names.copy():
+				relative_path: str = os.path.normpath(os.path.join(relative_root, name))
+				
+				if is_excluded(relative_path, True, exclude):
+					directory_names.remove(name)
+				elif os.path.islink(os.path.join(root, name)):
+					files.append(name)
+			
+			for name in files:
+				relative_file: str = os.path.normpath(os.path.join(relative_root, name))
+				
+				if is_excluded(relative_file, False, exclude):
+					continue
+				
+				if os.path.islink(source_file := os.path.join(root, name)):
+					target_file: str = os.path.join(target, relative_file)
+					
+					if os.path.lexists(target_file):
+						os.remove(target_file)
+					
+					os.symlink(os.readlink(source_file), target_file)
+					continue
+				
+				futures.append(executor.submit(copy, relative_file))
+		
+		for future in futures:
+			future.result()
+	
+	# copying files into the directories changes their modification times
+	for relative_root in reversed(directories):
+		shutil.copystat(os.path.join(source, relative_root), os.path.join(target, relative_root))
+	
+	stats.seconds = time.perf_counter() - start
+	
+	return stats
+
+
+def verify_tree(source: str, target: str, jobs: int = COPY_JOBS) -> tuple[CopyStats, list[str]]:
+	"""Compare the SHA-256 of all files of source with the ones in target, in parallel
+	
+	:returns: what was verified, and the files, which differ or are missing in target"""
+	stats: CopyStats = CopyStats()
+	start: float = time.perf_counter()
+	
+	def verify(relative_file: str) -> str | None:
+		source_file: str = os.path.join(source, relative_file)
+		target_file: str = os.path.join(target, relative_file)
+		
+		stats.add(os.path.getsize(source_file), "sha256")
+		
+		if not os.path.isfile(target_file) or file_sha256(source_file) != file_sha256(target_file):
+			return relative_file
+		
+		return None
+	
+	relative_files: list[str] = [
+		os.path.relpath(os.path.join(root, file), source)
+		for root, _, files in os.walk(source)
+		for file in files
+		if not os.path.islink(os.path.join(root, file))
+	]
+	
+	with ThreadPoolExecutor(max_workers=jobs) as executor:
+		differing: list[str] = [file for file in executor.map(verify, relative_files) if file is not None]
+	
+	stats.seconds = time.perf_counter() - start
+	
+	return stats, differing
+
+
+def _remove_files(directory: str) -> list[str]:
+	"""Unlink all non-directories of the directory, relative to its file descriptor
+	
+	:returns: the subdirectories"""
+	try:
+		directory_fd: int = os.open(directory, os.O_RDONLY | os.O_DIRECTORY | os.O_NOFOLLOW)
+	except FileNotFoundError:
+		return []
+	
+	subdirectories: list[str] = []
+	
+	try:
+		with os.scandir(directory_fd) as entries:
+			for entry in entries:
+				if entry.is_dir(follow_symlinks=False):
+					subdirectories.append(os.path.join(directory, entry.name))
+					continue
+				
+				try:
+					os.unlink(entry.name, dir_fd=directory_fd)
+				except FileNotFoundError:
+					pass
+	finally:
+		os.close(directory_fd)
+	
+	return subdirectories
+
+
+def remove_tree(directory: str, jobs: int = COPY_JOBS) -> None:
+	"""Remove the directory with all of its contents, emptying the directories in parallel.
+	Symlinks are removed, never followed."""
+	directories: list[str] = [directory]
+	
+	with ThreadPoolExecutor(max_workers=jobs) as executor:
+		pending: set[Future[list[str]]] = { executor.submit(_remove_files, directory) }
+		
+		while pending:
+			done, pending = wait(pending, return_when=FIRST_COMPLETED)
+			
+			for future in done:
+				for subdirectory in future.result():
+					directories.append(subdirectory)
+					pending.add(executor.submit(_remove_files, subdirectory))
+	
+	# parents are always listed before their subdirectories
+	for empty_directory in reversed(directories):
+		try:
+			os.rmdir(empty_directory)
+		except FileNotFoundError:
+			pass
@@ -1,12 +1,28 @@
 import os.path
 import shutil
 
-from pick import pick
-
 from fabricdw.args import args
 
 
+class InteractionRequiredError(Exception):
+	def __init__(self, question: str):
+		super().__init__(f"Cannot answer '{question}' without asking")
+
+
+def ensure_interactive(question: str) -> None:
+	"""Operations of the API only ask, if they are allowed to
+	
+	:raises InteractionRequiredError: if the question cannot be asked"""
+	if not getattr(args(), "interactive", True):
+		raise InteractionRequiredError(question)
+
+
 def yes_no_question(question: str, yes_first: bool = False) -> bool:
+	ensure_interactive(question)
+	
+	# only imported, when there is a question
+	from pick import pick
+	
 	options = ["No", "Yes"]
 	
 	if yes_first:
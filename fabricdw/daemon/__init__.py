@@ -0,0 +1,57 @@
+"""A long running fabricdw process, which keeps the config and caches in memory. Other processes send it requests on
+a Unix socket: JSON objects, one per line, each answered by one JSON object.
+
+Only the client side is here, the command line imports it on every run."""
+import json
+import os
+import socket
+import sys
+from typing import Any
+
+SOCKET_FILE: str = f"{os.environ.get('XDG_RUNTIME_DIR', '/tmp')}/fabricdw-{os.getuid()}.sock"
+DAEMON_JOBS: int = 8
+# set to run commands in the own process, although a daemon is running
+NO_DAEMON_VARIABLE: str = "FABRICDW_NO_DAEMON"
+
+
+def send_request(message: dict[str, Any]) -> dict[str, Any]:
+	"""Send the request to the daemon and wait for its response
+	
+	:raises OSError: if no daemon is running"""
+	with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+		connection.connect(SOCKET_FILE)
+		connection.sendall(json.dumps(message).encode() + b"\n")
+		
+		with connection.makefile("r") as stream:
+			line: str = stream.readline()
+	
+	if not line:
+		raise ConnectionResetError("the daemon closed the connection")
+	
+	return json.loads(line)
+
+
+def forward_to_daemon(argv: list[str]) -> bool:
+	"""Run the command line in the daemon, if one is running, and print its output
+	
+	:returns: False if the command must run in this process: there is no daemon, or the command has to ask
+	:raises SystemExit: if the command failed in the daemon"""
+	if os.environ.get(NO_DAEMON_VARIABLE) or not os.path.exists(SOCKET_FILE):
+		return False
+	
+	try:
+		response: dict[str, Any] = send_request({ "command": "run", "argv": argv, "cwd": os.getcwd() })
+	except OSError:
+		# a socket left behind by a daemon, which did not exit cleanly
+		return False
+	
+	if response.get("interaction_required"):
+		return False
+	
+	print(response.get("output", ""), end="")
+	
+	if not response["ok"]:
+		print(f"Error during processing: {response['error']}")
+		sys.exit(1)
+	
+	return True
@@ -0,0 +1,324 @@
+from __future__ import annotations
+
+import io
+import json
+import os
+import signal
+import socketserver
+import sys
+import threading
+import time
+import traceback
+from argparse import Namespace
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import asdict
+from typing import Any, Callable, Iterator, TextIO, TypeVar
+
+from colorama import Fore, Style
+
+from fabricdw.args import args, parse_namespace
+from fabricdw.client import CreateRequest, FabricdwClient, UpdateRequest
+from fabricdw.common import CONFIG, InteractionRequiredError
+from fabricdw.daemon import send_request, SOCKET_FILE
+from fabricdw.properties.index import load_fleet_properties
+
+# latencies of the last requests of each command, for the percentiles of 'status'
+LATENCY_WINDOW: int = 1000
+# commands, which do not change installations, and run without waiting for others
+READ_ONLY_COMMANDS: list[str] = ["list", "query", "status"]
+# options, with which these commands change installations nonetheless
+WRITING_OPTIONS: list[str] = ["verify"]
+READ_ONLY_PROPERTY_ACTIONS: list[str] = ["get", "show"]
+
+T = TypeVar("T")
+
+
+class _ThreadOutput(io.TextIOBase):
+	"""The standard output of the daemon. Each request prints into its own buffer, which is sent with the response.
+	Thread pools within a request print into it, if their functions are bound (bind_args). Everything else goes to
+	the log of the daemon."""
+	
+	def __init__(self, stream: TextIO):
+		self._stream: TextIO = stream
+		self._local = threading.local()
+	
+	def _target(self) -> TextIO:
+		return getattr(self._local, "buffer", None) or self._stream
+	
+	@contextmanager
+	def capture(self, buffer: io.StringIO | None = None) -> Iterator[io.StringIO]:
+		""":param buffer: the buffer to print into, defaults to a new one"""
+		previous: io.StringIO | None = getattr(self._local, "buffer", None)
+		self._local.buffer = buffer if buffer is not None else io.StringIO()
+		
+		try:
+			yield self._local.buffer
+		finally:
+			self._local.buffer = previous
+	
+	def bind(self, function: Callable[..., T]) -> Callable[..., T]:
+		"""The function printing into the buffer of the calling thread, wherever it runs"""
+		buffer: io.StringIO | None = getattr(self._local, "buffer", None)
+		
+		if buffer is None:
+			return function
+		
+		def call(*arguments, **keywords) -> T:
+			with self.capture(buffer):
+				return function(*arguments, **keywords)
+		
+		return call
+	
+	def write(self, text: str) -> int:
+		return self._target().write(text)
+	
+	def flush(self) -> None:
+		self._target().flush()
+	
+	def isatty(self) -> bool:
+		return False
+
+
+class Metrics:
+	"""Request counts, latencies, and the queue depth, as shown by 'status'"""
+	
+	def __init__(self):
+		self.lock: threading.Lock = threading.Lock()
+		self.started: float = time.time()
+		# received, but waiting for a free worker
+		self.queued: int = 0
+		self.running: int = 0
+		self.requests: Counter[str] = Counter()
+		self.errors: Counter[str] = Counter()
+		self.latencies: dict[str, deque[float]] = { }
+	
+	def record(self, command: str, seconds: float, ok: bool) -> None:
+		with self.lock:
+			self.requests[command] += 1
+			self.errors[command] += 0 if ok else 1
+			self.latencies.setdefault(command, deque(maxlen=LATENCY_WINDOW)).append(seconds * 1000)
+	
+	def to_dict(self) -> dict[str, Any]:
+		with self.lock:
+			commands: dict[str, Any] = { }
+			
+			for command, latencies in self.latencies.items():
+				ordered: list[float] = sorted(latencies)
+				commands[command] = {
+					"requests": self.requests[command],
+					"errors": self.errors[command],
+					"latency_ms": {
+						"mean": round(sum(ordered) / len(ordered), 2),
+						"p50": round(ordered[len(ordered) // 2], 2),
+						"p95": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 2),
+						"max": round(ordered[-1], 2),
+					}
+				}
+			
+			return {
+				"pid": os.getpid(),
+				"uptime": round(time.time() - self.started, 1),
+				"queue_depth": self.queued,
+				"running": self.running,
+				"commands": commands,
+			}
+
+
+def _fields(message: dict[str, Any]) -> dict[str, Any]:
+	return { key: value for key, value in message.items() if key != "command" }
+
+
+class Daemon:
+	"""Runs the requests in a pool of workers. Requests changing the same installation run one after another,
+	the others in parallel."""
+	
+	def __init__(self, jobs: int, output: _ThreadOutput):
+		self.client: FabricdwClient = FabricdwClient()
+		self.metrics: Metrics = Metrics()
+		self.output: _ThreadOutput = output
+		self.executor: ThreadPoolExecutor = ThreadPoolExecutor(max_workers=jobs, thread_name_prefix="request")
+		self.handlers: dict[str, Callable[[dict[str, Any]], Any]] = {
+			"list": self._list,
+			"create": self._create,
+			"update": self._update,
+			"set-property": self._set_property,
+			"status": self._status,
+			"run": self._run,
+		}
+	
+	def submit(self, message: dict[str, Any]) -> dict[str, Any]:
+		"""Queue the request and wait for its response"""
+		with self.metrics.lock:
+			self.metrics.queued += 1
+		
+		return self.executor.submit(self._handle, message, time.perf_counter()).result()
+	
+	def _handle(self, message: dict[str, Any], received: float) -> dict[str, Any]:
+		# unknown commands are counted together
+		command: str = message.get("command") if message.get("command") in self.handlers else "unknown"
+		
+		with self.metrics.lock:
+			self.metrics.queued -= 1
+			
+			# commands of other processes may have changed the config, it is only reloaded while no request uses it
+			if self.metrics.running == 0:
+				CONFIG.refresh()
+			
+			self.metrics.running += 1
+		
+		response: dict[str, Any] = { "ok": True }
+		
+		with self.output.capture() as buffer:
+			try:
+				if command == "unknown":
+					raise ValueError(
+						f"Unknown command '{message.get('command')}', expected one of {', '.join(self.handlers)}"
+					)
+				
+				response["result"] = self.handlers[command](message)
+			except InteractionRequiredError as error:
+				response = { "ok": False, "error": str(error), "interaction_required": True }
+			except Exception as error:
+				response = { "ok": False, "error": str(error) }
+				traceback.print_exc(file=sys.__stderr__)
+			finally:
+				with self.metrics.lock:
+					self.metrics.running -= 1
+		
+		response["output"] = buffer.getvalue()
+		self.metrics.record(command, time.perf_counter() - received, response["ok"])
+		
+		return response
+	
+	def _list(self, message: dict[str, Any]) -> list[dict]:
+		return [installation.to_dict() for installation in CONFIG.installations]
+	
+	def _create(self, message: dict[str, Any]) -> dict | None:
+		installation = self.client.create(CreateRequest(**_fields(message)))
+		
+		return installation.to_dict() if installation is not None else None
+	
+	def _update(self, message: dict[str, Any]) -> list[dict]:
+		return [asdict(report) for report in self.client.update(UpdateRequest(**_fields(message)))]
+	
+	def _set_property(self, message: dict[str, Any]) -> dict[str, str]:
+		self.client.set_properties(message["name"], message["properties"])
+		
+		return self.client.get_properties(message["name"])
+	
+	def _status(self, message: dict[str, Any]) -> dict[str, Any]:
+		return self.metrics.to_dict() | { "installations": len(CONFIG.installations) }
+	
+	def _run(self, message: dict[str, Any]) -> None:
+		"""A command line of another process, whose output is sent back"""
+		try:
+			namespace: Namespace = parse_namespace(message["argv"], message.get("cwd"))
+		except SystemExit:
+			raise ValueError(f"Invalid arguments: {' '.join(message['argv'])}")
+		
+		if namespace.command in (None, "serve"):
+			raise ValueError("The daemon cannot run this command")
+		
+		namespace.interactive = False
+		
+		named: list[str] = [
+			getattr(namespace, key) for key in ("name", "source", "target") if getattr(namespace, key, None) is not None
+		] + getattr(namespace, "names", [])
+		
+		read_only: bool = namespace.command in READ_ONLY_COMMANDS and not any(
+			getattr(namespace, option, False) for option in WRITING_OPTIONS
+		)
+		
+		if read_only or getattr(namespace, "dry_run", False) or (
+			namespace.command == "properties" and namespace.action in READ_ONLY_PROPERTY_ACTIONS
+		):
+			names: list[str] = []
+		elif len(named) > 0:
+			names = named
+		else:
+			# commands of all installations wait for the running ones
+			names = [installation.name for installation in CONFIG.installations]
+		
+		self.client.run(namespace, namespace.function, *names)
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+	def handle(self) -> None:
+		for line in self.rfile:
+			try:
+				message: Any = json.loads(line)
+				
+				if not isinstance(message, dict):
+					raise ValueError("a request must be a JSON object")
+			except ValueError as error:
+				response: dict[str, Any] = { "ok": False, "error": f"Invalid request ({error})" }
+			else:
+				response = self.server.fabricdw.submit(message)
+			
+			self.wfile.write(json.dumps(response).encode() + b"\n")
+
+
+class _Server(socketserver.ThreadingUnixStreamServer):
+	daemon_threads = True
+	
+	def __init__(self, socket_file: str, daemon: Daemon):
+		self.fabricdw: Daemon = daemon
+		super().__init__(socket_file, _RequestHandler)
+
+
+def _running() -> bool:
+	try:
+		send_request({ "command": "status" })
+	except (OSError, ValueError):
+		return False
+	
+	return True
+
+
+def serve() -> None:
+	"""The 'serve' command"""
+	if args().status:
+		if not _running():
+			print(f"{Fore.YELLOW}No daemon is running{Style.RESET_ALL}")
+			return
+		
+		print(json.dumps(send_request({ "command": "status" })["result"], indent=4))
+		return
+	
+	if os.path.exists(SOCKET_FILE):
+		if _running():
+			print(f"{Fore.YELLOW}A daemon is running already ('{SOCKET_FILE}'){Style.RESET_ALL}")
+			return
+		
+		os.remove(SOCKET_FILE)
+	
+	stdout: TextIO = sys.stdout
+	output: _ThreadOutput = _ThreadOutput(stdout)
+	daemon: Daemon = Daemon(args().jobs, output)
+	
+	# the caches are warm before the first request
+	load_fleet_properties()
+	
+	# only this user may connect
+	umask: int = os.umask(0o177)
+	try:
+		server: _Server = _Server(SOCKET_FILE, daemon)
+	finally:
+		os.umask(umask)
+	
+	signal.signal(signal.SIGTERM, signal.default_int_handler)
+	sys.stdout = output
+	
+	print(f"Serving {len(CONFIG.installations)} installations on '{SOCKET_FILE}' with {args().jobs} workers")
+	
+	try:
+		server.serve_forever()
+	except KeyboardInterrupt:
+		print("Stopping the daemon")
+	finally:
+		server.server_close()
+		os.remove(SOCKET_FILE)
+		daemon.executor.shutdown(wait=True)
+		sys.stdout = stdout
@@ -1,6 +1,29 @@
-from fabricdw.installations.change import move_installation, rename_installation
-from fabricdw.installations.copy import copy_installation
-from fabricdw.installations.create import create_installation
-from fabricdw.installations.delete import delete_installation
-from fabricdw.installations.import_ import import_installation
-from fabricdw.installations.update import update_installation
+import importlib
+
+# the modules of the commands are only imported, when their command is used
+_EXPORTS: dict[str, str] = {
+	"rebalance_installations": "fabricdw.installations.affinity",
+	"apply_manifest": "fabricdw.installations.apply",
+	"move_installation": "fabricdw.installations.change",
+	"rename_installation": "fabricdw.installations.change",
+	"copy_installation": "fabricdw.installations.copy",
+	"create_installation": "fabricdw.installations.create",
+	"delete_installation": "fabricdw.installations.delete",
+	"import_installation": "fabricdw.installations.import_",
+	"list_all_installations": "fabricdw.installations.list_",
+	"query_installations": "fabricdw.installations.registry",
+	"collect_garbage": "fabricdw.installations.store",
+	"purge_trash": "fabricdw.installations.trash",
+	"restore_installation": "fabricdw.installations.trash",
+	"update_installation": "fabricdw.installations.update",
+}
+
+
+def __getattr__(name: str):
+	if name not in _EXPORTS:
+		raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
+	
+	return getattr(importlib.import_module(_EXPORTS[name]), name)
+
+
+__all__ = list(_EXPORTS)
@@ -0,0 +1,186 @@
+from __future__ import annotations
+
+import glob
+import os
+import re
+import shutil
+import threading
+
+from colorama import Fore, Style
+
+from fabricdw.args import args
+from fabricdw.common import Affinity, CONFIG, FABRICD_ENV_FILE, Installation
+from fabricdw.installations.script import set_affinity
+
+CPU_DIR: str = "/sys/devices/system/cpu"
+NODE_DIR: str = "/sys/devices/system/node"
+
+# rebalancing rewrites the fabricdw files of all pinned installations
+_rebalance_lock: threading.Lock = threading.Lock()
+
+
+def parse_cpu_list(cpu_list: str) -> list[int]:
+	"""The CPUs of a list like '0-3,8-11'"""
+	cpus: list[int] = []
+	
+	for part in cpu_list.strip().split(","):
+		if not part:
+			continue
+		
+		first, _, last = part.partition("-")
+		cpus += range(int(first), int(last or first) + 1)
+	
+	return cpus
+
+
+def format_cpu_list(cpus: list[int]) -> str:
+	"""The shortest list like '0-3,8-11' of the CPUs"""
+	ranges: list[list[int]] = []
+	
+	for cpu in sorted(cpus):
+		if ranges and ranges[-1][1] == cpu - 1:
+			ranges[-1][1] = cpu
+		else:
+			ranges.append([cpu, cpu])
+	
+	return ",".join(str(first) if first == last else f"{first}-{last}" for first, last in ranges)
+
+
+def _read(file: str) -> str | None:
+	try:
+		with open(file, "r") as sysfs_file:
+			return sysfs_file.read().strip()
+	except OSError:
+		return None
+
+
+def read_topology() -> dict[int, list[list[int]]]:
+	"""The physical cores of each NUMA node, which this process may use.
+	A core is the list of its logical CPUs (the SMT siblings)."""
+	allowed: set[int] = os.sched_getaffinity(0)
+	
+	nodes: dict[int, set[int]] = { }
+	for node_dir in glob.glob(f"{NODE_DIR}/node[0-9]*"):
+		if (cpu_list := _read(f"{node_dir}/cpulist")) and (cpus := set(parse_cpu_list(cpu_list)) & allowed):
+			nodes[int(re.sub(r"\D", "", os.path.basename(node_dir)))] = cpus
+	
+	# kernels without NUMA support
+	if not nodes:
+		nodes[0] = allowed
+	
+	topology: dict[int, list[list[int]]] = { }
+	
+	for node, cpus in sorted(nodes.items()):
+		cores: list[list[int]] = []
+		seen: set[int] = set()
+		
+		for cpu in sorted(cpus):
+			if cpu in seen:
+				continue
+			
+			siblings: str | None = _read(f"{CPU_DIR}/cpu{cpu}/topology/thread_siblings_list")
+			core: list[int] = sorted(set(parse_cpu_list(siblings)) & cpus) if siblings else [cpu]
+			
+			seen.update(core)
+			cores.append(core)
+		
+		topology[node] = cores
+	
+	return topology
+
+
+def compute_placements(names: list[str], topology: dict[int, list[list[int]]]) -> dict[str, Affinity]:
+	"""Spread the installations over the NUMA nodes by their amount of cores, and give each installation its own
+	physical cores within the node. If there are more installations than cores, they share cores."""
+	placements: dict[str, Affinity] = { }
+	members: dict[int, list[str]] = { node: [] for node in topology }
+	
+	for name in sorted(names):
+		# the node with the most cores per installation
+		node: int = max(topology, key=lambda n: len(topology[n]) / (len(members[n]) + 1))
+		members[node].append(name)
+	
+	multiple_nodes: bool = len(topology) > 1
+	
+	for node, node_members in members.items():
+		cores: list[list[int]] = topology[node]
+		
+		for index, name in enumerate(node_members):
+			if len(cores) >= len(node_members):
+				share: list[list[int]] = cores[
+					index * len(cores) // len(node_members):(index + 1) * len(cores) // len(node_members)
+				]
+			else:
+				share = [cores[index % len(cores)]]
+			
+			placements[name] = Affinity(
+				format_cpu_list([cpu for core in share for cpu in core]), node if multiple_nodes else None
+			)
+	
+	return placements
+
+
+def launch_prefix(affinity: Affinity | None) -> str:
+	"""The command in front of the java executable, which binds the server to its CPUs and node"""
+	if affinity is None:
+		return ""
+	
+	if affinity.node is not None and shutil.which("numactl"):
+		return f"numactl --physcpubind={affinity.cpus} --membind={affinity.node}"
+	
+	return f"taskset -c {affinity.cpus}"
+
+
+def apply_affinity(installation: Installation) -> None:
+	"""Write the affinity of the installation into its fabricdw file"""
+	if os.path.exists(f"{installation.root}/{FABRICD_ENV_FILE}"):
+		set_affinity(installation.root, launch_prefix(installation.affinity))
+
+
+def rebalance(pin: list[Installation] | None = None, print_message: bool = True) -> None:
+	"""Recompute the CPUs of all pinned installations, after installations were added or removed
+
+	:param pin: installations, which are pinned from now on
+	:param print_message: print the new placement"""
+	with _rebalance_lock:
+		for installation in pin or []:
+			if installation.affinity is None:
+				installation.affinity = Affinity("")
+		
+		pinned: list[Installation] = [i for i in CONFIG.installations if i.affinity is not None]
+		
+		if not pinned:
+			return
+		
+		placements: dict[str, Affinity] = compute_placements([i.name for i in pinned], read_topology())
+		
+		for installation in pinned:
+			changed: bool = installation.affinity != placements[installation.name]
+			installation.affinity = placements[installation.name]
+			
+			apply_affinity(installation)
+			
+			if print_message and changed:
+				print(f"{installation.pretty_name()} uses {installation.affinity}")
+
+
+def rebalance_installations() -> None:
+	"""The 'rebalance' command"""
+	if args().clear:
+		for installation in CONFIG.installations:
+			if installation.affinity is not None:
+				installation.affinity = None
+				apply_affinity(installation)
+				print(f"{installation.pretty_name()} may use all CPUs")
+		return
+	
+	rebalance(CONFIG.installations if args().all else [], print_message=False)
+	
+	pinned: list[Installation] = [i for i in CONFIG.installations if i.affinity is not None]
+	
+	if not pinned:
+		print(f"{Fore.YELLOW}No installation is pinned, use '--all' to pin all installations{Style.RESET_ALL}")
+		return
+	
+	for installation in pinned:
+		print(f"{installation.pretty_name()}: {installation.affinity}")
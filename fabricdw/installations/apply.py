@@ -0,0 +1,333 @@
+from __future__ import annotations
+
+import json
+import os
+import tomllib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+from colorama import Fore, Style
+
+from fabricdw.args import args, bind_args, parse_namespace, scoped_args
+from fabricdw.common import (CONFIG, FABRICD_ENV_FILE, Installation, InvalidCombinationException,
+	SERVER_PROPERTIES_FILE, VersionChoice, Versions)
+from fabricdw.common.methods import directory_is_empty
+from fabricdw.installations.affinity import launch_prefix, rebalance
+from fabricdw.installations.create import create_installation, create_fabricdw_script, render_fabricdw_script
+from fabricdw.installations.fabric import fetch_server_jar, get_all_versions, get_compatible_loaders, VersionCatalog
+from fabricdw.installations.script import get_shared_archive
+from fabricdw.installations.update import update_installation
+from fabricdw.properties import read_properties
+from fabricdw.properties.fleet import edit_installation_properties
+
+# manifest keys and the 'create' options they are passed as
+OPTIONS: dict[str, str] = {
+	"directory": "--directory",
+	"user": "--user",
+	"min_ram": "--min-ram",
+	"max_ram": "--max-ram",
+	"backups": "--backups",
+	"idle_time": "--idle-time",
+	"java": "--java",
+	"java_args": "--java-args",
+	"profile": "--profile",
+	"gc_threads": "--gc-threads",
+}
+FLAGS: dict[str, str] = {
+	"allow_non_empty": "--allow-non-empty",
+	"allow_snapshots": "--allow-snapshots",
+	"allow_unstable": "--allow-unstable",
+	"large_pages": "--large-pages",
+	"overcommit": "--overcommit",
+	"pin_cpus": "--pin-cpus",
+}
+
+
+class ManifestError(Exception):
+	def __init__(self, reason: str):
+		super().__init__(f"{Fore.RED}Invalid manifest: {reason}{Style.RESET_ALL}")
+
+
+class Action:
+	def __init__(self, description: str, run: Callable[[], None]):
+		self.description = description
+		self.run = run
+
+
+class Plan:
+	"""The actions of one manifest entry, which are run in order"""
+	
+	def __init__(self, name: str, versions: Versions, create: bool):
+		self.name = name
+		self.versions = versions
+		self.create = create
+		# created and updated installations need the server jar of the versions
+		self.needs_jar = create
+		self.actions: list[Action] = []
+		self.error: Exception | None = None
+
+
+def load_manifest(file: str) -> list[dict[str, Any]]:
+	"""Load a JSON or TOML manifest, apply its defaults to all installations"""
+	with open(file, "rb") as manifest_file:
+		manifest: dict[str, Any] = tomllib.load(manifest_file) if file.endswith(".toml") else json.load(manifest_file)
+	
+	defaults: dict[str, Any] = manifest.get("defaults", { })
+	entries: list[dict[str, Any]] = []
+	
+	for entry in manifest.get("installations", []):
+		if "name" not in entry:
+			raise ManifestError(f"installation without name ({entry})")
+		
+		properties: dict[str, Any] = { **defaults.get("properties", { }), **entry.get("properties", { }) }
+		entries.append({ **defaults, **entry, "properties": properties })
+	
+	names: list[str] = [entry["name"] for entry in entries]
+	if len(names) != len(set(names)):
+		raise ManifestError("installation names must be unique")
+	
+	return entries
+
+
+def _resolve(choice: str, catalog: VersionCatalog, stable_only: bool, name: str) -> str:
+	if choice == VersionChoice.LATEST:
+		return catalog.select(stable_only)[0].version
+	if choice == VersionChoice.ASK:
+		raise ManifestError(f"'ask' cannot be used as {name} version")
+	if choice not in catalog:
+		raise InvalidCombinationException(
+			f"Unknown {name} version '{choice}'. Did you mean {', '.join(catalog.suggest(choice))}?"
+		)
+	return choice
+
+
+def resolve_versions(entry: dict[str, Any], catalogs: tuple[VersionCatalog, ...]) -> Versions:
+	"""Resolve the versions of the entry without asking, 'latest' is the default"""
+	game_versions, loader_versions, installer_versions = catalogs
+	stable_loader: bool = not entry.get("allow_unstable", False)
+	
+	game: str = _resolve(
+		entry.get("game_version", VersionChoice.LATEST), game_versions, not entry.get("allow_snapshots", False), "game"
+	)
+	
+	if entry.get("loader_version", VersionChoice.LATEST) == VersionChoice.LATEST:
+		loader_versions = get_compatible_loaders(game)
+	
+	return Versions(
+		game,
+		_resolve(entry.get("loader_version", VersionChoice.LATEST), loader_versions, stable_loader, "loader"),
+		_resolve(entry.get("installer_version", VersionChoice.LATEST), installer_versions, stable_loader, "installer")
+	)
+
+
+def build_create_arguments(entry: dict[str, Any], versions: Versions) -> list[str]:
+	"""The command line arguments of 'create' for the entry"""
+	argv: list[str] = [
+		"create",
+		entry["name"],
+		f"--game-version={versions.game}",
+		f"--loader-version={versions.loader}",
+		f"--installer-version={versions.installer}"
+	]
+	
+	argv += [f"{option}={entry[key]}" for key, option in OPTIONS.items() if key in entry]
+	argv += [option for key, option in FLAGS.items() if entry.get(key, False)]
+	argv += [f"--property={key}={value}" for key, value in entry["properties"].items()]
+	
+	if args().offline:
+		argv.append("--offline")
+	
+	return argv
+
+
+def _format_value(value: Any) -> str:
+	if isinstance(value, bool):
+		return "true" if value else "false"
+	return str(value)
+
+
+def plan_entry(entry: dict[str, Any], catalogs: tuple[VersionCatalog, ...]) -> Plan:
+	entry["properties"] = { key: _format_value(value) for key, value in entry.get("properties", { }).items() }
+	
+	versions: Versions = resolve_versions(entry, catalogs)
+	# the daemon runs in another directory than the command line
+	namespace = parse_namespace(build_create_arguments(entry, versions), args().cwd)
+	installation: Installation | None = CONFIG.get_installation(entry["name"])
+	
+	if installation is None:
+		plan: Plan = Plan(entry["name"], versions, create=True)
+		
+		output_dir: str = namespace.output_dir
+		if os.path.isdir(output_dir) and not directory_is_empty(output_dir) and not namespace.allow_non_empty:
+			raise ManifestError(f"the directory of '{entry['name']}' ({namespace.output_dir}) is not empty")
+		
+		def create() -> None:
+			with scoped_args(namespace):
+				create_installation()
+		
+		plan.actions.append(Action(f"create at {namespace.output_dir} with {versions}", create))
+		return plan
+	
+	plan = Plan(entry["name"], versions, create=False)
+	
+	if "directory" in entry and namespace.output_dir != installation.root:
+		print(
+			f"{Fore.YELLOW}{installation.pretty_name(Fore.YELLOW)} is in '{installation.root}' instead of "
+			f"'{namespace.output_dir}', use 'move' to change it{Style.RESET_ALL}"
+		)
+	
+	if installation.versions != versions:
+		update_namespace = parse_namespace(
+			[
+				"update",
+				installation.name,
+				f"--game-version={versions.game}",
+				f"--loader-version={versions.loader}",
+				f"--installer-version={versions.installer}"
+			] + (["--offline"] if args().offline else []),
+			args().cwd
+		)
+		
+		def update() -> None:
+			with scoped_args(update_namespace):
+				results = update_installation()
+			
+			# a failed update is rolled back and reported in its result, instead of raised
+			for result in results:
+				if result.error is not None:
+					raise result.error
+		
+		plan.needs_jar = True
+		plan.actions.append(Action(f"update {installation.versions or 'unknown versions'} -> {versions}", update))
+	
+	properties_file: str = f"{installation.root}/{SERVER_PROPERTIES_FILE}"
+	current: dict[str, str] = read_properties(properties_file) if os.path.exists(properties_file) else { }
+	changes: dict[str, str] = { key: value for key, value in namespace.properties.items() if current.get(key) != value }
+	
+	if len(changes) > 0:
+		plan.actions.append(
+			Action(
+				"set " + ", ".join(f"{key}: '{current.get(key, '')}' -> '{value}'" for key, value in changes.items()),
+				# properties missing in the file are added
+				lambda: edit_installation_properties(installation, changes)
+			)
+		)
+	
+	# the wrapper is generated from the properties of the installation
+	namespace.output_dir = installation.root
+	namespace.properties = { **current, **namespace.properties }
+	namespace.launch_prefix = launch_prefix(installation.affinity)
+	
+	script_file: str = f"{installation.root}/{FABRICD_ENV_FILE}"
+	if os.path.exists(script_file):
+		namespace.shared_archive = get_shared_archive(installation.root)
+	
+	with scoped_args(namespace):
+		script: str = render_fabricdw_script()
+	
+	current_script: str | None = None
+	if os.path.exists(script_file):
+		with open(script_file, "r") as launch_script_file:
+			current_script = launch_script_file.read()
+	
+	if current_script != script:
+		def rewrite_script() -> None:
+			with scoped_args(namespace):
+				create_fabricdw_script(installation.root)
+		
+		plan.actions.append(Action(f"rewrite '{FABRICD_ENV_FILE}'", rewrite_script))
+	
+	if namespace.pin_cpus and installation.affinity is None:
+		plan.actions.append(Action("pin to its own CPUs", lambda: rebalance([installation])))
+	
+	return plan
+
+
+def run_plan(plan: Plan) -> Plan:
+	try:
+		for action in plan.actions:
+			action.run()
+	except Exception as error:
+		plan.error = error
+	
+	return plan
+
+
+def _fetch_jar(versions: Versions) -> Exception | None:
+	""":returns: the error, which prevented getting the server jar"""
+	try:
+		fetch_server_jar(versions)
+	except Exception as error:
+		return error
+	
+	return None
+
+
+def print_plan(plans: list[Plan]) -> None:
+	unmanaged: list[str] = sorted({ i.name for i in CONFIG.installations } - { plan.name for plan in plans })
+	
+	print("Plan:")
+	for plan in plans:
+		if len(plan.actions) == 0:
+			print(f"  = {Installation.pretty_name_str(plan.name)} (no changes)")
+		
+		for action in plan.actions:
+			symbol: str = f"{Fore.GREEN}+" if plan.create else f"{Fore.YELLOW}~"
+			print(f"  {symbol}{Style.RESET_ALL} {Installation.pretty_name_str(plan.name)} {action.description}")
+	
+	for name in unmanaged:
+		print(f"  ? {Installation.pretty_name_str(name)} (not in the manifest, left unchanged)")
+
+
+def apply_manifest() -> None:
+	entries: list[dict[str, Any]] = load_manifest(args().manifest)
+	
+	# the version lists and compatibility data are fetched once for all entries
+	catalogs: tuple[VersionCatalog, ...] = get_all_versions()
+	plans: list[Plan] = [plan_entry(entry, catalogs) for entry in entries]
+	
+	print_plan(plans)
+	
+	if args().dry_run:
+		return
+	
+	pending: list[Plan] = [plan for plan in plans if len(plan.actions) > 0]
+	
+	if len(pending) == 0:
+		print("Nothing to do")
+		return
+	
+	# every distinct jar is downloaded once, plans which only change files do not need one
+	jar_versions: list[Versions] = list({ plan.versions for plan in pending if plan.needs_jar })
+	with ThreadPoolExecutor(max_workers=args().jobs) as executor:
+		fetch_errors: dict[Versions, Exception | None] = dict(
+			zip(jar_versions, executor.map(bind_args(_fetch_jar), jar_versions))
+		)
+	
+	for plan in pending:
+		if plan.needs_jar and fetch_errors[plan.versions] is not None:
+			plan.error = fetch_errors[plan.versions]
+	
+	runnable: list[Plan] = [plan for plan in pending if plan.error is None]
+	
+	# the first installation of each version initializes the image, which the others are cloned from
+	first_wave: dict[Versions, Plan] = { }
+	for plan in runnable:
+		if plan.create:
+			first_wave.setdefault(plan.versions, plan)
+	
+	waves: list[list[Plan]] = [
+		list(first_wave.values()),
+		[plan for plan in runnable if plan not in first_wave.values()]
+	]
+	
+	with ThreadPoolExecutor(max_workers=args().jobs) as executor:
+		for wave in waves:
+			list(executor.map(bind_args(run_plan), wave))
+	
+	print()
+	for plan in pending:
+		if plan.error is None:
+			print(f"[ {Fore.GREEN}OK{Style.RESET_ALL} ] {Installation.pretty_name_str(plan.name)}")
+		else:
+			print(f"[{Fore.RED}FAIL{Style.RESET_ALL}] {Installation.pretty_name_str(plan.name)} ({plan.error})")
@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+import json
+import os
+import time
+from typing import Any
+
+import requests
+from colorama import Fore, Style
+
+from fabricdw.common import CACHE_DIR, CONFIG
+from fabricdw.common.files import read_json
+from fabricdw.installations.network import REQUEST_TIMEOUT, session
+
+META_CACHE_DIR: str = f"{CACHE_DIR}/meta"
+
+
+class OfflineCacheMissError(Exception):
+	def __init__(self, url: str):
+		super().__init__(f"{Fore.RED}'{url}' is not cached, it cannot be used in offline mode!{Style.RESET_ALL}")
+
+
+def _cache_file(url: str) -> str:
+	return f"{META_CACHE_DIR}/{url.split('://', maxsplit=1)[-1].replace('/', '_')}.json"
+
+
+def _read_entry(url: str) -> dict[str, Any] | None:
+	try:
+		return read_json(_cache_file(url))
+	except (OSError, ValueError):
+		return None
+
+
+def _write_entry(url: str, entry: dict[str, Any]) -> None:
+	"""Write the entry to a temporary file first, so concurrent runs never read a partial entry"""
+	os.makedirs(META_CACHE_DIR, exist_ok=True)
+	
+	cache_file: str = _cache_file(url)
+	temporary_file: str = f"{cache_file}.{os.getpid()}.tmp"
+	
+	with open(temporary_file, "w") as cache:
+		json.dump(entry, cache)
+	
+	os.replace(temporary_file, cache_file)
+
+
+def _use_stale(url: str, entry: dict[str, Any], reason: Any) -> Any:
+	age: int = int(time.time() - entry["fetched"])
+	print(f"{Fore.YELLOW}Could not refresh '{url}' ({reason}), using cached data ({age}s old){Style.RESET_ALL}")
+	return entry["data"]
+
+
+def get_json(url: str, offline: bool = False, ttl: int | None = None) -> Any:
+	"""Get the parsed JSON of the url, served from the on-disk cache while it is younger than the TTL.
+	Stale entries are revalidated with a conditional request and used as a fallback if the request fails.
+
+	:param url: the url to get
+	:param offline: only use the cache, never make a request
+	:param ttl: seconds after which a cached entry is revalidated. Defaults to 'meta-cache-ttl' of the config
+
+	:returns: the parsed JSON"""
+	
+	entry: dict[str, Any] | None = _read_entry(url)
+	
+	if offline:
+		if entry is None:
+			raise OfflineCacheMissError(url)
+		return entry["data"]
+	
+	if ttl is None:
+		ttl = CONFIG.defaults.meta_cache_ttl
+	
+	if entry is not None and time.time() - entry["fetched"] < ttl:
+		return entry["data"]
+	
+	headers: dict[str, str] = { }
+	if entry is not None:
+		if entry.get("etag"):
+			headers["If-None-Match"] = entry["etag"]
+		if entry.get("last_modified"):
+			headers["If-Modified-Since"] = entry["last_modified"]
+	
+	try:
+		response = session().get(url, headers=headers, timeout=REQUEST_TIMEOUT)
+	except requests.RequestException as error:
+		if entry is None:
+			raise
+		return _use_stale(url, entry, error)
+	
+	if response.status_code == 304 and entry is not None:
+		entry["fetched"] = time.time()
+		_write_entry(url, entry)
+		return entry["data"]
+	
+	if response.status_code != 200:
+		if entry is None:
+			response.raise_for_status()
+		return _use_stale(url, entry, f"status {response.status_code}")
+	
+	data: Any = response.json()
+	
+	_write_entry(
+		url, {
+			"url": url,
+			"fetched": time.time(),
+			"etag": response.headers.get("ETag"),
+			"last_modified": response.headers.get("Last-Modified"),
+			"data": data
+		}
+	)
+	
+	return data
@@ -0,0 +1,219 @@
+from __future__ import annotations
+
+import os
+import shutil
+import socket
+import subprocess
+import threading
+import time
+
+from colorama import Fore, Style
+
+from fabricdw.common import CACHE_DIR, CONFIG, EULA_FILE, SERVER_JAR_FILE, SERVER_PROPERTIES_FILE
+from fabricdw.common.files import file_sha256, link_or_copy
+from fabricdw.common.properties import Properties
+from fabricdw.installations.images import java_version
+from fabricdw.installations.initialize import stop_process
+from fabricdw.installations.script import get_shared_archive, read_fabricdw_script, set_shared_archive, strip_affinity
+from fabricdw.properties.document import PropertiesDocument
+
+CDS_DIR: str = f"{CACHE_DIR}/cds"
+TRAINING_TIMEOUT: float = 600
+# printed by the server once it started
+SERVER_STARTED: str = "Done ("
+# shared with the scratch server of the training, they are not changed by running the server
+TRAINING_LINKS: list[str] = [".fabric", "libraries", "versions", "mods"]
+# copied, mods may write their config
+TRAINING_COPIES: list[str] = ["config", "fabric-server-launcher.properties"]
+TRAINING_PROPERTIES: dict[str, str] = {
+	"level-name": "training",
+	"enable-rcon": "false",
+	"enable-query": "false",
+}
+
+_archive_locks: dict[str, threading.Lock] = { }
+_archive_locks_lock: threading.Lock = threading.Lock()
+
+
+def _archive_lock(archive: str) -> threading.Lock:
+	with _archive_locks_lock:
+		return _archive_locks.setdefault(archive, threading.Lock())
+
+
+def get_archive(installation_directory: str, java_executable: str) -> str | None:
+	"""The archive for the server jar of the installation and the java version, None if java cannot be used"""
+	if (java := java_version(java_executable)) is None:
+		return None
+	
+	return f"{CDS_DIR}/{file_sha256(f'{installation_directory}/{SERVER_JAR_FILE}')}_java{java}.jsa"
+
+
+def _eula_accepted(installation_directory: str) -> bool:
+	try:
+		return PropertiesDocument.load(f"{installation_directory}/{EULA_FILE}").get("eula", "").lower() == "true"
+	except (OSError, ValueError):
+		return False
+
+
+def _free_port() -> int:
+	with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as probe:
+		probe.bind(("", 0))
+		return probe.getsockname()[1]
+
+
+def _prepare_training(installation_directory: str, training_directory: str) -> None:
+	"""A scratch server with the jar, libraries, mods, and config of the installation, but a throwaway world.
+	The world, player data, and port of the installation are never touched."""
+	os.makedirs(training_directory)
+	
+	link_or_copy(
+		f"{installation_directory}/{SERVER_JAR_FILE}", f"{training_directory}/{SERVER_JAR_FILE}", symlink=False
+	)
+	
+	for name in TRAINING_LINKS:
+		if os.path.exists(source := f"{installation_directory}/{name}"):
+			os.symlink(source, f"{training_directory}/{name}")
+	
+	for name in TRAINING_COPIES:
+		if os.path.isdir(source := f"{installation_directory}/{name}"):
+			shutil.copytree(source, f"{training_directory}/{name}", symlinks=True)
+		elif os.path.isfile(source):
+			shutil.copy2(source, f"{training_directory}/{name}")
+	
+	try:
+		properties: PropertiesDocument = PropertiesDocument.load(f"{installation_directory}/{SERVER_PROPERTIES_FILE}")
+	except (OSError, ValueError):
+		properties = PropertiesDocument()
+	
+	port: str = str(_free_port())
+	for key, value in { **TRAINING_PROPERTIES, Properties.PORT_SERVER: port, Properties.PORT_QUERY: port }.items():
+		properties.set(key, value)
+	
+	properties.save(f"{training_directory}/{SERVER_PROPERTIES_FILE}")
+	
+	with open(f"{training_directory}/{EULA_FILE}", "w") as eula_file:
+		eula_file.write("eula=true\n")
+
+
+def _train(installation_directory: str, java_executable: str, archive: str) -> bool:
+	"""Start a scratch copy of the server once and stop it as soon as it is running, the loaded classes are archived
+	at exit. Only the EULA of the installation allows starting it. A server, which exits before it started, would
+	only archive some of its classes, no archive is kept then.
+	
+	:returns: True if the archive was created"""
+	if not _eula_accepted(installation_directory):
+		print(f"{Fore.YELLOW}The EULA of the installation is not accepted yet{Style.RESET_ALL}")
+		return False
+	
+	os.makedirs(CDS_DIR, exist_ok=True)
+	
+	temporary_archive: str = f"{archive}.{os.getpid()}.{threading.get_ident()}.tmp"
+	training_directory: str = f"{archive}.{os.getpid()}.{threading.get_ident()}.training.tmp"
+	start: float = time.perf_counter()
+	started: bool = False
+	
+	try:
+		_prepare_training(installation_directory, training_directory)
+		
+		process: subprocess.Popen = subprocess.Popen(
+			[java_executable, f"-XX:ArchiveClassesAtExit={temporary_archive}", "-jar", SERVER_JAR_FILE, "nogui"],
+			cwd=training_directory,
+			stdin=subprocess.PIPE,
+			stdout=subprocess.PIPE,
+			stderr=subprocess.STDOUT,
+			text=True,
+			start_new_session=True
+		)
+		
+		timer: threading.Timer = threading.Timer(TRAINING_TIMEOUT, stop_process, [process])
+		timer.start()
+		
+		try:
+			for line in process.stdout:
+				if SERVER_STARTED in line and not started:
+					started = True
+					process.stdin.write("stop\n")
+					process.stdin.flush()
+			
+			process.wait()
+		finally:
+			timer.cancel()
+			stop_process(process)
+		
+		if not started or not os.path.exists(temporary_archive):
+			return False
+		
+		os.replace(temporary_archive, archive)
+	finally:
+		shutil.rmtree(training_directory, ignore_errors=True)
+		
+		if os.path.exists(temporary_archive):
+			os.remove(temporary_archive)
+	
+	print(f"Created class data sharing archive in {time.perf_counter() - start:.1f}s")
+	
+	return True
+
+
+def refresh_shared_archive(installation_directory: str, java_executable: str | None = None) -> None:
+	"""Launch the server with the archive of its current jar, creating the archive if it does not exist yet.
+	Archives are shared by all installations with the same jar and java version.
+	If it cannot be created, the server is launched without one."""
+	variables: dict[str, str] = read_fabricdw_script(installation_directory)
+	
+	if java_executable is None:
+		java_executable = strip_affinity(variables["SERVER_START_CMD"]).split()[0]
+	
+	if (archive := get_archive(installation_directory, java_executable)) is None:
+		print(f"{Fore.YELLOW}Cannot determine the java version, no class data sharing archive{Style.RESET_ALL}")
+		set_shared_archive(installation_directory, None)
+		return
+	
+	with _archive_lock(archive):
+		if not os.path.exists(archive):
+			print("Creating class data sharing archive...")
+			
+			if not _train(installation_directory, java_executable, archive):
+				print(f"{Fore.YELLOW}The class data sharing archive could not be created{Style.RESET_ALL}")
+				set_shared_archive(installation_directory, None)
+				return
+	
+	set_shared_archive(installation_directory, archive)
+
+
+def collect_shared_archives(dry_run: bool) -> int:
+	"""Remove archives, which no installation is launched with
+	
+	:returns: the freed bytes"""
+	if not os.path.isdir(CDS_DIR):
+		return 0
+	
+	used: set[str] = set()
+	for installation in CONFIG.installations:
+		try:
+			if (archive := get_shared_archive(installation.root)) is not None:
+				used.add(os.path.basename(archive))
+		except (OSError, KeyError):
+			continue
+	
+	freed: int = 0
+	
+	for entry in os.scandir(CDS_DIR):
+		if entry.name in used:
+			continue
+		
+		# an archive may still be in training
+		if entry.name.endswith(".tmp") and time.time() - entry.stat().st_mtime < TRAINING_TIMEOUT:
+			continue
+		
+		print(f"{'Would remove' if dry_run else 'Removing'} {entry.name}")
+		freed += entry.stat().st_size
+		
+		if not dry_run:
+			# the scratch server of an interrupted training
+			if entry.is_dir(follow_symlinks=False):
+				shutil.rmtree(entry.path, ignore_errors=True)
+			else:
+				os.remove(entry.path)
+	
+	return freed
@@ -1,36 +1,150 @@
+import errno
+import json
 import os
+import shutil
+
+from colorama import Fore, Style
 
 from fabricdw.args import args
-from fabricdw.common import ask_okay_to_write_into, Installation, remove_dir
+from fabricdw.common import ask_okay_to_write_into, CONFIG, Installation, write_config
+from fabricdw.common.files import copy_tree, CopyStats, verify_tree
+
+# written into the target of a move across filesystems, until the source is removed
+MOVE_JOURNAL_FILE: str = ".fabricdw-move"
+
+
+class MoveVerificationError(Exception):
+	def __init__(self, differing: list[str]):
+		super().__init__(
+			f"{Fore.RED}{len(differing)} files differ after copying, e.g. '{differing[0]}'! "
+			f"The source is kept, run the move again to retry.{Style.RESET_ALL}"
+		)
+
+
+def _read_journal(directory: str) -> dict | None:
+	try:
+		with open(f"{directory}/{MOVE_JOURNAL_FILE}", "r") as journal:
+			return json.load(journal)
+	except (OSError, ValueError):
+		return None
+
+
+def _directory_id(directory: str) -> list[int]:
+	"""The device and inode of the directory, which change, if it is replaced by another one"""
+	directory_stat: os.stat_result = os.stat(directory)
+	
+	return [directory_stat.st_dev, directory_stat.st_ino]
+
+
+def _finish_move(installation: Installation, journal: dict) -> None:
+	"""Remove the source of a move, whose copy was already verified and saved in the config.
+	The source is kept, if another installation uses its path now, or if it is not the directory of the move anymore."""
+	source: str = journal["source"]
+	
+	if os.path.isdir(source):
+		owner: Installation | None = CONFIG.get_installation_by_root(source)
+		
+		if owner is not None or source == installation.root:
+			print(
+				f"{Fore.YELLOW}'{source}' is used by {(owner or installation).pretty_name(Fore.YELLOW)} now, "
+				f"it is not removed{Style.RESET_ALL}"
+			)
+		elif journal.get("source_id") != _directory_id(source):
+			print(f"{Fore.YELLOW}'{source}' was replaced since the move, it is not removed{Style.RESET_ALL}")
+		else:
+			shutil.rmtree(source)
+			print(f"Removed '{source}'")
+	
+	os.remove(f"{installation.root}/{MOVE_JOURNAL_FILE}")
+
+
+def _move_across_filesystems(installation: Installation, target_directory: str) -> None:
+	"""Copy the installation, verify the copy, switch the config over, and only then remove the source.
+	An interrupted move continues where it stopped, when it is run again."""
+	source_directory: str = installation.root
+	
+	os.makedirs(target_directory, exist_ok=True)
+	
+	journal: dict = {
+		"name": installation.name,
+		"source": source_directory,
+		"source_id": _directory_id(source_directory)
+	}
+	with open(f"{target_directory}/{MOVE_JOURNAL_FILE}", "w") as journal_file:
+		json.dump(journal, journal_file)
+	
+	stats: CopyStats = copy_tree(source_directory, target_directory, skip_unchanged=True)
+	print(f"Copied {stats}")
+	
+	stats, differing = verify_tree(source_directory, target_directory)
+	print(f"Verified {stats}")
+	
+	if len(differing) > 0:
+		raise MoveVerificationError(differing)
+	
+	# the config must never point to a removed directory
+	CONFIG.move_installation(installation, target_directory)
+	write_config()
+	
+	_finish_move(installation, journal)
+
+
+def _rename(source_directory: str, target_directory: str) -> bool:
+	"""Rename the directory, which only works within one filesystem and onto empty directories
+	
+	:returns: True if it was renamed"""
+	try:
+		os.replace(source_directory, target_directory)
+	except OSError as error:
+		if error.errno in (errno.EXDEV, errno.ENOTEMPTY, errno.EEXIST):
+			return False
+		raise
+	
+	return True
 
 
 def move_installation() -> None:
 	source: Installation = Installation.ensure_exists(args().name)
 	
+	# the source of an earlier move was not removed completely
+	if (journal := _read_journal(source.root)) is not None:
+		_finish_move(source, journal)
+	
 	target_directory: str = args().output_dir
+	old_root: str = source.root
 	
-	try:
-		os.makedirs(target_directory, exist_ok=True)
-		
+	if target_directory == old_root:
+		print(f"{source.pretty_name()} is already in '{target_directory}'")
+		return
+	
+	resume: bool = (journal := _read_journal(target_directory)) is not None and journal["source"] == old_root
+	
+	if resume:
+		print(f"Resuming the move of {source.pretty_name()} to '{target_directory}'")
+	elif os.path.isdir(target_directory):
 		if not ask_okay_to_write_into(target_directory, message_if_cancelled="move cancelled"):
 			return
+	else:
+		os.makedirs(os.path.dirname(target_directory), exist_ok=True)
+	
+	try:
+		if not resume and _rename(old_root, target_directory):
+			CONFIG.move_installation(source, target_directory)
+		else:
+			_move_across_filesystems(source, target_directory)
 		
-		os.replace(source.root, target_directory)
-		
-		old_root = source.root
-		source.root = target_directory
-		
-		print(
-			f"Moved {source.pretty_name()} ('{old_root}' -> '{target_directory}')	"
-		)
+		print(f"Moved {source.pretty_name()} ('{old_root}' -> '{target_directory}')")
 	except KeyboardInterrupt:
-		if remove_dir(target_directory):
-			print("Interrupted! Cleaning up...")
+		if source.root == target_directory:
+			print(f"Interrupted! The installation is moved, the next move removes the rest of '{old_root}'")
+		else:
+			print(f"Interrupted! '{old_root}' is still complete, run the move again to resume it")
 
 
 def rename_installation() -> None:
 	installation: Installation = Installation.ensure_exists(args().source)
+	Installation.ensure_does_not_exist(args().target)
 	
-	installation.name = args().target
+	CONFIG.rename_installation(installation, args().target)
 	
 	print(f"Renamed {Installation.pretty_name_str(args().source)} to {Installation.pretty_name_str(args().target)}")
@@ -4,34 +4,102 @@ import shutil
 from colorama import Fore, Style
 
 from fabricdw.args import args
-from fabricdw.common import ask_okay_to_write_into, CONFIG, Installation, remove_dir
+from fabricdw.common import (ask_okay_to_write_into, CONFIG, FABRICD_ENV_FILE, Installation, remove_dir,
+	SERVER_JAR_FILE, SERVER_PROPERTIES_FILE)
+from fabricdw.common.files import copy_tree, CopyStats, DEFAULT_COPY_EXCLUDES
+from fabricdw.common.properties import Properties
+from fabricdw.installations.affinity import rebalance
+from fabricdw.installations.script import update_fabricdw_script
+from fabricdw.installations.store import deploy_jar, get_stored_jar
+from fabricdw.installations.tuning import heap_of, plan_resources, release_resources
+from fabricdw.properties import modify_properties
+from fabricdw.properties.ports import allocate_ports, release_ports
 
 
-def copy_installation() -> None:
+def copy_server_jar(source: Installation, target_directory: str) -> None:
+	source_jar: str = f"{source.root}/{SERVER_JAR_FILE}"
+	
+	if source.versions is not None and (jar_file := get_stored_jar(source.versions)) is not None:
+		deploy_jar(jar_file, target_directory)
+	elif os.path.exists(source_jar):
+		shutil.copy2(source_jar, target_directory)
+
+
+def assign_new_ports(target_directory: str, ports: dict[str, str]) -> None:
+	"""Give the copy its own ports, in the server.properties and the fabricdw file
+	
+	:param ports: receives the allocated ports, even if writing them fails"""
+	ports.update(allocate_ports())
+	
+	if os.path.exists(f"{target_directory}/{SERVER_PROPERTIES_FILE}"):
+		modify_properties(target_directory, ports.copy())
+	
+	if os.path.exists(f"{target_directory}/{FABRICD_ENV_FILE}"):
+		update_fabricdw_script(
+			target_directory, { "GAME_PORT": ports[Properties.PORT_SERVER], "SESSION_NAME": args().target }
+		)
+	
+	print(
+		f"Using port {Fore.CYAN}{ports[Properties.PORT_SERVER]}{Style.RESET_ALL} (rcon {ports[Properties.PORT_RCON]})"
+	)
+
+
+def copy_installation() -> Installation | None:
+	"""The 'copy' command
+	
+	:returns: the copy, None if it was cancelled"""
 	source: Installation = Installation.ensure_exists(args().source)
 	Installation.ensure_does_not_exist(args().target)
 	
+	if (heap := heap_of(source.root)) is not None:
+		plan_resources(heap)
+	
 	target_directory: str = args().output_dir
+	ports: dict[str, str] = { }
 	
 	try:
 		os.makedirs(target_directory, exist_ok=True)
 		
 		if not ask_okay_to_write_into(target_directory, message_if_cancelled="copy cancelled"):
-			return
+			return None
+		
+		exclude: list[str] = (DEFAULT_COPY_EXCLUDES if args().default_excludes else []) + args().exclude
 		
-		shutil.copytree(source.root, target_directory, dirs_exist_ok=True)
+		# the server jar is linked from the jar store instead, if possible
+		stats: CopyStats = copy_tree(source.root, target_directory, exclude + [f"/{SERVER_JAR_FILE}"], args().jobs)
+		copy_server_jar(source, target_directory)
 		
-		new_installation: Installation = CONFIG.create_new_installation(args().target, target_directory)
+		print(f"Copied {stats}")
+		
+		new_installation: Installation = CONFIG.create_new_installation(
+			args().target, target_directory, versions=source.versions
+		)
 		
 		print(
 			f"Copied {source.pretty_name()} as {new_installation.pretty_name()} "
 			f"('{source.root}' -> '{new_installation.root}')"
 		)
 		
-		print(
-			f"Remember to change ports and the world name in the 'server.properties' {Fore.YELLOW}AND"
-			f"{Style.RESET_ALL} in the 'fabricdw' file!"
-		)
+		# the copy gets its own CPUs
+		if source.affinity is not None:
+			rebalance([new_installation])
+		
+		if args().auto_port:
+			assign_new_ports(target_directory, ports)
+		else:
+			print(
+				f"Remember to change ports and the world name in the 'server.properties' {Fore.YELLOW}AND"
+				f"{Style.RESET_ALL} in the 'fabricdw' file!"
+			)
+		
+		return new_installation
 	except KeyboardInterrupt:
 		if remove_dir(target_directory):
 			print("Interrupted! Cleaning up...")
+		
+		return None
+	finally:
+		if heap is not None:
+			release_resources(heap)
+		
+		release_ports(ports)
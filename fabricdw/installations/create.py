@@ -1,18 +1,25 @@
 import os
 import stat
-import subprocess
-
-from colorama import Fore, Style
 
 from fabricdw.args import args
 from fabricdw.common import (ask_okay_to_write_into, CONFIG, convert_bool_to_str, FABRICD_ENV_FILE, Installation,
-	remove_dir, SERVER_JAR_FILE)
+	remove_dir, Versions)
 from fabricdw.common.properties import Defaults, Properties
-from fabricdw.installations.fabric import select_and_download_version
+from fabricdw.common.methods import directory_is_empty
+from fabricdw.installations.affinity import rebalance
+from fabricdw.installations.cds import refresh_shared_archive
+from fabricdw.installations.fabric import evaluate_versions, fetch_server_jar
+from fabricdw.installations.images import clone_image, save_image
+from fabricdw.installations.initialize import initialize_server
+from fabricdw.installations.registry import register_installations
+from fabricdw.installations.script import format_shared_archive
+from fabricdw.installations.store import deploy_jar
+from fabricdw.installations.tuning import plan_resources, release_resources, TuningProfile, tuning_flags
 from fabricdw.properties import get_property, modify_properties
+from fabricdw.properties.ports import assign_free_ports, release_ports
 
-LAUNCH_COMMAND: str = ("{java_executable} {java_args} -Dlog4j2.formatMsgNoLookups=true -Xms{min_ram}M -Xmx{max_ram}M "
-					   "-jar ./fabric-server-launch.jar nogui")
+LAUNCH_COMMAND: str = ("{java_executable} {java_args} -Dlog4j2.formatMsgNoLookups=true -Xms{min_ram}M -Xmx{max_ram}M"
+					   "{shared_archive} -jar ./fabric-server-launch.jar nogui")
 
 
 def set_property_if_not_defined(prop_name: str, fallback: str) -> None:
@@ -20,32 +27,64 @@ def set_property_if_not_defined(prop_name: str, fallback: str) -> None:
 		args().properties[prop_name] = fallback
 
 
-def create_installation() -> None:
+def create_installation() -> Installation | None:
+	"""The 'create' command
+	
+	:returns: the new installation, None if it was cancelled"""
 	Installation.ensure_does_not_exist(args().name)
 	
+	heap_mib: int = int(args().max_ram * 1024)
+	plan_resources(heap_mib, suggest_gc_threads=args().gc_threads is None and args().profile != TuningProfile.NONE)
+	
 	installation_directory: str = args().output_dir
+	ports: dict[str, str] = { }
 	
 	try:
 		os.makedirs(installation_directory, exist_ok=True)
 		
+		# files of a non-empty directory must not end up in an image
+		was_empty: bool = directory_is_empty(installation_directory)
+		
 		if not ask_okay_to_write_into(message_if_cancelled="cancelling installation"):
-			return
+			return None
 		
-		select_and_download_version()
+		versions: Versions = evaluate_versions()
 		
-		initialize_server()
+		if not (args().use_images and clone_image(versions, installation_directory)):
+			deploy_jar(fetch_server_jar(versions), installation_directory)
+			
+			initialize_server()
+			
+			if args().use_images and was_empty:
+				save_image(versions, installation_directory)
+		
+		if args().auto_port:
+			ports = assign_free_ports(args().properties)
 		
 		modify_properties()
 		
 		create_fabricdw_script()
 		
-		CONFIG.create_new_installation(args().name, installation_directory)
+		if args().cds:
+			refresh_shared_archive(installation_directory, args().java_executable)
+		
+		installation: Installation = CONFIG.create_new_installation(
+			args().name, installation_directory, versions=versions
+		)
+		
+		if args().pin_cpus:
+			rebalance([installation])
 		
-		return
+		register_installations([installation])
+		
+		return installation
 	except KeyboardInterrupt as kbe:
 		if remove_dir(installation_directory):
 			print("Interrupted! Cleaning up...")
 		raise kbe
+	finally:
+		release_resources(heap_mib)
+		release_ports(ports)
 
 
 def format_java_args(arguments: str) -> str:
@@ -55,37 +94,34 @@ def format_java_args(arguments: str) -> str:
 	return f"-{arguments.replace(',', ' -')}"
 
 
-def initialize_server(installation_directory: str = None) -> None:
-	if not installation_directory:
-		installation_directory = args().output_dir
+def render_fabricdw_script() -> str:
+	max_ram: int = int(args().max_ram * 1024)
 	
-	print("Initializing the server...")
-	print(f"{Fore.RED}{Style.BRIGHT}This should not actually start the server!{Style.RESET_ALL}")
-	# TODO: timeout?
-	subprocess.call(["java", "-jar", SERVER_JAR_FILE], cwd=installation_directory, stdout=args().init_output)
-
-
-def create_fabricdw_script(installation_directory: str = None) -> None:
-	if not installation_directory:
-		installation_directory = args().output_dir
+	# flags of the profile come first, so the own arguments can override them
+	java_args: str = " ".join(
+		tuning_flags(args().profile, max_ram, args().large_pages, args().gc_threads)
+		+ ([format_java_args(args().java_args)] if args().java_args else [])
+	)
 	
-	fabric_env_file: str = f"{installation_directory}/{FABRICD_ENV_FILE}"
 	launch_command: str = LAUNCH_COMMAND.format(
 		java_executable=args().java_executable,
-		java_args=format_java_args(args().java_args),
+		java_args=java_args,
 		min_ram=int(args().min_ram * 1024),
-		max_ram=int(args().max_ram * 1024)
+		max_ram=max_ram,
+		shared_archive=format_shared_archive(getattr(args(), "shared_archive", None))
 	)
 	
+	# taskset or numactl of pinned installations
+	if prefix := getattr(args(), "launch_prefix", ""):
+		launch_command = f"{prefix} {launch_command}"
+	
 	world_name: str = get_property(Properties.WORLD_NAME, Defaults.WORLD_NAME)
 	port: str = get_property(Properties.PORT_SERVER, Defaults.PORT_SERVER)
 	
-	with open(fabric_env_file, 'w') as launch_script_file:
-		# Note:
-		# BACKUP_PATHS is multiple folders. New versions do not use multiple world directories.
-		# This is fine. tar handles this.
-		launch_script_file.write(
-			f"""#!/bin/sh
+	# Note:
+	# BACKUP_PATHS is multiple folders. New versions do not use multiple world directories.
+	# This is fine. tar handles this.
+	return f"""#!/bin/sh
 
 GAME_USER="{args().user}" \\
 IDLE_SERVER="{convert_bool_to_str(args().idle_time != 0)}" \\
@@ -99,7 +135,17 @@ GAME_PORT="{port}" \\
 SERVER_START_CMD="{launch_command}" \\
 fabricd $*
 """
-		)
+
+
+def create_fabricdw_script(installation_directory: str = None) -> None:
+	if not installation_directory:
+		installation_directory = args().output_dir
+	
+	fabric_env_file: str = f"{installation_directory}/{FABRICD_ENV_FILE}"
+	
+	with open(fabric_env_file, 'w') as launch_script_file:
+		launch_script_file.write(render_fabricdw_script())
 	
 	# make the script executable
 	os.chmod(fabric_env_file, os.stat(fabric_env_file).st_mode | stat.S_IEXEC)
+
@@ -1,5 +1,8 @@
 from fabricdw.args import args
-from fabricdw.common import CONFIG, Installation, remove_dir, yes_no_question
+from fabricdw.common import CONFIG, Installation, yes_no_question
+from fabricdw.common.files import remove_tree
+from fabricdw.installations.affinity import rebalance
+from fabricdw.installations.trash import move_to_trash, purge_in_background
 
 
 def delete_installation() -> None:
@@ -8,8 +11,24 @@ def delete_installation() -> None:
 	if args().skip_delete_question or yes_no_question(
 		f"Remove installation '{active_installation.name}' ({active_installation.root})?\nThis will delete all files!"
 	):
-		remove_dir(active_installation.root)
-		print(f"installation '{active_installation.pretty_name()}' ({active_installation.root}) deleted!")
+		retention: float = args().retention if args().retention is not None else CONFIG.defaults.trash_retention
+		
+		if move_to_trash(active_installation, retention):
+			print(f"installation '{active_installation.pretty_name()}' ({active_installation.root}) deleted!")
+			
+			if retention > 0:
+				print(f"It can be restored within {retention:g}h with 'restore {active_installation.name}'")
+		else:
+			remove_tree(active_installation.root)
+			print(f"installation '{active_installation.pretty_name()}' ({active_installation.root}) deleted!")
+		
 		CONFIG.remove_installation(active_installation)
+		
+		# the remaining pinned installations get the freed CPUs
+		if active_installation.affinity is not None:
+			rebalance()
+		
+		# also removes installations of earlier deletes, whose retention expired
+		purge_in_background()
 	else:
 		print("nothing deleted")
@@ -1,21 +1,29 @@
 from __future__ import annotations
 
-import json
+import difflib
+import time
+from concurrent.futures import ThreadPoolExecutor
 from enum import StrEnum
 from typing import Any
 
-import requests
 from pick import pick
-from requests import Response
+from requests import HTTPError
 
-from fabricdw.args import args
-from fabricdw.common import InvalidCombinationException, SERVER_JAR_FILE, VersionChoice
+from fabricdw.args import args, bind_args
+from fabricdw.common import ensure_interactive, InvalidCombinationException, VersionChoice, Versions
+from fabricdw.installations.cache import get_json, OfflineCacheMissError
+from fabricdw.installations.store import deploy_jar, get_stored_jar, store_jar
 
 API_URL: str = "https://meta.fabricmc.net/v2"
 BASE_URL: str = f"{API_URL}/versions"
 
+# catalogs by url, with the JSON they were built from. The JSON stays the same object, until the cache changes
+_catalogs: dict[str, tuple[Any, VersionCatalog]] = { }
+
 
 class StableVersionDict:
+	__slots__ = ("version", "stability", "data")
+	
 	def __init__(self, data: dict[str, Any]):
 		self.version: str = data["version"]
 		self.stability: bool = data["stable"]
@@ -32,38 +40,127 @@ class StableVersionDict:
 		return StableVersionDict({ "version": version, "stable": stability })
 
 
+class VersionCatalog:
+	"""Versions as returned by the Fabric meta server (newest first), indexed by version string and stability"""
+	__slots__ = ("versions", "by_version", "stable", "order")
+	
+	def __init__(self, versions: list[StableVersionDict]):
+		self.versions: list[StableVersionDict] = versions
+		self.by_version: dict[str, StableVersionDict] = { version.version: version for version in versions }
+		self.stable: list[StableVersionDict] = [version for version in versions if version.stability]
+		# 0 is the newest version
+		self.order: dict[str, int] = { version.version: index for index, version in enumerate(versions) }
+	
+	def __contains__(self, version: str) -> bool:
+		return version in self.by_version
+	
+	def __len__(self) -> int:
+		return len(self.versions)
+	
+	def get(self, version: str) -> StableVersionDict | None:
+		return self.by_version.get(version)
+	
+	def select(self, stable_only: bool) -> list[StableVersionDict]:
+		return self.stable if stable_only else self.versions
+	
+	def suggest(self, version: str, count: int = 3) -> list[str]:
+		"""The versions closest to the given version, newest first"""
+		matches: list[str] = difflib.get_close_matches(version, self.by_version.keys(), n=count, cutoff=0.6)
+		
+		if len(matches) == 0:
+			matches = [v.version for v in self.select(stable_only=True)[:count]]
+		
+		return sorted(matches, key=lambda v: self.order[v])
+
+
 class ApiUrls(StrEnum):
 	GAME: str = f"{BASE_URL}/game"
 	LOADER: str = f"{BASE_URL}/loader"
 	INSTALLER: str = f"{BASE_URL}/installer"
 
 
-def find_version(versions: list[StableVersionDict], version: str, stable: bool) -> StableVersionDict | None:
-	for v in versions:
-		if v.version == version and v.stability == stable:
-			return v
+def get_json_cached(url: str) -> Any:
+	return get_json(url, offline=args().offline, ttl=0 if args().refresh_meta else None)
+
+
+def _catalog(url: str, entries: list[dict[str, Any]], key: str | None = None) -> VersionCatalog:
+	"""The catalog of the versions, built once for each response of the meta server
+	
+	:param key: the key of the version in each entry, None if the entries are the versions"""
+	if (cached := _catalogs.get(url)) is not None and cached[0] is entries:
+		return cached[1]
+	
+	catalog: VersionCatalog = VersionCatalog(
+		[StableVersionDict(entry[key] if key is not None else entry) for entry in entries]
+	)
+	_catalogs[url] = (entries, catalog)
+	
+	return catalog
+
+
+def get_versions(url: ApiUrls) -> VersionCatalog:
+	return _catalog(url, get_json_cached(url))
+
+
+def get_all_versions() -> tuple[VersionCatalog, VersionCatalog, VersionCatalog]:
+	"""Get the game, loader, and installer versions concurrently
 	
-	return None
+	:returns: game, loader, and installer versions"""
+	start: float = time.perf_counter()
+	
+	with ThreadPoolExecutor(max_workers=len(ApiUrls)) as executor:
+		game_versions, loader_versions, installer_versions = executor.map(bind_args(get_versions), ApiUrls)
+	
+	print(f"Got versions in {time.perf_counter() - start:.2f}s")
+	
+	return game_versions, loader_versions, installer_versions
 
 
-def filter_versions(versions: list[StableVersionDict], stable: bool) -> list[StableVersionDict]:
-	filtered_versions = [version for version in versions if version.stability is stable]
+def get_compatible_loaders(game_version: str) -> VersionCatalog:
+	"""The loader versions, which support the game version"""
+	url: str = f"{ApiUrls.LOADER}/{game_version}"
 	
-	return filtered_versions
+	return _catalog(url, get_json_cached(url), key="loader")
 
 
-def get_versions(url: ApiUrls) -> list[StableVersionDict]:
-	versions = json.loads(requests.get(url).text)
+def check_compatibility(versions: Versions) -> None:
+	"""Check the versions against the Fabric meta data, without downloading anything
+	
+	:raises InvalidCombinationException: if any version does not exist or the loader does not support the game"""
+	game_versions, loader_versions, installer_versions = [get_versions(url) for url in ApiUrls]
+	
+	for version, catalog, name in [
+		(versions.game, game_versions, "game"),
+		(versions.loader, loader_versions, "loader"),
+		(versions.installer, installer_versions, "installer")
+	]:
+		if version not in catalog:
+			raise InvalidCombinationException(
+				f"Unknown {name} version '{version}'. Did you mean {', '.join(catalog.suggest(version))}?"
+			)
+	
+	compatible_loaders: VersionCatalog = get_compatible_loaders(versions.game)
 	
-	return [StableVersionDict(version) for version in versions]
+	if len(compatible_loaders) == 0:
+		raise InvalidCombinationException(f"Game version '{versions.game}' is not supported by Fabric.")
+	
+	if versions.loader not in compatible_loaders:
+		raise InvalidCombinationException(
+			f"Loader version '{versions.loader}' does not support game version '{versions.game}'. "
+			f"Did you mean {', '.join(compatible_loaders.suggest(versions.loader))}?"
+		)
 
 
-def build_server_jar_url(game: StableVersionDict, loader: StableVersionDict, installer: StableVersionDict) -> str:
-	return f"{BASE_URL}/loader/{game.version}/{loader.version}/{installer.version}/server/jar"
+def build_server_jar_url(versions: Versions) -> str:
+	return f"{BASE_URL}/loader/{versions.game}/{versions.loader}/{versions.installer}/server/jar"
 
 
-def evaluate_user_choice(version, versions: list[StableVersionDict], name: str) -> StableVersionDict:
+def evaluate_user_choice(version, catalog: VersionCatalog, name: str, stable_only: bool) -> StableVersionDict:
+	versions: list[StableVersionDict] = catalog.select(stable_only)
+	
 	if version == VersionChoice.ASK or version is None:
+		ensure_interactive(f"select {name} version")
+		
 		_, i = pick([v.version for v in versions], f"select {name} version", indicator=">")
 		v = versions[i]
 		print(f"Using {name} version {v.version}")
@@ -71,59 +168,75 @@ def evaluate_user_choice(version, versions: list[StableVersionDict], name: str)
 	elif version == VersionChoice.LATEST:
 		print(f"Using latest {name} version ({versions[0].version})")
 		return versions[0]
-	else:
+	elif version in catalog:
 		print(f"Using given version for {name} ({version})")
-		return StableVersionDict.simple(version=version)
+		return catalog.get(version)
+	else:
+		raise InvalidCombinationException(
+			f"Unknown {name} version '{version}'. Did you mean {', '.join(catalog.suggest(version))}?"
+		)
 
 
-def evaluate_versions() -> str:
+def evaluate_versions() -> Versions:
 	"""evaluate given versions, ask user if necessary"""
 	print("Getting latest versions...")
 	
-	game_versions: list[StableVersionDict] = get_versions(ApiUrls.GAME)
-	loader_versions: list[StableVersionDict] = get_versions(ApiUrls.LOADER)
-	installer_versions: list[StableVersionDict] = get_versions(ApiUrls.INSTALLER)
+	game_versions, loader_versions, installer_versions = get_all_versions()
 	
-	if not args().allow_snapshots:
-		game_versions: list[StableVersionDict] = filter_versions(game_versions, True)
-	
-	if not args().allow_unstable:
-		loader_versions: list[StableVersionDict] = filter_versions(loader_versions, True)
-		installer_versions: list[StableVersionDict] = filter_versions(installer_versions, True)
+	if args().game_version == VersionChoice.KEEP:
+		game_version = StableVersionDict.simple(version=VersionChoice.KEEP)
+	else:
+		game_version = evaluate_user_choice(args().game_version, game_versions, "game", not args().allow_snapshots)
+		
+		# only offer loaders, which support the game version. Given versions are checked before the download
+		if args().loader_version in (VersionChoice.ASK, VersionChoice.LATEST, None):
+			try:
+				if len(compatible_loaders := get_compatible_loaders(game_version.version)) > 0:
+					loader_versions = compatible_loaders
+			except OfflineCacheMissError:
+				pass
 	
-	game_version = evaluate_user_choice(args().game_version, game_versions, "game")
-	loader_version = evaluate_user_choice(args().loader_version, loader_versions, "loader")
-	installer_version = evaluate_user_choice(args().installer_version, installer_versions, "installer")
+	loader_version = evaluate_user_choice(args().loader_version, loader_versions, "loader", not args().allow_unstable)
+	installer_version = evaluate_user_choice(
+		args().installer_version, installer_versions, "installer", not args().allow_unstable
+	)
 	
-	return build_server_jar_url(game_version, loader_version, installer_version)
+	return Versions(game_version.version, loader_version.version, installer_version.version)
 
 
-def download_server_jar(directory: str, server_url: str) -> str:
-	server_jar_response: Response = requests.get(server_url)
+def fetch_server_jar(versions: Versions) -> str:
+	"""Get the server jar of the versions from the jar store, download it if it is not stored yet
 	
-	if server_jar_response.status_code != 200:
-		raise InvalidCombinationException()
+	:returns: path of the stored jar file"""
+	if (jar_file := get_stored_jar(versions)) is not None:
+		print("Using stored server jar")
+		return jar_file
+	
+	server_url: str = build_server_jar_url(versions)
 	
-	server_jar_file: str = f"{directory}/{SERVER_JAR_FILE}"
+	if args().offline:
+		raise OfflineCacheMissError(server_url)
 	
-	with open(server_jar_file, "wb") as jar:
-		jar.write(server_jar_response.content)
+	check_compatibility(versions)
 	
-	return server_jar_file
+	try:
+		return store_jar(versions, server_url)
+	except HTTPError:
+		raise InvalidCombinationException()
 
 
-def select_and_download_version(installation_directory: str = None) -> str:
+def select_and_download_version(installation_directory: str = None) -> Versions:
 	"""User selects version, download it
-
+	
 	:param installation_directory the directory, where the server jar is placed
-
-	:returns: path of the downloaded jar file"""
+	
+	:returns: the selected versions"""
 	
 	if not installation_directory:
 		installation_directory = args().output_dir
 	
-	server_url: str = evaluate_versions()
+	versions: Versions = evaluate_versions()
 	
-	server_jar_file = download_server_jar(installation_directory, server_url)
+	deploy_jar(fetch_server_jar(versions), installation_directory)
 	
-	return server_jar_file
+	return versions
@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import os
+import re
+import shutil
+import subprocess
+import time
+
+from fabricdw.args import args
+from fabricdw.common import CACHE_DIR, CONFIG, FABRICD_ENV_FILE, SERVER_JAR_FILE, Versions
+from fabricdw.common.files import link_or_copy
+
+IMAGE_DIR: str = f"{CACHE_DIR}/images"
+# never part of an image
+IMAGE_EXCLUDES: set[str] = { "logs", "crash-reports", FABRICD_ENV_FILE }
+# leftovers of interrupted snapshots
+STALE_SNAPSHOT_AGE: int = 24 * 60 * 60
+GIB: int = 1024 * 1024 * 1024
+
+_java_versions: dict[str, str | None] = { }
+
+
+def java_version(java_executable: str) -> str | None:
+	"""The version of the java executable, None if it cannot be determined"""
+	if java_executable not in _java_versions:
+		try:
+			output: str = subprocess.run([java_executable, "-version"], capture_output=True, text=True).stderr
+		except OSError:
+			output = ""
+		
+		match = re.search(r'version "([^"]+)"', output)
+		_java_versions[java_executable] = match.group(1) if match else None
+	
+	return _java_versions[java_executable]
+
+
+def _is_immutable(relative_file: str) -> bool:
+	"""Only these files are known to be never written to in place, they may be hardlinked"""
+	return relative_file == SERVER_JAR_FILE or relative_file.startswith("libraries/")
+
+
+def _clone_tree(source: str, target: str) -> None:
+	for root, directories, files in os.walk(source):
+		relative_root: str = os.path.relpath(root, source)
+		
+		if relative_root == ".":
+			directories[:] = [directory for directory in directories if directory not in IMAGE_EXCLUDES]
+			files = [file for file in files if file not in IMAGE_EXCLUDES]
+		
+		os.makedirs(os.path.join(target, relative_root), exist_ok=True)
+		
+		for file in files:
+			relative_file: str = os.path.normpath(os.path.join(relative_root, file))
+			
+			# images may be evicted, a symlink into them would break
+			link_or_copy(
+				os.path.join(source, relative_file),
+				os.path.join(target, relative_file),
+				hardlink=_is_immutable(relative_file),
+				symlink=False
+			)
+
+
+def _tree_size(directory: str) -> int:
+	return sum(
+		os.path.getsize(os.path.join(root, file)) for root, _, files in os.walk(directory) for file in files
+	)
+
+
+def get_image(versions: Versions) -> str | None:
+	"""The image directory of the versions and the configured java, None if java cannot be used"""
+	if (java := java_version(args().java_executable)) is None:
+		return None
+	
+	return f"{IMAGE_DIR}/{versions.game}_{versions.loader}_{versions.installer}_java{java}"
+
+
+def clone_image(versions: Versions, installation_directory: str) -> bool:
+	"""Create the installation from the initialized image of the versions
+	
+	:returns: True if an image existed"""
+	if (image := get_image(versions)) is None or not os.path.isdir(image):
+		return False
+	
+	start: float = time.perf_counter()
+	
+	_clone_tree(image, installation_directory)
+	
+	# the modification time of an image is the time it was last used
+	os.utime(image)
+	
+	print(f"Created the server from a cached image in {time.perf_counter() - start:.2f}s")
+	
+	return True
+
+
+def save_image(versions: Versions, installation_directory: str) -> None:
+	"""Save the freshly initialized installation as image of the versions"""
+	if (image := get_image(versions)) is None or os.path.isdir(image):
+		return
+	
+	os.makedirs(IMAGE_DIR, exist_ok=True)
+	
+	snapshot: str = f"{IMAGE_DIR}/.{os.path.basename(image)}.{os.getpid()}.tmp"
+	_clone_tree(installation_directory, snapshot)
+	
+	try:
+		os.rename(snapshot, image)
+	except OSError:
+		# another process saved the same image in the meantime
+		shutil.rmtree(snapshot)
+	
+	evict_images()
+
+
+def evict_images() -> None:
+	"""Remove images unused for 'image-max-age' days, then the least recently used ones above 'image-max-size' GiB"""
+	if not os.path.isdir(IMAGE_DIR):
+		return
+	
+	now: float = time.time()
+	images: list[tuple[float, str]] = []
+	
+	for entry in os.scandir(IMAGE_DIR):
+		last_used: float = entry.stat().st_mtime
+		
+		if entry.name.startswith("."):
+			if now - last_used > STALE_SNAPSHOT_AGE:
+				shutil.rmtree(entry.path, ignore_errors=True)
+		elif now - last_used > CONFIG.defaults.image_max_age * 24 * 60 * 60:
+			print(f"Removing unused image {entry.name}")
+			shutil.rmtree(entry.path, ignore_errors=True)
+		else:
+			images.append((last_used, entry.path))
+	
+	sizes: dict[str, int] = { image: _tree_size(image) for _, image in images }
+	total: int = sum(sizes.values())
+	
+	for _, image in sorted(images):
+		if total <= CONFIG.defaults.image_max_size * GIB:
+			break
+		
+		print(f"Removing least recently used image {os.path.basename(image)}")
+		shutil.rmtree(image, ignore_errors=True)
+		total -= sizes[image]
@@ -13,4 +13,8 @@ def import_installation() -> None:
 		print(f"Invalid path ({target_directory})")
 		return
 	
+	if (installation := CONFIG.get_installation_by_root(target_directory)) is not None:
+		print(f"The directory is already used by {installation}")
+		return
+	
 	CONFIG.create_new_installation(args().name, target_directory)
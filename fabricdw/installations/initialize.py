@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+import os
+import signal
+import subprocess
+import time
+
+from colorama import Fore, Style
+
+from fabricdw.args import args
+from fabricdw.common import EULA_FILE, SERVER_JAR_FILE, SERVER_PROPERTIES_FILE
+
+POLL_INTERVAL: float = 0.05
+TERMINATE_TIMEOUT: float = 10
+
+
+class ServerInitializationError(Exception):
+	def __init__(self, reason: str):
+		super().__init__(f"{Fore.RED}Initializing the server failed: {reason}{Style.RESET_ALL}")
+
+
+def _written_since(file: str, start: float) -> int | None:
+	"""The size of the file, if it was written after start"""
+	try:
+		file_stat: os.stat_result = os.stat(file)
+	except FileNotFoundError:
+		return None
+	
+	return file_stat.st_size if file_stat.st_mtime >= start else None
+
+
+def stop_process(process: subprocess.Popen) -> None:
+	if process.poll() is not None:
+		return
+	
+	# the java executable may be a wrapper script, stop all of its children as well
+	os.killpg(process.pid, signal.SIGTERM)
+	
+	try:
+		process.wait(TERMINATE_TIMEOUT)
+	except subprocess.TimeoutExpired:
+		os.killpg(process.pid, signal.SIGKILL)
+		process.wait()
+
+
+def initialize_server(installation_directory: str = None) -> float:
+	"""Run the server until it created the eula.txt and server.properties files, then stop it.
+	Fabric downloads and remaps the game before that, the world is never generated.
+	
+	:raises ServerInitializationError: if the files are not created in time
+	
+	:returns: the time the initialization took"""
+	if not installation_directory:
+		installation_directory = args().output_dir
+	
+	print("Initializing the server...")
+	print(f"{Fore.RED}{Style.BRIGHT}This should not actually start the server!{Style.RESET_ALL}")
+	
+	eula_file: str = f"{installation_directory}/{EULA_FILE}"
+	properties_file: str = f"{installation_directory}/{SERVER_PROPERTIES_FILE}"
+	
+	# mtimes may be truncated to whole seconds
+	start: float = time.time() // 1
+	timer: float = time.perf_counter()
+	
+	process: subprocess.Popen = subprocess.Popen(
+		[args().java_executable, "-jar", SERVER_JAR_FILE, "nogui"],
+		cwd=installation_directory,
+		stdin=subprocess.DEVNULL,
+		stdout=args().init_output,
+		start_new_session=True
+	)
+	
+	last_size: int | None = None
+	
+	try:
+		while True:
+			# server.properties is saved on every start, an accepted eula.txt is not rewritten
+			size: int | None = _written_since(properties_file, start)
+			
+			# the file is complete once its size stops changing
+			if size and size == last_size and os.path.exists(eula_file):
+				break
+			last_size = size
+			
+			if process.poll() is not None:
+				if _written_since(properties_file, start) and os.path.exists(eula_file):
+					break
+				raise ServerInitializationError(f"the server exited with code {process.returncode}")
+			
+			if time.perf_counter() - timer > args().init_timeout:
+				raise ServerInitializationError(f"timed out after {args().init_timeout}s")
+			
+			time.sleep(POLL_INTERVAL)
+	finally:
+		stop_process(process)
+	
+	elapsed: float = time.perf_counter() - timer
+	print(f"Initialized the server in {elapsed:.1f}s")
+	
+	return elapsed
@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+import json
+import os
+
+from colorama import Fore, Style
+
+from fabricdw.args import args
+from fabricdw.common import CONFIG, FABRICD_ENV_FILE, Installation, SERVER_JAR_FILE, SERVER_PROPERTIES_FILE
+
+# installations are checked in parallel, network mounts answer slowly
+VERIFY_JOBS: int = 16
+MIB: int = 1024 * 1024
+
+
+def _readable(file: str) -> bool:
+	try:
+		with open(file, "rb") as readable_file:
+			readable_file.read(1)
+	except OSError:
+		return False
+	
+	return True
+
+
+def verify_installation(installation: Installation) -> dict[str, bool]:
+	"""Check the parts of the installation, which are needed to run the server
+
+	:returns: the result of each check"""
+	if not os.path.isdir(installation.root):
+		return { "directory": False, "jar": False, "wrapper": False, "properties": False }
+	
+	wrapper: str = f"{installation.root}/{FABRICD_ENV_FILE}"
+	
+	return {
+		"directory": True,
+		"jar": os.path.isfile(f"{installation.root}/{SERVER_JAR_FILE}"),
+		"wrapper": os.path.isfile(wrapper) and os.access(wrapper, os.X_OK),
+		"properties": _readable(f"{installation.root}/{SERVER_PROPERTIES_FILE}"),
+	}
+
+
+def _status(checks: dict[str, bool]) -> str:
+	if not checks["directory"]:
+		return "FAIL"
+	
+	return "OK" if all(checks.values()) else "WARN"
+
+
+def list_all_installations() -> None:
+	installations: list[Installation] = CONFIG.installations
+	
+	checks: dict[str, dict[str, bool]] = { }
+	if args().verify:
+		# threads and the disk usage cache are only loaded for the options, which need them
+		from concurrent.futures import ThreadPoolExecutor
+		
+		with ThreadPoolExecutor(max_workers=VERIFY_JOBS) as executor:
+			checks = dict(zip([i.name for i in installations], executor.map(verify_installation, installations)))
+	
+	sizes: dict[str, int] = { }
+	if args().sizes:
+		from fabricdw.installations.usage import disk_usage
+		
+		sizes = disk_usage([i.root for i in installations if checks.get(i.name, { }).get("directory", True)])
+	
+	if args().json:
+		print(
+			json.dumps(
+				[
+					installation.to_dict()
+					| ({ "status": _status(checks[installation.name]), "checks": checks[installation.name] }
+					   if args().verify else { })
+					| ({ "size": sizes.get(installation.root) } if args().sizes else { })
+					for installation in installations
+				],
+				indent=4
+			)
+		)
+	elif len(installations) == 0:
+		print("There are no installations")
+	else:
+		print("All installations:")
+		
+		for installation in installations:
+			line: str = str(installation)
+			
+			if args().sizes and installation.root in sizes:
+				line += f" {sizes[installation.root] / MIB:.1f} MiB"
+			
+			if args().verify:
+				status: str = _status(checks[installation.name])
+				color: str = { "OK": Fore.GREEN, "WARN": Fore.YELLOW, "FAIL": Fore.RED }[status]
+				missing: list[str] = [check for check, passed in checks[installation.name].items() if not passed]
+				
+				line = f"[{color}{status.center(4)}{Style.RESET_ALL}] {line}"
+				if status == "WARN":
+					line += f" {Fore.YELLOW}(missing or unreadable: {', '.join(missing)}){Style.RESET_ALL}"
+			else:
+				line = f"\t{line}"
+			
+			print(line)
+	
+	# installations without their directory are removed from the saved list
+	for installation in installations:
+		if args().verify and not checks[installation.name]["directory"]:
+			CONFIG.remove_installation(installation)
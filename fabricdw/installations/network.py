@@ -0,0 +1,147 @@
+import os
+import threading
+import time
+from typing import Callable
+
+import requests
+from colorama import Fore, Style
+from requests.adapters import HTTPAdapter
+
+from fabricdw.common.files import file_sha256
+
+REQUEST_TIMEOUT: float = 10
+DOWNLOAD_CHUNK_SIZE: int = 256 * 1024
+DOWNLOAD_RETRIES: int = 5
+MIB: int = 1024 * 1024
+
+_session: requests.Session | None = None
+_session_lock: threading.Lock = threading.Lock()
+
+
+def session() -> requests.Session:
+	"""The shared keep-alive session for all Fabric meta traffic.
+	Reusing it avoids a TLS handshake per request, and it is safe to use from multiple threads."""
+	global _session
+	
+	with _session_lock:
+		if _session is None:
+			_session = requests.Session()
+			
+			adapter: HTTPAdapter = HTTPAdapter(pool_connections=2, pool_maxsize=8)
+			_session.mount("https://", adapter)
+			_session.mount("http://", adapter)
+	
+	return _session
+
+
+class DownloadError(Exception):
+	def __init__(self, url: str, reason: str):
+		super().__init__(f"{Fore.RED}Download of '{url}' failed: {reason}{Style.RESET_ALL}")
+
+
+def _content_total(response: requests.Response, offset: int) -> int | None:
+	"""The total size of the file, taken from Content-Range for partial and from Content-Length for full responses"""
+	if response.status_code == 206:
+		content_range: str = response.headers.get("Content-Range", "")
+		total: str = content_range.rpartition("/")[2]
+		return int(total) if total.isdigit() else None
+	
+	length: str | None = response.headers.get("Content-Length")
+	return int(length) if length is not None and length.isdigit() else None
+
+
+def _print_progress(done: int, total: int | None, start: float, end: str = "\r") -> None:
+	elapsed: float = max(time.perf_counter() - start, 1e-6)
+	size: str = f"{done / MIB:.1f}/{total / MIB:.1f} MiB" if total else f"{done / MIB:.1f} MiB"
+	print(f"Downloading: {size} ({done / MIB / elapsed:.1f} MiB/s)", end=end)
+
+
+def download_file(
+	url: str, target: str, expected_sha256: str | None = None, verify: Callable[[str], bool] | None = None
+) -> str:
+	"""Stream the url into a temporary file next to the target and move it into place once it is complete.
+	A dropped connection is resumed with a range request. The target is never left partially written.
+	
+	:param url: the url to download
+	:param target: the file to write
+	:param expected_sha256: if given, the download is rejected if its hash differs
+	:param verify: if given, the download is rejected if it returns False for the downloaded file
+	
+	:raises requests.HTTPError: if the server does not respond with the file
+	:raises DownloadError: if the file could not be downloaded completely
+	
+	:returns: the sha256 of the downloaded file"""
+	partial_file: str = f"{target}.part"
+	total: int | None = None
+	
+	# a leftover of an earlier run may belong to another url
+	if os.path.exists(partial_file):
+		os.remove(partial_file)
+	
+	start: float = time.perf_counter()
+	attempt: int = 0
+	
+	while True:
+		offset: int = os.path.getsize(partial_file) if os.path.exists(partial_file) else 0
+		# ranges refer to the encoded body, so the body must not be compressed
+		headers: dict[str, str] = { "Accept-Encoding": "identity" }
+		if offset > 0:
+			headers["Range"] = f"bytes={offset}-"
+		
+		try:
+			with session().get(url, headers=headers, stream=True, timeout=REQUEST_TIMEOUT) as response:
+				if response.status_code == 416 and offset > 0 and offset == total:
+					break
+				
+				response.raise_for_status()
+				
+				# servers may ignore the range and send everything
+				mode: str = "ab" if response.status_code == 206 else "wb"
+				done: int = offset if mode == "ab" else 0
+				total = _content_total(response, offset) or total
+				last_print: float = 0
+				
+				with open(partial_file, mode) as partial:
+					for chunk in response.iter_content(DOWNLOAD_CHUNK_SIZE):
+						partial.write(chunk)
+						done += len(chunk)
+						
+						if time.perf_counter() - last_print > 0.2:
+							last_print = time.perf_counter()
+							_print_progress(done, total, start)
+					
+					partial.flush()
+					os.fsync(partial.fileno())
+			
+			if total is None or done >= total:
+				_print_progress(done, total, start, end="\n")
+				break
+		except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as error:
+			print()
+			
+			if attempt >= DOWNLOAD_RETRIES:
+				raise DownloadError(url, str(error))
+			
+			print(f"{Fore.YELLOW}Connection lost ({error}), resuming...{Style.RESET_ALL}")
+		
+		attempt += 1
+		if attempt > DOWNLOAD_RETRIES:
+			raise DownloadError(url, "retries exhausted")
+	
+	size: int = os.path.getsize(partial_file)
+	if total is not None and size != total:
+		os.remove(partial_file)
+		raise DownloadError(url, f"expected {total} bytes, got {size}")
+	
+	sha256: str = file_sha256(partial_file)
+	if expected_sha256 is not None and sha256 != expected_sha256:
+		os.remove(partial_file)
+		raise DownloadError(url, f"expected sha256 {expected_sha256}, got {sha256}")
+	
+	if verify is not None and not verify(partial_file):
+		os.remove(partial_file)
+		raise DownloadError(url, "the downloaded file is invalid")
+	
+	os.replace(partial_file, target)
+	
+	return sha256
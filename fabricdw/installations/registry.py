@@ -0,0 +1,248 @@
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import time
+from contextlib import closing
+from fnmatch import fnmatch
+from typing import Any
+
+from colorama import Fore, Style
+
+from fabricdw.args import args
+from fabricdw.common import absolute_path, CONFIG, Installation, SERVER_JAR_FILE
+from fabricdw.common.files import file_sha256
+from fabricdw.common.properties import Properties
+from fabricdw.installations.script import read_fabricdw_script, strip_affinity
+from fabricdw.installations.tuning import memory_option
+from fabricdw.installations.usage import disk_usage
+from fabricdw.properties.index import load_fleet_properties
+
+# a mirror of the config with metadata of each installation, created by the first 'query'
+REGISTRY_FILE: str = absolute_path("~/.config/fabricdw.sqlite")
+REGISTRY_TIMEOUT: int = 30
+MIB: int = 1024 * 1024
+
+_SCHEMA: str = """
+CREATE TABLE IF NOT EXISTS installations (
+	name TEXT PRIMARY KEY,
+	root TEXT NOT NULL UNIQUE,
+	game_version TEXT,
+	loader_version TEXT,
+	installer_version TEXT,
+	server_port INTEGER,
+	query_port INTEGER,
+	rcon_port INTEGER,
+	min_ram INTEGER,
+	max_ram INTEGER,
+	java TEXT,
+	jar_sha256 TEXT,
+	jar_mtime INTEGER,
+	jar_size INTEGER,
+	created REAL NOT NULL,
+	updated REAL NOT NULL,
+	disk_size INTEGER,
+	disk_size_time REAL
+);
+CREATE INDEX IF NOT EXISTS installations_versions ON installations (game_version, loader_version, installer_version);
+CREATE INDEX IF NOT EXISTS installations_loader ON installations (loader_version);
+CREATE INDEX IF NOT EXISTS installations_server_port ON installations (server_port);
+CREATE INDEX IF NOT EXISTS installations_java ON installations (java);
+CREATE INDEX IF NOT EXISTS installations_jar ON installations (jar_sha256);
+"""
+
+# query options and the columns they filter
+FILTERS: dict[str, str] = {
+	"game_version": "game_version",
+	"loader_version": "loader_version",
+	"installer_version": "installer_version",
+	"java": "java",
+	"port": "server_port",
+	"jar": "jar_sha256",
+}
+
+
+def _connect() -> sqlite3.Connection:
+	os.makedirs(os.path.dirname(REGISTRY_FILE), exist_ok=True)
+	
+	connection: sqlite3.Connection = sqlite3.connect(REGISTRY_FILE, timeout=REGISTRY_TIMEOUT)
+	connection.row_factory = sqlite3.Row
+	connection.executescript(_SCHEMA)
+	
+	return connection
+
+
+def _port(properties: dict[str, str], name: str) -> int | None:
+	return int(value) if (value := properties.get(name, "")).isdigit() else None
+
+
+def _jar_sha256(installation: Installation, row: sqlite3.Row | None) -> tuple[str | None, int | None, int | None]:
+	"""The hash, modification time, and size of the server jar, only hashed again if it changed"""
+	try:
+		jar_stat: os.stat_result = os.stat(f"{installation.root}/{SERVER_JAR_FILE}")
+	except OSError:
+		return None, None, None
+	
+	if row is not None and row["jar_mtime"] == jar_stat.st_mtime_ns and row["jar_size"] == jar_stat.st_size:
+		return row["jar_sha256"], row["jar_mtime"], row["jar_size"]
+	
+	return file_sha256(f"{installation.root}/{SERVER_JAR_FILE}"), jar_stat.st_mtime_ns, jar_stat.st_size
+
+
+def _collect(installation: Installation, properties: dict[str, str], row: sqlite3.Row | None) -> dict[str, Any]:
+	"""The metadata of the installation, as stored in the registry"""
+	try:
+		command: str = strip_affinity(read_fabricdw_script(installation.root)["SERVER_START_CMD"])
+	except (OSError, KeyError):
+		command = ""
+	
+	jar_sha256, jar_mtime, jar_size = _jar_sha256(installation, row)
+	versions = installation.versions
+	
+	return {
+		"name": installation.name,
+		"root": installation.root,
+		"game_version": versions.game if versions else None,
+		"loader_version": versions.loader if versions else None,
+		"installer_version": versions.installer if versions else None,
+		"server_port": _port(properties, Properties.PORT_SERVER),
+		"query_port": _port(properties, Properties.PORT_QUERY),
+		"rcon_port": _port(properties, Properties.PORT_RCON),
+		"min_ram": memory_option(command, "-Xms"),
+		"max_ram": memory_option(command, "-Xmx"),
+		"java": command.split()[0] if command else None,
+		"jar_sha256": jar_sha256,
+		"jar_mtime": jar_mtime,
+		"jar_size": jar_size,
+	}
+
+
+def _store(
+	connection: sqlite3.Connection, installation: Installation, properties: dict[str, str], row: sqlite3.Row | None,
+	disk_size: int | None = None
+) -> None:
+	"""Insert or replace the row of the installation. Installations keep their creation time, and the time of their
+	last version change.
+	
+	:param disk_size: the measured size of the installation, None to keep the last known one"""
+	now: float = time.time()
+	values: dict[str, Any] = _collect(installation, properties, row)
+	
+	versions_changed: bool = row is not None and any(
+		row[column] != values[column] for column in ("game_version", "loader_version", "installer_version")
+	)
+	
+	values["created"] = row["created"] if row is not None else now
+	values["updated"] = now if row is None or versions_changed else row["updated"]
+	
+	if disk_size is not None:
+		values["disk_size"], values["disk_size_time"] = disk_size, now
+	else:
+		values["disk_size"] = row["disk_size"] if row is not None else None
+		values["disk_size_time"] = row["disk_size_time"] if row is not None else None
+	
+	# renamed installations keep their row
+	if row is not None and row["name"] != installation.name:
+		connection.execute("DELETE FROM installations WHERE name = ?", (row["name"],))
+	
+	connection.execute(
+		f"INSERT OR REPLACE INTO installations ({', '.join(values)}) VALUES ({', '.join('?' * len(values))})",
+		tuple(values.values())
+	)
+
+
+def sync_registry(connection: sqlite3.Connection, measure_sizes: bool = False) -> None:
+	"""Mirror the config into the registry. The first sync migrates all installations of the config.
+	
+	:param measure_sizes: also measure the disk size of each installation"""
+	fleet: dict[str, dict[str, str]] = load_fleet_properties()
+	rows: dict[str, sqlite3.Row] = { row["name"]: row for row in connection.execute("SELECT * FROM installations") }
+	rows_by_root: dict[str, sqlite3.Row] = { row["root"]: row for row in rows.values() }
+	sizes: dict[str, int] = disk_usage([i.root for i in CONFIG.installations]) if measure_sizes else { }
+	
+	with connection:
+		for installation in CONFIG.installations:
+			row: sqlite3.Row | None = rows.pop(installation.name, None)
+			
+			if row is None and (row := rows_by_root.get(installation.root)) is not None:
+				rows.pop(row["name"], None)
+			
+			_store(connection, installation, fleet.get(installation.name, { }), row, sizes.get(installation.root))
+		
+		# removed from the config
+		connection.executemany("DELETE FROM installations WHERE name = ?", [(name,) for name in rows])
+
+
+def register_installations(installations: list[Installation]) -> None:
+	"""Update the rows of the installations, if the registry is used. Created and updated installations get their
+	timestamps right away, instead of at the next query."""
+	if not os.path.exists(REGISTRY_FILE):
+		return
+	
+	fleet: dict[str, dict[str, str]] = load_fleet_properties()
+	
+	with closing(_connect()) as connection, connection:
+		for installation in installations:
+			row: sqlite3.Row | None = connection.execute(
+				"SELECT * FROM installations WHERE name = ? OR root = ?", (installation.name, installation.root)
+			).fetchone()
+			
+			_store(connection, installation, fleet.get(installation.name, { }), row)
+
+
+def _format_ram(mib: int | None) -> str:
+	return f"{mib / 1024:g}G" if mib is not None else "-"
+
+
+def query_installations() -> None:
+	"""The 'query' command"""
+	with closing(_connect()) as connection:
+		sync_registry(connection, measure_sizes=args().sizes)
+		
+		conditions: list[str] = []
+		parameters: list[Any] = []
+		
+		for option, column in FILTERS.items():
+			if (value := getattr(args(), option)) is not None:
+				conditions.append(f"{column} = ?")
+				parameters.append(value)
+		
+		rows: list[sqlite3.Row] = connection.execute(
+			"SELECT * FROM installations" + (f" WHERE {' AND '.join(conditions)}" if conditions else "")
+			+ " ORDER BY name",
+			parameters
+		).fetchall()
+	
+	if args().filter is not None:
+		rows = [row for row in rows if fnmatch(row["name"], args().filter)]
+	
+	if args().json:
+		print(json.dumps([dict(row) for row in rows], indent=4))
+		return
+	
+	if len(rows) == 0:
+		print(f"{Fore.YELLOW}No installation matches{Style.RESET_ALL}")
+		return
+	
+	table: list[tuple[str, ...]] = [("Name", "Versions", "Port", "RAM", "Java", "Size")] + [
+		(
+			row["name"],
+			f"{row['game_version']}/{row['loader_version']}/{row['installer_version']}" if row["game_version"] else "-",
+			str(row["server_port"] or "-"),
+			f"{_format_ram(row['min_ram'])}-{_format_ram(row['max_ram'])}" if row["max_ram"] is not None else "-",
+			row["java"] or "-",
+			f"{row['disk_size'] / MIB:.0f} MiB" if row["disk_size"] is not None else "-"
+		)
+		for row in rows
+	]
+	widths: list[int] = [max(len(row[column]) for row in table) for column in range(len(table[0]))]
+	
+	for row in table:
+		print("  ".join(cell.ljust(width) for cell, width in zip(row, widths)).rstrip())
+	
+	total_ram: int = sum(row["max_ram"] or 0 for row in rows)
+	total_size: int = sum(row["disk_size"] or 0 for row in rows)
+	
+	print()
+	print(f"{len(rows)} installations, {_format_ram(total_ram)} RAM allocated, {total_size / MIB:.0f} MiB on disk")
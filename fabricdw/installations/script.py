@@ -0,0 +1,63 @@
+import re
+
+from fabricdw.common import FABRICD_ENV_FILE
+
+SHARED_ARCHIVE_OPTION: str = "-XX:SharedArchiveFile="
+# taskset or numactl in front of the java executable
+AFFINITY_PREFIX: re.Pattern = re.compile(r"^(taskset -c \S+|numactl( --\S+)+) ")
+
+
+def read_fabricdw_script(installation_directory: str) -> dict[str, str]:
+	"""The variables of an existing fabricdw file"""
+	with open(f"{installation_directory}/{FABRICD_ENV_FILE}", "r") as launch_script_file:
+		script: str = launch_script_file.read()
+	
+	return { name: value for name, value in re.findall(r'^([A-Z_]+)="([^"]*)"', script, flags=re.MULTILINE) }
+
+
+def update_fabricdw_script(installation_directory: str, variables: dict[str, str]) -> None:
+	"""Change variables of an existing fabricdw file, keeping everything else as it is"""
+	fabric_env_file: str = f"{installation_directory}/{FABRICD_ENV_FILE}"
+	
+	with open(fabric_env_file, "r") as launch_script_file:
+		script: str = launch_script_file.read()
+	
+	for name, value in variables.items():
+		script = re.sub(rf'^{name}="[^"]*"', lambda _: f'{name}="{value}"', script, flags=re.MULTILINE)
+	
+	with open(fabric_env_file, "w") as launch_script_file:
+		launch_script_file.write(script)
+
+
+def format_shared_archive(archive: str | None) -> str:
+	"""The launch command part, which uses the archive. It precedes '-jar'"""
+	return f" {SHARED_ARCHIVE_OPTION}{archive}" if archive else ""
+
+
+def get_shared_archive(installation_directory: str) -> str | None:
+	"""The class data sharing archive the server is launched with, None if there is none"""
+	command: str = read_fabricdw_script(installation_directory)["SERVER_START_CMD"]
+	match = re.search(rf"{SHARED_ARCHIVE_OPTION}(\S+)", command)
+	
+	return match.group(1) if match else None
+
+
+def set_shared_archive(installation_directory: str, archive: str | None) -> None:
+	"""Launch the server with the class data sharing archive, or without one if archive is None"""
+	command: str = read_fabricdw_script(installation_directory)["SERVER_START_CMD"]
+	command = re.sub(rf" ?{SHARED_ARCHIVE_OPTION}\S+", "", command)
+	command = command.replace(" -jar ", f"{format_shared_archive(archive)} -jar ", 1)
+	
+	update_fabricdw_script(installation_directory, { "SERVER_START_CMD": command })
+
+
+def strip_affinity(command: str) -> str:
+	"""The launch command without the CPU affinity in front of it"""
+	return AFFINITY_PREFIX.sub("", command)
+
+
+def set_affinity(installation_directory: str, prefix: str) -> None:
+	"""Launch the server with the prefix in front of the java executable, replacing an existing one"""
+	command: str = strip_affinity(read_fabricdw_script(installation_directory)["SERVER_START_CMD"])
+	
+	update_fabricdw_script(installation_directory, { "SERVER_START_CMD": f"{prefix} {command}" if prefix else command })
@@ -0,0 +1,171 @@
+from __future__ import annotations
+
+import fcntl
+import json
+import os
+import stat
+import time
+import zipfile
+from contextlib import contextmanager
+from typing import Iterator
+
+from colorama import Fore, Style
+
+from fabricdw.args import args
+from fabricdw.common import CACHE_DIR, CONFIG, SERVER_JAR_FILE, Versions
+from fabricdw.common.files import link_or_copy, read_json
+from fabricdw.installations.cds import collect_shared_archives
+from fabricdw.installations.images import evict_images
+from fabricdw.installations.network import download_file, MIB
+
+JAR_STORE_DIR: str = f"{CACHE_DIR}/jars"
+JAR_INDEX_FILE: str = f"{JAR_STORE_DIR}/index.json"
+JAR_INDEX_LOCK_FILE: str = f"{JAR_STORE_DIR}/index.lock"
+# downloads younger than this may still be running
+DOWNLOAD_GRACE_PERIOD: int = 3600
+
+
+def _jar_file(sha256: str) -> str:
+	return f"{JAR_STORE_DIR}/{sha256}.jar"
+
+
+@contextmanager
+def _locked_index() -> Iterator[dict[str, str]]:
+	"""The index of version keys to jar hashes, locked against other processes.
+	Changes to the yielded dict are written back."""
+	os.makedirs(JAR_STORE_DIR, exist_ok=True)
+	
+	with open(JAR_INDEX_LOCK_FILE, "w") as lock:
+		fcntl.flock(lock, fcntl.LOCK_EX)
+		
+		index: dict[str, str] = _read_index()
+		original: dict[str, str] = index.copy()
+		
+		yield index
+		
+		if index != original:
+			temporary_file: str = f"{JAR_INDEX_FILE}.{os.getpid()}.tmp"
+			with open(temporary_file, "w") as index_file:
+				json.dump(index, index_file, indent=4)
+			os.replace(temporary_file, JAR_INDEX_FILE)
+
+
+def _read_index() -> dict[str, str]:
+	try:
+		return read_json(JAR_INDEX_FILE).copy()
+	except (OSError, ValueError):
+		return { }
+
+
+def get_stored_jar(versions: Versions) -> str | None:
+	"""The stored jar of the versions, None if it is not stored"""
+	sha256: str | None = _read_index().get(versions.key())
+	
+	if sha256 is None or not os.path.isfile(jar_file := _jar_file(sha256)):
+		return None
+	
+	return jar_file
+
+
+def store_jar(versions: Versions, url: str) -> str:
+	"""Download the jar of the versions into the store
+
+	:returns: the stored jar"""
+	os.makedirs(JAR_STORE_DIR, exist_ok=True)
+	
+	download: str = f"{JAR_STORE_DIR}/{versions.key().replace('/', '_')}.{os.getpid()}.download"
+	
+	sha256: str = download_file(url, download, verify=zipfile.is_zipfile)
+	
+	jar_file: str = _jar_file(sha256)
+	
+	# identical jars are stored only once
+	if os.path.exists(jar_file):
+		os.remove(download)
+	else:
+		# stored jars are shared via hardlinks, they must never be written to in place
+		os.chmod(download, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+		os.replace(download, jar_file)
+	
+	with _locked_index() as index:
+		index[versions.key()] = sha256
+	
+	return jar_file
+
+
+def deploy_jar(jar_file: str, installation_directory: str, print_message: bool = True) -> str:
+	"""Link the stored jar into the installation
+
+	:returns: the path of the server jar in the installation"""
+	server_jar_file: str = f"{installation_directory}/{SERVER_JAR_FILE}"
+	
+	method: str = link_or_copy(jar_file, server_jar_file)
+	
+	if print_message:
+		print(f"Placed server jar ({method})")
+	
+	return server_jar_file
+
+
+def _referenced_inodes() -> set[tuple[int, int]]:
+	inodes: set[tuple[int, int]] = set()
+	
+	for installation in CONFIG.installations:
+		try:
+			# follows symlinks into the store
+			jar_stat: os.stat_result = os.stat(f"{installation.root}/{SERVER_JAR_FILE}")
+		except OSError:
+			continue
+		
+		inodes.add((jar_stat.st_dev, jar_stat.st_ino))
+	
+	return inodes
+
+
+def collect_garbage() -> None:
+	"""Remove stored jars and class data sharing archives, which no installation uses, and evict old images"""
+	if not args().dry_run:
+		evict_images()
+	
+	freed: int = collect_shared_archives(args().dry_run)
+	
+	if not os.path.isdir(JAR_STORE_DIR):
+		print(f"{Fore.GREEN}{'Would free' if args().dry_run else 'Freed'} {freed / MIB:.1f} MiB{Style.RESET_ALL}")
+		return
+	
+	referenced_keys: set[str] = { i.versions.key() for i in CONFIG.installations if i.versions is not None }
+	referenced_inodes: set[tuple[int, int]] = _referenced_inodes()
+	
+	now: float = time.time()
+	
+	with _locked_index() as index:
+		referenced_hashes: set[str] = { sha256 for key, sha256 in index.items() if key in referenced_keys }
+		
+		for entry in os.scandir(JAR_STORE_DIR):
+			if entry.name in (os.path.basename(JAR_INDEX_FILE), os.path.basename(JAR_INDEX_LOCK_FILE)):
+				continue
+			
+			entry_stat: os.stat_result = entry.stat()
+			
+			# downloads of other processes are not in the index yet
+			downloading: bool = entry.name.endswith((".download", ".download.part"))
+			if downloading and now - entry_stat.st_mtime < DOWNLOAD_GRACE_PERIOD:
+				continue
+			
+			if (entry.name.endswith(".jar") and (
+				entry.name.removesuffix(".jar") in referenced_hashes
+				or (entry_stat.st_dev, entry_stat.st_ino) in referenced_inodes
+			)):
+				continue
+			
+			print(f"{'Would remove' if args().dry_run else 'Removing'} {entry.name}")
+			freed += entry_stat.st_size
+			
+			if not args().dry_run:
+				os.remove(entry.path)
+		
+		if not args().dry_run:
+			for key in [key for key, sha256 in index.items() if not os.path.exists(_jar_file(sha256))]:
+				del index[key]
+	
+	print(f"{Fore.GREEN}{'Would free' if args().dry_run else 'Freed'} {freed / MIB:.1f} MiB{Style.RESET_ALL}")
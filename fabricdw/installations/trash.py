@@ -0,0 +1,194 @@
+from __future__ import annotations
+
+import fcntl
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Iterator
+
+from colorama import Fore, Style
+
+from fabricdw.args import args
+from fabricdw.common import CACHE_DIR, CONFIG, Installation
+from fabricdw.common.files import remove_tree
+from fabricdw.installations.affinity import rebalance
+
+# next to the installations, renaming into it never crosses filesystems
+TRASH_DIR_NAME: str = ".fabricdw-trash"
+TRASH_INDEX_FILE: str = f"{CACHE_DIR}/trash.json"
+TRASH_INDEX_LOCK_FILE: str = f"{CACHE_DIR}/trash.lock"
+
+
+@contextmanager
+def _locked_index() -> Iterator[list[dict[str, Any]]]:
+	"""The deleted installations, locked against other processes. Changes to the yielded list are written back."""
+	os.makedirs(CACHE_DIR, exist_ok=True)
+	
+	with open(TRASH_INDEX_LOCK_FILE, "w") as lock:
+		fcntl.flock(lock, fcntl.LOCK_EX)
+		
+		try:
+			with open(TRASH_INDEX_FILE, "r") as index_file:
+				index: list[dict[str, Any]] = json.load(index_file)
+		except (OSError, ValueError):
+			index = []
+		
+		original: list[dict[str, Any]] = [entry.copy() for entry in index]
+		
+		yield index
+		
+		if index != original:
+			temporary_file: str = f"{TRASH_INDEX_FILE}.{os.getpid()}.tmp"
+			with open(temporary_file, "w") as index_file:
+				json.dump(index, index_file, indent=4)
+			os.replace(temporary_file, TRASH_INDEX_FILE)
+
+
+def move_to_trash(installation: Installation, retention: float) -> bool:
+	"""Rename the installation into the trash next to it, which takes no time regardless of its size
+
+	:param retention: hours, in which the installation can be restored
+
+	:returns: False if the trash is on another filesystem, the installation must be removed directly"""
+	trash_dir: str = f"{os.path.dirname(installation.root)}/{TRASH_DIR_NAME}"
+	deleted: float = time.time()
+	trashed_root: str = f"{trash_dir}/{installation.name}.{int(deleted * 1000)}"
+	
+	try:
+		os.makedirs(trash_dir, exist_ok=True)
+		
+		# a mount point cannot be renamed
+		if os.stat(trash_dir).st_dev != os.stat(installation.root).st_dev:
+			return False
+		
+		os.rename(installation.root, trashed_root)
+	except OSError:
+		return False
+	
+	with _locked_index() as index:
+		index.append(
+			{
+				"path": trashed_root,
+				"installation": installation.to_dict(),
+				"deleted": deleted,
+				"expires": deleted + retention * 3600,
+				"purging": False
+			}
+		)
+	
+	return True
+
+
+def _claim(select_all: bool, name: str | None = None) -> list[dict[str, Any]]:
+	"""Mark the selected entries as being purged, so they are neither restored nor purged twice.
+	Selecting all entries also selects the ones of interrupted purges."""
+	now: float = time.time()
+	
+	with _locked_index() as index:
+		claimed: list[dict[str, Any]] = [
+			entry for entry in index
+			if (select_all or (not entry["purging"] and entry["expires"] <= now))
+			and (name is None or entry["installation"]["name"] == name)
+		]
+		
+		for entry in claimed:
+			entry["purging"] = True
+	
+	return claimed
+
+
+def _purge(entries: list[dict[str, Any]]) -> None:
+	for entry in entries:
+		remove_tree(entry["path"])
+		
+		with _locked_index() as index:
+			index[:] = [other for other in index if other["path"] != entry["path"]]
+
+
+def purge_in_background() -> None:
+	"""Remove the expired installations of the trash in a detached process, the command returns immediately.
+	Processes with several threads (the API, the daemon) cannot fork safely, they purge in a thread instead."""
+	if threading.active_count() > 1:
+		threading.Thread(target=lambda: _purge(_claim(select_all=False)), name="purge").start()
+		return
+	
+	if (pid := os.fork()) != 0:
+		# the intermediate process exits at once, the worker is adopted by init
+		os.waitpid(pid, 0)
+		return
+	
+	try:
+		os.setsid()
+		
+		if os.fork() != 0:
+			os._exit(0)
+		
+		devnull: int = os.open(os.devnull, os.O_RDWR)
+		for stream in (0, 1, 2):
+			os.dup2(devnull, stream)
+		
+		_purge(_claim(select_all=False))
+	finally:
+		# never return into the command, which would write the config
+		os._exit(0)
+
+
+def purge_trash() -> None:
+	"""The 'purge' command"""
+	now: float = time.time()
+	
+	if args().dry_run:
+		with _locked_index() as index:
+			for entry in index:
+				state: str = "being removed" if entry["purging"] else (
+					"expired" if entry["expires"] <= now else f"expires in {(entry['expires'] - now) / 3600:.1f}h"
+				)
+				print(f"{Installation.pretty_name_str(entry['installation']['name'])} ({entry['path']}): {state}")
+		return
+	
+	entries: list[dict[str, Any]] = _claim(args().all or args().name is not None, args().name)
+	
+	if len(entries) == 0:
+		print("Nothing to purge")
+		return
+	
+	start: float = time.perf_counter()
+	
+	for entry in entries:
+		print(f"Removing {Installation.pretty_name_str(entry['installation']['name'])} ({entry['path']})")
+		_purge([entry])
+	
+	print(f"{Fore.GREEN}Purged {len(entries)} installations in {time.perf_counter() - start:.1f}s{Style.RESET_ALL}")
+
+
+def restore_installation() -> None:
+	"""The 'restore' command, restores the most recently deleted installation of the name"""
+	Installation.ensure_does_not_exist(args().name)
+	
+	with _locked_index() as index:
+		entries: list[dict[str, Any]] = [
+			entry for entry in index if entry["installation"]["name"] == args().name and not entry["purging"]
+		]
+		
+		if len(entries) == 0:
+			print(f"{Fore.RED}There is no deleted installation '{args().name}' to restore{Style.RESET_ALL}")
+			return
+		
+		entry: dict[str, Any] = max(entries, key=lambda e: e["deleted"])
+		installation: Installation = Installation.from_dict(entry["installation"])
+		
+		if os.path.exists(installation.root):
+			print(f"{Fore.RED}Cannot restore, '{installation.root}' exists again{Style.RESET_ALL}")
+			return
+		
+		os.rename(entry["path"], installation.root)
+		index.remove(entry)
+	
+	CONFIG.add_installation(installation)
+	
+	print(f"Restored {installation}")
+	
+	if installation.affinity is not None:
+		rebalance()
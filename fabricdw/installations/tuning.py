@@ -0,0 +1,164 @@
+from __future__ import annotations
+
+import os
+import re
+import threading
+from enum import StrEnum
+
+from colorama import Fore, Style
+
+from fabricdw.args import args
+from fabricdw.common import CONFIG
+from fabricdw.installations.script import read_fabricdw_script
+
+# estimated memory of a server outside the heap: metaspace, code cache, thread stacks, and direct buffers
+OFF_HEAP_BASE_MIB: int = 384
+OFF_HEAP_FACTOR: float = 0.1
+# warn if the servers are planned to use more than this share of the memory of the host
+MEMORY_WARN_FRACTION: float = 0.8
+# heaps above this get the Aikar flags for large heaps
+LARGE_HEAP_MIB: int = 12 * 1024
+
+_AIKAR_FLAGS: list[str] = [
+	"-XX:+UseG1GC", "-XX:+ParallelRefProcEnabled", "-XX:MaxGCPauseMillis=200", "-XX:+UnlockExperimentalVMOptions",
+	"-XX:+DisableExplicitGC", "-XX:+AlwaysPreTouch", "-XX:G1HeapWastePercent=5", "-XX:G1MixedGCCountTarget=4",
+	"-XX:G1MixedGCLiveThresholdPercent=90", "-XX:G1RSetUpdatingPauseTimePercent=5", "-XX:SurvivorRatio=32",
+	"-XX:+PerfDisableSharedMem", "-XX:MaxTenuringThreshold=1"
+]
+_AIKAR_HEAP_FLAGS: list[str] = [
+	"-XX:G1NewSizePercent=30", "-XX:G1MaxNewSizePercent=40", "-XX:G1HeapRegionSize=8M", "-XX:G1ReservePercent=20",
+	"-XX:InitiatingHeapOccupancyPercent=15"
+]
+_AIKAR_LARGE_HEAP_FLAGS: list[str] = [
+	"-XX:G1NewSizePercent=40", "-XX:G1MaxNewSizePercent=50", "-XX:G1HeapRegionSize=16M", "-XX:G1ReservePercent=15",
+	"-XX:InitiatingHeapOccupancyPercent=20"
+]
+_ZGC_FLAGS: list[str] = ["-XX:+UseZGC", "-XX:+ZGenerational", "-XX:+DisableExplicitGC", "-XX:+AlwaysPreTouch"]
+_LARGE_PAGE_FLAGS: list[str] = ["-XX:+UseLargePages", "-XX:+AlwaysPreTouch"]
+
+# heaps planned by this process, which may not be written yet
+_reserved_heaps: list[int] = []
+_reserve_lock: threading.Lock = threading.Lock()
+
+
+class TuningProfile(StrEnum):
+	NONE = "none"
+	# G1 with the flags of Aikar
+	AIKAR = "aikar"
+	# generational ZGC, requires Java 21
+	ZGC = "zgc"
+
+
+class ResourceBudgetError(Exception):
+	def __init__(self, planned_mib: int, available_mib: int):
+		super().__init__(
+			f"{Fore.RED}The servers would need {planned_mib} MiB, but the host only has {available_mib} MiB! "
+			f"Use '--overcommit' to ignore this.{Style.RESET_ALL}"
+		)
+
+
+def tuning_flags(profile: str, max_ram_mib: int, large_pages: bool = False, gc_threads: int | None = None) -> list[str]:
+	"""The JVM flags of the profile
+	
+	:param profile: the name of the profile
+	:param max_ram_mib: the maximum heap of the server
+	:param large_pages: back the heap by large pages
+	:param gc_threads: the amount of parallel GC threads, None for the JVM default"""
+	flags: list[str] = []
+	
+	match profile:
+		case TuningProfile.AIKAR:
+			flags += _AIKAR_FLAGS + (_AIKAR_LARGE_HEAP_FLAGS if max_ram_mib > LARGE_HEAP_MIB else _AIKAR_HEAP_FLAGS)
+		case TuningProfile.ZGC:
+			flags += _ZGC_FLAGS
+	
+	if large_pages:
+		flags += [flag for flag in _LARGE_PAGE_FLAGS if flag not in flags]
+	
+	if gc_threads is not None:
+		flags += [f"-XX:ParallelGCThreads={gc_threads}", f"-XX:ConcGCThreads={max(1, gc_threads // 4)}"]
+	
+	return flags
+
+
+def host_memory_mib() -> int:
+	return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") // (1024 * 1024)
+
+
+def host_cores() -> int:
+	"""The cores this process may run on"""
+	return len(os.sched_getaffinity(0))
+
+
+def heap_of(installation_directory: str) -> int | None:
+	"""The maximum heap in MiB of the server, None if it is unknown"""
+	try:
+		command: str = read_fabricdw_script(installation_directory)["SERVER_START_CMD"]
+	except (OSError, KeyError):
+		return None
+	
+	return memory_option(command, "-Xmx")
+
+
+def memory_option(command: str, option: str) -> int | None:
+	"""The value in MiB of a memory option like '-Xmx6G' of the launch command, None if it is not given"""
+	if (match := re.search(rf"{option}(\d+)([kKmMgG]?)(\s|$)", command)) is None:
+		return None
+	
+	value: int = int(match.group(1))
+	
+	match match.group(2).lower():
+		case "k":
+			return value // 1024
+		case "m":
+			return value
+		case "g":
+			return value * 1024
+		case _:
+			return value // (1024 * 1024)
+
+
+def estimate_footprint(heap_mib: int) -> int:
+	"""The estimated memory in MiB a server with this heap uses"""
+	return heap_mib + OFF_HEAP_BASE_MIB + int(heap_mib * OFF_HEAP_FACTOR)
+
+
+def plan_resources(heap_mib: int, suggest_gc_threads: bool = False) -> None:
+	"""Check, whether the host can run another server with this heap next to all installations.
+	Warns if the memory gets tight and refuses if it is not enough, unless '--overcommit' is given.
+	
+	:param heap_mib: the maximum heap of the new server
+	:param suggest_gc_threads: suggest GC thread counts, so the servers do not compete for cores"""
+	heaps: list[int] = [
+		heap for installation in CONFIG.installations if (heap := heap_of(installation.root)) is not None
+	]
+	
+	with _reserve_lock:
+		heaps += _reserved_heaps + [heap_mib]
+		
+		planned: int = sum(estimate_footprint(heap) for heap in heaps)
+		available: int = host_memory_mib()
+		
+		if planned > available and not args().overcommit:
+			raise ResourceBudgetError(planned, available)
+		
+		_reserved_heaps.append(heap_mib)
+	
+	if planned > available * MEMORY_WARN_FRACTION:
+		print(
+			f"{Fore.YELLOW}{len(heaps)} servers would need {planned} MiB of {available} MiB memory "
+			f"({planned / available:.0%}){Style.RESET_ALL}"
+		)
+	
+	if suggest_gc_threads and len(heaps) > 1:
+		cores: int = host_cores()
+		print(
+			f"{len(heaps)} servers share {cores} cores, consider '--gc-threads {max(1, cores // len(heaps))}' "
+			f"for every server"
+		)
+
+
+def release_resources(heap_mib: int) -> None:
+	"""Forget the heap reserved by 'plan_resources', once the server is part of the config or was not created"""
+	with _reserve_lock:
+		_reserved_heaps.remove(heap_mib)
@@ -1,30 +1,183 @@
+from __future__ import annotations
+
 import os
+from concurrent.futures import ThreadPoolExecutor
+from fnmatch import fnmatch
+
+from colorama import Fore, Style
+
+from fabricdw.args import args, bind_args
+from fabricdw.common import (CONFIG, FABRICD_ENV_FILE, Installation, InvalidCombinationException, SERVER_JAR_FILE,
+	VersionChoice, Versions)
+from fabricdw.installations.cds import refresh_shared_archive
+from fabricdw.installations.fabric import evaluate_versions, fetch_server_jar
+from fabricdw.installations.registry import register_installations
+from fabricdw.installations.script import get_shared_archive
+from fabricdw.installations.store import deploy_jar
 
-from fabricdw.args import args
-from fabricdw.common import (Installation, SERVER_JAR_FILE)
-from fabricdw.installations.fabric import select_and_download_version
 
+class UpdateResult:
+	def __init__(self, installation: Installation, old_versions: Versions | None, error: Exception | None = None):
+		self.installation = installation
+		self.old_versions = old_versions
+		self.error = error
+		# problems, which did not fail the update
+		self.warning: str | None = None
 
-def update_installation() -> None:
-	installation: Installation = Installation.ensure_exists(args().name)
-	args().output_dir = installation.root
+
+def select_installations() -> list[Installation]:
+	"""The installations selected by name, '--all', '--filter', and '--from-game-version'"""
+	if args().name is not None:
+		return [Installation.ensure_exists(args().name)]
 	
-	server_jar: str = f"{installation.root}/{SERVER_JAR_FILE}"
+	installations: list[Installation] = CONFIG.installations.copy()
+	
+	if args().filter is not None:
+		installations = [i for i in installations if fnmatch(i.name, args().filter)]
+	
+	if args().from_game_version is not None:
+		installations = [
+			i for i in installations if i.versions is not None and i.versions.game == args().from_game_version
+		]
+	
+	return installations
+
+
+def resolve_versions(installations: list[Installation], versions: Versions) -> dict[str, Versions]:
+	"""Replace a kept game version with the game version of each installation
+	
+	:returns: the versions of each installation by name"""
+	if versions.game != VersionChoice.KEEP:
+		return { installation.name: versions for installation in installations }
 	
+	resolved: dict[str, Versions] = { }
+	
+	for installation in installations:
+		if installation.versions is None:
+			print(
+				f"{Fore.YELLOW}Skipping {installation.pretty_name(Fore.YELLOW)}, its game version is unknown"
+				f"{Style.RESET_ALL}"
+			)
+			continue
+		
+		resolved[installation.name] = versions._replace(game=installation.versions.game)
+	
+	return resolved
+
+
+def swap_server_jar(installation: Installation, versions: Versions, jar_file: str) -> UpdateResult:
+	"""Replace the server jar of the installation, roll back to the previous jar on failure"""
+	server_jar: str = f"{installation.root}/{SERVER_JAR_FILE}"
 	server_jar_backup: str = f"{server_jar}-bak"
+	result: UpdateResult = UpdateResult(installation, installation.versions)
 	
 	try:
-		os.replace(server_jar, server_jar_backup)
-		
-		select_and_download_version()
+		# the jar is replaced atomically, so the working jar stays in place until then
+		if os.path.exists(server_jar_backup):
+			os.remove(server_jar_backup)
+		if os.path.exists(server_jar):
+			os.link(server_jar, server_jar_backup)
 		
-		print(f"Updated installation {installation}")
+		deploy_jar(jar_file, installation.root, print_message=False)
+		installation.versions = versions
 		
-		if args().keep_backups:
-			print("Keeping server backup")
-		else:
+		if not args().keep_backups and os.path.exists(server_jar_backup):
 			os.remove(server_jar_backup)
-			print("Deleted server backup")
 	except Exception as err:
-		print(f"An error occurred ({err})! Undoing update...")
-		os.replace(server_jar_backup, server_jar)
+		result.error = err
+		
+		if os.path.exists(server_jar_backup):
+			os.replace(server_jar_backup, server_jar)
+	
+	# an archive of the previous jar would be stale
+	if result.error is None and os.path.exists(f"{installation.root}/{FABRICD_ENV_FILE}"):
+		try:
+			if args().cds or get_shared_archive(installation.root) is not None:
+				refresh_shared_archive(installation.root)
+		except Exception as err:
+			result.warning = f"no class data sharing archive ({err})"
+	
+	return result
+
+
+def print_summary(results: list[UpdateResult]) -> None:
+	rows: list[tuple[str, str, str, str]] = [("Installation", "Old version", "New version", "Result")]
+	
+	for result in results:
+		rows.append(
+			(
+				result.installation.name,
+				str(result.old_versions) if result.old_versions else "unknown",
+				str(result.installation.versions) if result.error is None else "-",
+				("OK" if result.warning is None else f"OK ({result.warning})") if result.error is None
+				else f"FAIL ({result.error})"
+			)
+		)
+	
+	widths: list[int] = [max(len(row[column]) for row in rows) for column in range(3)]
+	
+	print()
+	for row in rows:
+		color: str = Fore.RED if row[3].startswith("FAIL") else (Fore.YELLOW if row[3].startswith("OK (") else "")
+		print(f"{color}{'  '.join(cell.ljust(width) for cell, width in zip(row, widths))}  {row[3]}{Style.RESET_ALL}")
+
+
+def update_installation() -> list[UpdateResult]:
+	"""The 'update' command
+	
+	:returns: the result of each selected installation"""
+	if args().name is None and not args().all and args().filter is None and args().from_game_version is None:
+		print("Either give the name of an installation, '--all', '--filter', or '--from-game-version'")
+		return []
+	
+	if args().name is not None and (args().all or args().filter is not None or args().from_game_version is not None):
+		raise InvalidCombinationException(
+			"Give either the name of an installation, or '--all', '--filter', and '--from-game-version'", "options"
+		)
+	
+	installations: list[Installation] = select_installations()
+	
+	if len(installations) == 0:
+		print("No installations to update")
+		return []
+	
+	resolved: dict[str, Versions] = resolve_versions(installations, evaluate_versions())
+	
+	# every distinct jar is fetched only once
+	jar_files: dict[Versions, str] = { }
+	for versions in set(resolved.values()):
+		try:
+			jar_files[versions] = fetch_server_jar(versions)
+		except Exception as err:
+			print(f"{Fore.RED}Could not get the server jar for {versions} ({err}){Style.RESET_ALL}")
+	
+	with ThreadPoolExecutor(max_workers=args().jobs) as executor:
+		results: list[UpdateResult] = list(
+			executor.map(
+				bind_args(lambda i: swap_server_jar(i, resolved[i.name], jar_files[resolved[i.name]])),
+				[i for i in installations if i.name in resolved and resolved[i.name] in jar_files]
+			)
+		)
+	
+	register_installations([result.installation for result in results if result.error is None])
+	
+	results += [
+		UpdateResult(i, i.versions, error=Exception("no server jar"))
+		for i in installations if i.name in resolved and resolved[i.name] not in jar_files
+	]
+	
+	if len(results) == 1:
+		result: UpdateResult = results[0]
+		
+		if result.error is None:
+			print(f"Updated installation {result.installation}")
+			print("Keeping server backup" if args().keep_backups else "Deleted server backup")
+			
+			if result.warning is not None:
+				print(f"{Fore.YELLOW}Warning: {result.warning}{Style.RESET_ALL}")
+		else:
+			print(f"An error occurred ({result.error})! Undid update...")
+	else:
+		print_summary(results)
+	
+	return results
@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+
+from fabricdw.common import CACHE_DIR
+
+USAGE_CACHE_FILE: str = f"{CACHE_DIR}/usage.json"
+USAGE_JOBS: int = 16
+# files growing in place do not change the modification time of their directory
+USAGE_MAX_AGE: int = 60 * 60
+
+_cache_lock: threading.Lock = threading.Lock()
+
+
+def _read_cache() -> dict[str, dict]:
+	try:
+		with open(USAGE_CACHE_FILE, "r") as cache_file:
+			return json.load(cache_file)
+	except (OSError, ValueError):
+		return { }
+
+
+def _write_cache(cache: dict[str, dict]) -> None:
+	os.makedirs(CACHE_DIR, exist_ok=True)
+	
+	temporary_file: str = f"{USAGE_CACHE_FILE}.{os.getpid()}.{threading.get_ident()}.tmp"
+	with open(temporary_file, "w") as cache_file:
+		json.dump(cache, cache_file)
+	
+	os.replace(temporary_file, USAGE_CACHE_FILE)
+
+
+def _scan(directory: str, cache: dict[str, dict], now: float) -> tuple[int, list[str]]:
+	"""The size of the files directly in the directory, and its subdirectories.
+	Directories, whose modification time did not change, are not read again."""
+	try:
+		mtime: int = os.stat(directory).st_mtime_ns
+	except OSError:
+		return 0, []
+	
+	entry: dict | None = cache.get(directory)
+	
+	if entry is not None and entry["mtime"] == mtime and now - entry["scanned"] < USAGE_MAX_AGE:
+		return entry["size"], [os.path.join(directory, name) for name in entry["directories"]]
+	
+	size: int = 0
+	directories: list[str] = []
+	
+	try:
+		with os.scandir(directory) as entries:
+			for dir_entry in entries:
+				try:
+					if dir_entry.is_dir(follow_symlinks=False):
+						directories.append(dir_entry.name)
+					else:
+						size += dir_entry.stat(follow_symlinks=False).st_size
+				except OSError:
+					continue
+	except OSError:
+		return 0, []
+	
+	cache[directory] = { "mtime": mtime, "scanned": now, "size": size, "directories": directories }
+	
+	return size, [os.path.join(directory, name) for name in directories]
+
+
+def disk_usage(directories: list[str], jobs: int = USAGE_JOBS) -> dict[str, int]:
+	"""The size in bytes of each directory, scanning all of them in parallel
+
+	:returns: the size of each directory"""
+	with _cache_lock:
+		cache: dict[str, dict] = _read_cache()
+		now: float = time.time()
+		sizes: dict[str, int] = { directory: 0 for directory in directories }
+		visited: set[str] = set()
+		
+		with ThreadPoolExecutor(max_workers=jobs) as executor:
+			pending: dict[Future[tuple[int, list[str]]], str] = {
+				executor.submit(_scan, directory, cache, now): directory for directory in directories
+			}
+			
+			while pending:
+				done, _ = wait(pending, return_when=FIRST_COMPLETED)
+				
+				for future in done:
+					top: str = pending.pop(future)
+					size, subdirectories = future.result()
+					sizes[top] += size
+					
+					for subdirectory in subdirectories:
+						visited.add(subdirectory)
+						pending[executor.submit(_scan, subdirectory, cache, now)] = top
+		
+		visited.update(directories)
+		
+		# directories, which no longer exist, are forgotten. Parents are sorted before their subdirectories
+		removed: set[str] = set()
+		for directory in sorted(cache):
+			parent: str = os.path.dirname(directory)
+			
+			if directory not in visited and (parent in visited or parent in removed):
+				removed.add(directory)
+				del cache[directory]
+		
+		_write_cache(cache)
+	
+	return sizes
@@ -1,5 +1,6 @@
 from fabricdw.args import args
-from fabricdw.properties.modify import create_replacements, modify_properties
+from fabricdw.properties.document import PropertiesDocument
+from fabricdw.properties.modify import create_replacements, modify_properties, parse_assignments, read_properties
 
 
 def get_property(property_name: str, fallback: str = None) -> str | None:
@@ -0,0 +1,292 @@
+from __future__ import annotations
+
+import os
+import re
+import threading
+
+# natural lines end with '\r\n', '\r', or '\n', the last one may have no terminator
+NATURAL_LINE: re.Pattern = re.compile(r"[^\r\n]*(?:\r\n|\r|\n)|[^\r\n]+$")
+WHITESPACE: str = " \t\f"
+SEPARATORS: str = "=:"
+COMMENTS: str = "#!"
+ESCAPES: dict[str, str] = { "t": "\t", "n": "\n", "r": "\r", "f": "\f" }
+
+
+def _unescape(text: str) -> str:
+	"""Resolve the escapes of a key or value, like java.util.Properties.load
+
+	:raises ValueError: if a unicode escape is malformed"""
+	if "\\" not in text:
+		return text
+	
+	result: list[str] = []
+	index: int = 0
+	
+	while index < len(text):
+		character: str = text[index]
+		index += 1
+		
+		if character != "\\" or index == len(text):
+			result.append(character)
+			continue
+		
+		character = text[index]
+		index += 1
+		
+		if character == "u":
+			digits: str = text[index:index + 4]
+			
+			if len(digits) != 4 or any(digit not in "0123456789abcdefABCDEF" for digit in digits):
+				raise ValueError(f"Malformed \\uxxxx escape: '\\u{digits}'")
+			
+			result.append(chr(int(digits, 16)))
+			index += 4
+		else:
+			result.append(ESCAPES.get(character, character))
+	
+	unescaped: str = "".join(result)
+	
+	# characters above U+FFFF are escaped as two UTF-16 surrogates
+	if re.search("[\ud800-\udfff]", unescaped):
+		try:
+			return unescaped.encode("utf-16", "surrogatepass").decode("utf-16")
+		except UnicodeDecodeError:
+			return unescaped
+	
+	return unescaped
+
+
+def escape(text: str, is_key: bool = False) -> str:
+	"""Escape a key or value, like java.util.Properties.store. Only ASCII is written, so the file can be read as
+	ISO-8859-1 (Properties.load) and as UTF-8 (newer servers)"""
+	result: list[str] = []
+	
+	for index, character in enumerate(text):
+		if character == " ":
+			result.append("\\ " if index == 0 or is_key else " ")
+		elif character in "\t\n\r\f":
+			result.append("\\" + next(name for name, value in ESCAPES.items() if value == character))
+		elif character in SEPARATORS or character in COMMENTS or character == "\\":
+			result.append("\\" + character)
+		elif 0x20 <= ord(character) <= 0x7e:
+			result.append(character)
+		else:
+			encoded: bytes = character.encode("utf-16-be")
+			result.extend(f"\\u{encoded[i:i + 2].hex().upper()}" for i in range(0, len(encoded), 2))
+	
+	return "".join(result)
+
+
+def _ends_with_escape(line: str) -> bool:
+	"""Whether the line ends with an odd number of backslashes, which continue it on the next line"""
+	return (len(line) - len(line.rstrip("\\"))) % 2 == 1
+
+
+def _split_terminator(line: str) -> tuple[str, str]:
+	content: str = line.rstrip("\r\n")
+	
+	return content, line[len(content):]
+
+
+class _Entry:
+	"""A logical line: a key and value, a comment, or a blank line. The raw text is written back unless changed"""
+	
+	def __init__(self, raw: str, key: str | None = None, value: str | None = None, prefix: str = ""):
+		self.raw: str = raw
+		self.key: str | None = key
+		self.value: str | None = value
+		# the raw text in front of the value: the indentation, key, and separator
+		self.prefix: str = prefix
+
+
+def _parse_entry(lines: list[str]) -> _Entry:
+	"""The entry of a key and value, whose logical line consists of the natural lines"""
+	logical: str = ""
+	
+	for number, line in enumerate(lines):
+		content, _ = _split_terminator(line)
+		
+		if number > 0:
+			content = content.lstrip(WHITESPACE)
+		
+		logical += content[:-1] if _ends_with_escape(content) else content
+	
+	indentation: int = len(logical) - len(logical.lstrip(WHITESPACE))
+	line: str = logical[indentation:]
+	
+	key_end: int = 0
+	value_start: int = len(line)
+	has_separator: bool = False
+	preceding_backslash: bool = False
+	
+	while key_end < len(line):
+		character: str = line[key_end]
+		
+		if character in SEPARATORS and not preceding_backslash:
+			value_start = key_end + 1
+			has_separator = True
+			break
+		elif character in WHITESPACE and not preceding_backslash:
+			value_start = key_end + 1
+			break
+		
+		preceding_backslash = not preceding_backslash if character == "\\" else False
+		key_end += 1
+	
+	while value_start < len(line):
+		character = line[value_start]
+		
+		if character not in WHITESPACE:
+			if has_separator or character not in SEPARATORS:
+				break
+			
+			has_separator = True
+		
+		value_start += 1
+	
+	prefix: str = logical[:indentation + value_start]
+	
+	# a key without a value needs a separator, once it gets one
+	if value_start == key_end:
+		prefix += "="
+	
+	return _Entry("".join(lines), _unescape(line[:key_end]), _unescape(line[value_start:]), prefix)
+
+
+class PropertiesDocument:
+	"""A .properties file as specified by java.util.Properties: '=', ':', or whitespace separate keys and values,
+	'#' and '!' start comments, backslashes escape characters and continue lines. Later keys replace earlier ones.
+	Lines, which are not changed, keep their formatting."""
+	
+	def __init__(self, text: str = "", encoding: str = "utf-8"):
+		"""
+		:param encoding: the encoding of the file, the document is written back in
+
+		:raises ValueError: if a unicode escape is malformed"""
+		self.original: str = text
+		self.encoding: str = encoding
+		self.entries: list[_Entry] = []
+		
+		terminators: list[str] = re.findall(r"\r\n|\r|\n", text)
+		self.newline: str = terminators[0] if len(terminators) > 0 else "\n"
+		
+		lines: list[str] = NATURAL_LINE.findall(text)
+		index: int = 0
+		
+		while index < len(lines):
+			content, _ = _split_terminator(lines[index])
+			stripped: str = content.lstrip(WHITESPACE)
+			
+			# comments are never continued
+			if stripped == "" or stripped[0] in COMMENTS:
+				self.entries.append(_Entry(lines[index]))
+				index += 1
+				continue
+			
+			end: int = index + 1
+			while end < len(lines) and _ends_with_escape(_split_terminator(lines[end - 1])[0]):
+				end += 1
+			
+			self.entries.append(_parse_entry(lines[index:end]))
+			index = end
+	
+	@classmethod
+	def load(cls, file: str) -> PropertiesDocument:
+		"""Read the file as UTF-8, or as ISO-8859-1 if it is not valid UTF-8, like the server does
+
+		:raises OSError: if the file cannot be read
+		:raises ValueError: if a unicode escape is malformed"""
+		with open(file, "rb") as properties_file:
+			data: bytes = properties_file.read()
+		
+		try:
+			return cls(data.decode("utf-8"), "utf-8")
+		except UnicodeDecodeError:
+			return cls(data.decode("iso-8859-1"), "iso-8859-1")
+	
+	def _last(self, key: str) -> _Entry | None:
+		return next((entry for entry in reversed(self.entries) if entry.key == key), None)
+	
+	def get(self, key: str, fallback: str | None = None) -> str | None:
+		entry: _Entry | None = self._last(key)
+		
+		return entry.value if entry is not None else fallback
+	
+	def to_dict(self) -> dict[str, str]:
+		return { entry.key: entry.value for entry in self.entries if entry.key is not None }
+	
+	def set(self, key: str, value: str) -> bool:
+		"""Change the value of the key, or append the key if it does not exist
+
+		:returns: whether the value changed"""
+		entry: _Entry | None = self._last(key)
+		
+		if entry is None:
+			# the file may not end with a line break. A backslash at its end is ignored, but would continue the line
+			if len(self.entries) > 0 and _split_terminator(last := self.entries[-1].raw)[1] == "":
+				self.entries[-1].raw = (last[:-1] if _ends_with_escape(last) else last) + self.newline
+			
+			prefix: str = f"{escape(key, True)}="
+			self.entries.append(_Entry(f"{prefix}{escape(value)}{self.newline}", key, value, prefix))
+			return True
+		
+		if entry.value == value:
+			return False
+		
+		terminator: str = _split_terminator(entry.raw)[1]
+		
+		entry.value = value
+		entry.raw = f"{entry.prefix}{escape(value)}{terminator}"
+		return True
+	
+	def unset(self, key: str) -> bool:
+		"""Remove every line of the key
+
+		:returns: whether the key existed"""
+		count: int = len(self.entries)
+		self.entries = [entry for entry in self.entries if entry.key != key]
+		
+		return len(self.entries) != count
+	
+	def render(self) -> str:
+		return "".join(entry.raw for entry in self.entries)
+	
+	@property
+	def changed(self) -> bool:
+		return self.render() != self.original
+	
+	def save(self, file: str) -> bool:
+		"""Replace the file atomically, if the document changed. The owner and mode of the file are kept, the server
+		may run as another user.
+
+		:returns: whether the file was written"""
+		if not self.changed:
+			return False
+		
+		text: str = self.render()
+		temporary_file: str = f"{file}.{os.getpid()}.{threading.get_ident()}.tmp"
+		
+		try:
+			with open(temporary_file, "wb") as properties_file:
+				properties_file.write(text.encode(self.encoding))
+				
+				if os.path.exists(file):
+					file_stat: os.stat_result = os.stat(file)
+					os.fchmod(properties_file.fileno(), file_stat.st_mode & 0o7777)
+					
+					try:
+						os.fchown(properties_file.fileno(), file_stat.st_uid, file_stat.st_gid)
+					except PermissionError:
+						pass
+				
+				properties_file.flush()
+				os.fsync(properties_file.fileno())
+			
+			os.replace(temporary_file, file)
+		except BaseException:
+			if os.path.exists(temporary_file):
+				os.remove(temporary_file)
+			raise
+		
+		self.original = text
+		return True
@@ -0,0 +1,235 @@
+from __future__ import annotations
+
+import json
+import os
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from fnmatch import fnmatch
+
+from colorama import Fore, Style
+
+from fabricdw.args import args
+from fabricdw.common import CONFIG, FABRICD_ENV_FILE, Installation, SERVER_PROPERTIES_FILE
+from fabricdw.common.properties import Defaults, Properties
+from fabricdw.properties.document import PropertiesDocument
+from fabricdw.properties.index import load_fleet_properties
+from fabricdw.properties.modify import parse_assignments, read_properties
+
+# the files are small, the time is spent waiting for the filesystem
+PROPERTIES_JOBS: int = 16
+
+
+class EditResult:
+	def __init__(
+		self, installation: Installation, changes: dict[str, tuple[str | None, str | None]],
+		error: Exception | None = None
+	):
+		self.installation = installation
+		# the old and new value of each changed property, None if it is not set
+		self.changes = changes
+		self.error = error
+
+
+def select_installations() -> list[Installation]:
+	"""The installations selected by '--name', '--all', and '--filter'"""
+	if len(args().names) > 0:
+		return [Installation.ensure_exists(name) for name in args().names]
+	
+	if args().filter is not None:
+		return [i for i in CONFIG.installations if fnmatch(i.name, args().filter)]
+	
+	return CONFIG.installations.copy()
+
+
+def edit_installation_properties(
+	installation: Installation, changes: dict[str, str | None]
+) -> dict[str, tuple[str | None, str | None]]:
+	"""Change the server.properties of the installation, None removes a property. The file is only written, if a value
+	changed. A changed server port is also given to the wrapper.
+
+	:returns: the old and new value of each changed property"""
+	properties_file: str = f"{installation.root}/{SERVER_PROPERTIES_FILE}"
+	document: PropertiesDocument = PropertiesDocument.load(properties_file)
+	changed: dict[str, tuple[str | None, str | None]] = { }
+	
+	for key, value in changes.items():
+		old_value: str | None = document.get(key)
+		
+		if document.unset(key) if value is None else document.set(key, value):
+			changed[key] = (old_value, value)
+	
+	document.save(properties_file)
+	
+	if Properties.PORT_SERVER in changed and os.path.exists(f"{installation.root}/{FABRICD_ENV_FILE}"):
+		from fabricdw.installations.script import update_fabricdw_script
+		
+		port: str | None = changed[Properties.PORT_SERVER][1]
+		update_fabricdw_script(installation.root, { "GAME_PORT": port if port is not None else Defaults.PORT_SERVER })
+	
+	return changed
+
+
+def _edit(installation: Installation, changes: dict[str, str | None]) -> EditResult:
+	try:
+		return EditResult(installation, edit_installation_properties(installation, changes))
+	except (OSError, ValueError) as error:
+		return EditResult(installation, { }, error)
+
+
+def _format(value: str | None) -> str:
+	return f"'{value}'" if value is not None else "(not set)"
+
+
+def edit_properties(installations: list[Installation], changes: dict[str, str | None]) -> list[EditResult]:
+	"""Change the properties of all installations in parallel
+
+	:returns: the result of each installation"""
+	from fabricdw.installations.registry import register_installations
+	
+	with ThreadPoolExecutor(max_workers=args().jobs) as executor:
+		results: list[EditResult] = list(executor.map(lambda i: _edit(i, changes), installations))
+	
+	for result in results:
+		if result.error is not None:
+			print(f"{result.installation.pretty_name()}: {Fore.RED}{result.error}{Style.RESET_ALL}")
+		elif len(result.changes) == 0:
+			print(f"{result.installation.pretty_name()}: unchanged")
+		
+		for key, (old_value, new_value) in result.changes.items():
+			print(f"{result.installation.pretty_name()}: {key} {_format(old_value)} -> {_format(new_value)}")
+	
+	changed: list[Installation] = [result.installation for result in results if len(result.changes) > 0]
+	register_installations(changed)
+	
+	failed: int = len([result for result in results if result.error is not None])
+	color: str = Fore.GREEN if failed == 0 else Fore.YELLOW
+	print(
+		f"{color}Changed {len(changed)} of {len(results)} installations"
+		+ (f", {failed} failed" if failed > 0 else "") + Style.RESET_ALL
+	)
+	
+	return results
+
+
+def _read(installation: Installation) -> dict[str, str] | Exception:
+	try:
+		return read_properties(f"{installation.root}/{SERVER_PROPERTIES_FILE}")
+	except (OSError, ValueError) as error:
+		return error
+
+
+def get_properties(installations: list[Installation], keys: list[str]) -> None:
+	"""Print the properties of all installations"""
+	with ThreadPoolExecutor(max_workers=args().jobs) as executor:
+		fleet: list[dict[str, str] | Exception] = list(executor.map(_read, installations))
+	
+	for installation, properties in zip(installations, fleet):
+		# a single installation is printed like its file
+		prefix: str = f"{installation.pretty_name()}: " if len(installations) > 1 else ""
+		
+		if isinstance(properties, Exception):
+			print(f"{prefix}{Fore.RED}{properties}{Style.RESET_ALL}")
+			continue
+		
+		for key in keys:
+			if key in properties:
+				print(f"{prefix}{key}={properties[key]}")
+			else:
+				print(f"{prefix}{Fore.YELLOW}{key} is not set{Style.RESET_ALL}")
+
+
+def majority_values(fleet: dict[str, dict[str, str]], keys: list[str]) -> dict[str, str | None]:
+	"""The most common value of each key, None if most installations do not set it. Ties go to the first installation"""
+	return {
+		key: Counter(properties.get(key) for properties in fleet.values()).most_common(1)[0][0] if fleet else None
+		for key in keys
+	}
+
+
+def show_properties(installations: list[Installation], keys: list[str]) -> None:
+	"""Print the properties of all installations as a table or JSON. The properties come from the index, which only
+	parses files again, whose modification time or size changed. With '--diff' only installations with values other
+	than the majority are shown, the other values are highlighted."""
+	# installations without a readable server.properties are not in the index
+	indexed: dict[str, dict[str, str]] = load_fleet_properties()
+	fleet: dict[str, dict[str, str]] = { i.name: indexed[i.name] for i in installations if i.name in indexed }
+	unreadable: list[str] = [i.name for i in installations if i.name not in indexed]
+	
+	majority: dict[str, str | None] = majority_values(fleet, keys)
+	differing: dict[str, list[str]] = {
+		name: [key for key in keys if properties.get(key) != majority[key]] for name, properties in fleet.items()
+	}
+	names: list[str] = [name for name in fleet if not args().diff or len(differing[name]) > 0]
+	
+	if args().json:
+		print(
+			json.dumps(
+				{
+					"majority": majority,
+					"installations": [
+						{
+							"name": name,
+							"properties": { key: fleet[name].get(key) for key in keys },
+							"differs": differing[name]
+						}
+						for name in names
+					],
+					"unreadable": unreadable
+				},
+				indent=4
+			)
+		)
+		return
+	
+	table: list[tuple[str, ...]] = [("Name", *keys)] + [
+		(name, *(fleet[name].get(key, "-") for key in keys)) for name in names
+	]
+	if args().diff:
+		table.insert(1, ("(majority)", *(value if value is not None else "-" for value in majority.values())))
+	
+	widths: list[int] = [max(len(row[column]) for row in table) for column in range(len(table[0]))]
+	
+	for row in table:
+		cells: list[str] = [cell.ljust(width) for cell, width in zip(row, widths)]
+		
+		if args().diff and row[0] in differing:
+			highlighted: list[str] = differing[row[0]]
+			cells = [
+				f"{Fore.YELLOW}{cell}{Style.RESET_ALL}" if column > 0 and keys[column - 1] in highlighted else cell
+				for column, cell in enumerate(cells)
+			]
+		
+		print("  ".join(cells).rstrip())
+	
+	if args().diff:
+		print()
+		print(f"{len(names)} of {len(fleet)} installations differ from the majority")
+	
+	if len(unreadable) > 0:
+		print(f"{Fore.YELLOW}Without a readable server.properties: {', '.join(unreadable)}{Style.RESET_ALL}")
+
+
+def properties_command() -> None:
+	"""The 'properties' command"""
+	if len(args().names) == 0 and not args().all and args().filter is None:
+		print("Either give installations with '--name', '--all', or '--filter'")
+		return
+	
+	installations: list[Installation] = select_installations()
+	
+	if len(installations) == 0:
+		print("No installations selected")
+		return
+	
+	if args().action == "get":
+		get_properties(installations, args().keys)
+	elif args().action == "show":
+		show_properties(installations, args().keys)
+	elif args().action == "set":
+		if len(changes := parse_assignments(args().keys)) == 0:
+			print("Give the properties to set as 'key=value'")
+			return
+		
+		edit_properties(installations, changes)
+	elif args().action == "unset":
+		edit_properties(installations, { key: None for key in args().keys })
@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+import json
+import os
+import threading
+
+from fabricdw.common import CACHE_DIR, CONFIG, SERVER_PROPERTIES_FILE
+from fabricdw.common.files import read_json
+from fabricdw.properties.modify import read_properties
+
+PROPERTIES_INDEX_FILE: str = f"{CACHE_DIR}/properties.json"
+
+_index_lock: threading.Lock = threading.Lock()
+
+
+def _read_index() -> dict[str, dict]:
+	try:
+		return read_json(PROPERTIES_INDEX_FILE).copy()
+	except (OSError, ValueError):
+		return { }
+
+
+def _write_index(index: dict[str, dict]) -> None:
+	os.makedirs(CACHE_DIR, exist_ok=True)
+	
+	temporary_file: str = f"{PROPERTIES_INDEX_FILE}.{os.getpid()}.{threading.get_ident()}.tmp"
+	with open(temporary_file, "w") as index_file:
+		json.dump(index, index_file)
+	
+	os.replace(temporary_file, PROPERTIES_INDEX_FILE)
+
+
+def load_fleet_properties() -> dict[str, dict[str, str]]:
+	"""The properties of all installations by name.
+	Files are only parsed again, if their modification time or size changed since the last call.
+	
+	:returns: the properties of each installation with a server.properties file"""
+	with _index_lock:
+		index: dict[str, dict] = _read_index()
+		fleet: dict[str, dict[str, str]] = { }
+		files: set[str] = set()
+		changed: bool = False
+		
+		for installation in CONFIG.installations:
+			properties_file: str = f"{installation.root}/{SERVER_PROPERTIES_FILE}"
+			
+			try:
+				file_stat: os.stat_result = os.stat(properties_file)
+			except OSError:
+				continue
+			
+			files.add(properties_file)
+			entry: dict | None = index.get(properties_file)
+			
+			if entry is None or entry["mtime"] != file_stat.st_mtime_ns or entry["size"] != file_stat.st_size:
+				try:
+					properties: dict[str, str] = read_properties(properties_file)
+				except (OSError, ValueError):
+					continue
+				
+				entry = { "mtime": file_stat.st_mtime_ns, "size": file_stat.st_size, "properties": properties }
+				index[properties_file] = entry
+				changed = True
+			
+			fleet[installation.name] = entry["properties"]
+		
+		for properties_file in index.keys() - files:
+			del index[properties_file]
+			changed = True
+		
+		if changed:
+			_write_index(index)
+	
+	return fleet
@@ -4,48 +4,42 @@ from colorama import Fore, Style
 
 from fabricdw.args import args
 from fabricdw.common import SERVER_PROPERTIES_FILE
+from fabricdw.properties.document import PropertiesDocument
 
 
-def create_replacements(args: Namespace) -> dict[str, str]:
+def parse_assignments(assignments: list[str]) -> dict[str, str]:
+	"""Properties given as 'key=value', the value may contain '=' as well"""
 	replacements: dict[str, str] = { }
 	
-	for property_ in args.properties:
-		contents: list[str] = property_.split("=")
+	for property_ in assignments:
+		key, separator, value = property_.partition("=")
 		
-		if len(contents) != 2:
+		if separator == "" or key == "":
 			print(f"{Fore.YELLOW}Invalid property argument: '{property_}'!{Style.RESET_ALL}")
 			continue
 		
-		if contents[0] in replacements:
-			print(f"{Fore.YELLOW}Duplicate property: '{contents[0]}' (value: '{contents[1]}')!{Style.RESET_ALL}")
+		if key in replacements:
+			print(f"{Fore.YELLOW}Duplicate property: '{key}' (value: '{value}')!{Style.RESET_ALL}")
 			continue
 		
-		replacements[contents[0]] = contents[1]
+		replacements[key] = value
 	
 	return replacements
 
 
-def read_file(file: str) -> list[str]:
-	lines: list[str]
-	
-	with open(file, "r") as properties:
-		lines = [line.strip() for line in properties.readlines()]
-	
-	return lines
+def create_replacements(args: Namespace) -> dict[str, str]:
+	return parse_assignments(args.properties)
 
 
-def split_line(line: str) -> tuple[str, str] | tuple[None, None]:
-	line: str = line.strip()
-	
-	if "=" not in line or line.startswith("#"):
-		return None, None
-	
-	# repack list[str] to tuple[str, str]
-	key, value = line.split("=", maxsplit=1)
-	return key, value
+def read_properties(file: str) -> dict[str, str]:
+	"""
+	:raises OSError: if the file cannot be read
+	:raises ValueError: if the file contains a malformed escape"""
+	return PropertiesDocument.load(file).to_dict()
 
 
 def modify_properties(installation_directory: str = None, replacements: dict[str, str] = None) -> None:
+	"""Change the existing properties of server.properties. The file is only written, if a value changed"""
 	print("Modifying server.properties file...")
 	
 	if not installation_directory:
@@ -54,15 +48,11 @@ def modify_properties(installation_directory: str = None, replacements: dict[str
 		replacements = args().properties.copy()
 	
 	properties_file: str = f"{installation_directory}/{SERVER_PROPERTIES_FILE}"
-	lines: list[str] = read_file(properties_file)
+	document: PropertiesDocument = PropertiesDocument.load(properties_file)
 	
-	for index, line in enumerate(lines):
-		key, _ = split_line(line)
-		
-		if key is None or key not in replacements:
-			continue
-		
-		lines[index] = f"{key}={replacements.pop(key)}"
+	for key in list(replacements.keys()):
+		if document.get(key) is not None:
+			document.set(key, replacements.pop(key))
 	
 	if len(replacements) != 0:
 		print(f"{Fore.YELLOW}Some properties have not been used:")
@@ -70,5 +60,4 @@ def modify_properties(installation_directory: str = None, replacements: dict[str
 			print(f"\t{key} ({value})")
 		print(Style.RESET_ALL, end="")
 	
-	with open(properties_file, "w") as properties:
-		properties.writelines([f"{line}\n" for line in lines])
+	document.save(properties_file)
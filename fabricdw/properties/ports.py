@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+import socket
+import threading
+
+from colorama import Fore, Style
+
+from fabricdw.common.properties import Defaults, Properties
+from fabricdw.properties.index import load_fleet_properties
+
+PORT_PROPERTIES: list[Properties] = [Properties.PORT_SERVER, Properties.PORT_QUERY, Properties.PORT_RCON]
+MAX_PORT: int = 65535
+
+# ports handed out by this process, which may not be written yet. They are released, once their installation is in
+# the config or was not created
+_reserved_ports: set[int] = set()
+_reserve_lock: threading.Lock = threading.Lock()
+
+
+def used_ports(exclude: str | None = None) -> set[int]:
+	"""The ports configured by all installations
+	
+	:param exclude: the name of an installation, whose ports are ignored"""
+	ports: set[int] = set()
+	
+	for name, properties in load_fleet_properties().items():
+		if name == exclude:
+			continue
+		
+		for property_name in PORT_PROPERTIES:
+			if (value := properties.get(property_name, "")).isdigit():
+				ports.add(int(value))
+	
+	return ports
+
+
+def port_is_free(port: int) -> bool:
+	"""Whether the port is free for TCP (server, rcon) and UDP (query) on this host"""
+	for kind in (socket.SOCK_STREAM, socket.SOCK_DGRAM):
+		with socket.socket(socket.AF_INET, kind) as probe:
+			try:
+				probe.bind(("", port))
+			except OSError:
+				return False
+	
+	return True
+
+
+def _allocate(start: int, used: set[int]) -> int:
+	for port in range(start, MAX_PORT + 1):
+		if port not in used and port not in _reserved_ports and port_is_free(port):
+			_reserved_ports.add(port)
+			return port
+	
+	raise OSError(f"no free port above {start}")
+
+
+def allocate_ports(exclude: str | None = None) -> dict[str, str]:
+	"""Find free server, query, and rcon ports, which no installation and no other process uses.
+	The query port is the server port, as in the Minecraft defaults.
+	
+	:param exclude: the name of an installation, whose ports may be reused
+	
+	:returns: the port properties"""
+	with _reserve_lock:
+		used: set[int] = used_ports(exclude)
+		
+		server_port: int = _allocate(int(Defaults.PORT_SERVER), used)
+		rcon_port: int = _allocate(int(Defaults.PORT_RCON), used)
+	
+	return {
+		Properties.PORT_SERVER: str(server_port),
+		Properties.PORT_QUERY: str(server_port),
+		Properties.PORT_RCON: str(rcon_port)
+	}
+
+
+def release_ports(ports: dict[str, str]) -> None:
+	"""Forget the ports reserved by 'allocate_ports'
+	
+	:param ports: the port properties, as returned by 'allocate_ports'"""
+	with _reserve_lock:
+		_reserved_ports.difference_update(int(port) for port in ports.values())
+
+
+def assign_free_ports(properties: dict[str, str]) -> dict[str, str]:
+	"""Add free ports to the properties, unless the server port is given explicitly
+	
+	:returns: the allocated ports, which are to be released with 'release_ports'"""
+	if Properties.PORT_SERVER in properties:
+		return { }
+	
+	ports: dict[str, str] = allocate_ports()
+	for property_name, port in ports.items():
+		properties.setdefault(property_name, port)
+	
+	print(
+		f"Using port {Fore.CYAN}{properties[Properties.PORT_SERVER]}{Style.RESET_ALL} "
+		f"(rcon {properties[Properties.PORT_RCON]})"
+	)
+	
+	return ports